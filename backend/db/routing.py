@@ -0,0 +1,118 @@
+"""
+Primary/replica routing.
+
+Writes always go to "default" (the primary). Reads go to a replica only while a
+request marked replica-safe is being handled: GET/HEAD on viewsets that set
+`replica_reads = True` and admin changelists. Everything else, including every
+read after a write in the same request, stays on the primary. After a
+successful request that wrote to the primary (as the router saw it: a POST
+that only buffers a counter doesn't count) the client is pinned to the
+primary for REPLICA_STICKY_SECONDS, so it reads its own writes despite
+replication lag:
+
+- same-site clients (the admin, a frontend on the API's site) through a
+  short-lived cookie;
+- cross-origin clients (the separately hosted frontend doesn't send cookies)
+  through the `X-DB-Primary-Until` response header, a Unix time they send back
+  as a request header on reads until it passes.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PRIMARY = "default"
+STICKY_COOKIE = "db_primary"
+STICKY_HEADER = "X-DB-Primary-Until"
+
+read_from_replica = ContextVar("read_from_replica", default=False)
+wrote_to_primary = ContextVar("wrote_to_primary", default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+
+# -------------------- ROUTER --------------------
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if replicas and read_from_replica.get() and not wrote_to_primary.get():
+            return random.choice(replicas)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        wrote_to_primary.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+# -------------------- MIDDLEWARE --------------------
+class ReplicaReadMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        replica_token = read_from_replica.set(False)
+        wrote_token = wrote_to_primary.set(False)
+        try:
+            response = self.get_response(request)
+            wrote = wrote_to_primary.get()
+        finally:
+            read_from_replica.reset(replica_token)
+            wrote_to_primary.reset(wrote_token)
+        return self.pin(response, wrote)
+
+    async def __acall__(self, request):
+        # sync_to_async (the async ORM, sync views) copies changed context variables back.
+        replica_token = read_from_replica.set(False)
+        wrote_token = wrote_to_primary.set(False)
+        try:
+            response = await self.get_response(request)
+            wrote = wrote_to_primary.get()
+        finally:
+            read_from_replica.reset(replica_token)
+            wrote_to_primary.reset(wrote_token)
+        return self.pin(response, wrote)
+
+    def pin(self, response, wrote):
+        if wrote and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE, "1", max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax"
+            )
+            response[STICKY_HEADER] = str(int(time.time() + settings.REPLICA_STICKY_SECONDS))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ("GET", "HEAD") and not self.is_pinned(request):
+            read_from_replica.set(self.is_replica_safe(request, view_func))
+
+    def is_pinned(self, request):
+        if STICKY_COOKIE in request.COOKIES:
+            return True
+        try:
+            return float(request.headers.get(STICKY_HEADER, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def is_replica_safe(self, request, view_func):
+        if getattr(getattr(view_func, "cls", None), "replica_reads", False):
+            return True
+        match = request.resolver_match
+        return match.namespace == "admin" and (match.url_name or "").endswith("_changelist")
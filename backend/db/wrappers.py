@@ -0,0 +1,34 @@
+"""
+Execute wrappers for everything a request runs, whichever thread runs it.
+
+Connections are per thread. A sync request queries on the thread it arrived
+on, but under ASGI the async ORM and sync views query on the request's
+thread-sensitive sync_to_async thread, so async middleware installs its
+wrappers there.
+"""
+
+from contextlib import ExitStack, asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+def wrapping_queries(wrappers):
+    """Install `wrappers` ({alias: wrapper}) on this thread's connections until the returned stack closes."""
+    stack = ExitStack()
+    for alias, wrapper in wrappers.items():
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+    return stack
+
+
+@asynccontextmanager
+async def wrapping_queries_async(wrappers):
+    """wrapping_queries, on the thread the request's sync code and async ORM calls run on."""
+    if not wrappers:  # no thread hops
+        yield
+        return
+    stack = await sync_to_async(wrapping_queries)(wrappers)
+    try:
+        yield
+    finally:
+        await sync_to_async(stack.close)()
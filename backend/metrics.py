@@ -0,0 +1,152 @@
+"""
+Per-endpoint request metrics in Prometheus format.
+
+MetricsMiddleware records latency, SQL query count and time, and response size
+for every request, labelled by the resolved URL name (`get_active_upi`,
+`product-list`, `admin:shop_order_changelist`, ...). `/metrics` exposes them.
+
+With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers: each process then writes its samples to
+mmapped files there and `/metrics` sums them across workers
+(gunicorn.conf.py cleans up after workers that exit).
+
+The endpoint names every view and its traffic, so it only answers scrapers
+that send `Authorization: Bearer <METRICS_TOKEN>` or connect from an address
+in METRICS_ALLOWED_IPS (loopback by default). Behind a proxy REMOTE_ADDR is the
+proxy's, so use the token there.
+"""
+
+import ipaddress
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .db.wrappers import wrapping_queries, wrapping_queries_async
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request.",
+    ["view", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of non-streaming response bodies.",
+    ["view"],
+    buckets=SIZE_BUCKETS,
+)
+QUERY_COUNT = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed per request.",
+    ["view"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+QUERY_TIME = Histogram(
+    "db_query_duration_seconds_per_request",
+    "Total time spent in SQL per request.",
+    ["view"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class QueryTimer:
+    """Execute wrapper that counts statements and sums their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match._func_path
+
+
+# -------------------- MIDDLEWARE --------------------
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with wrapping_queries(dict.fromkeys(connections, timer)):
+            response = self.get_response(request)
+        return self.record(request, response, timer, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        async with wrapping_queries_async(dict.fromkeys(connections, timer)):
+            response = await self.get_response(request)
+        return self.record(request, response, timer, time.perf_counter() - start)
+
+    def record(self, request, response, timer, elapsed):
+        view = view_label(request)
+        if view == "metrics":
+            return response
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(elapsed)
+        QUERY_COUNT.labels(view).observe(timer.count)
+        QUERY_TIME.labels(view).observe(timer.duration)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view).observe(len(response.content))
+        return response
+
+
+# -------------------- EXPOSITION --------------------
+def scrape_allowed(request):
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if token and scheme.lower() == "bearer" and constant_time_compare(credentials.strip(), token):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, aggregated across worker processes when configured."""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,305 @@
+"""
+On-demand per-request profiling and a slow-request log.
+
+A request is profiled when it carries a valid `X-Profile-Token` header (issue
+one with `manage.py profile_token`) or, for staff users, a `?_profile=1` query
+parameter. The report lists every SQL statement with its timing, repeated
+statements, time spent in DRF serializers versus the rest of the view, and a
+sampled Python profile. It is written to PROFILE_REPORT_DIR; the response
+carries its id in `X-Profile-Id` and staff can fetch it at /profiles/<id>/.
+Reports older than PROFILE_REPORT_MAX_AGE are removed as new ones are written.
+
+Independently, any request slower than SLOW_REQUEST_MS (0 turns it off) is
+logged. Its SQL breakdown is included when the request's statements were
+captured: a profiled request's always are, and SLOW_REQUEST_SQL_SAMPLE_RATE of
+the others'. Requests that are neither run without the execute wrappers.
+
+Serializer time is measured by TimedSerializerMixin on the output serializers,
+and only while a profile is active; other requests pay one ContextVar lookup.
+"""
+
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.db import connections
+from django.http import Http404, JsonResponse
+
+from .db.wrappers import wrapping_queries, wrapping_queries_async
+
+logger = logging.getLogger("backend.slow_requests")
+
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_SALT = "backend.profiling"
+QUERY_PARAM = "_profile"
+
+current_profile = ContextVar("current_profile", default=None)
+
+
+def make_token():
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+# -------------------- SQL RECORDING --------------------
+class SQLRecorder:
+    """Execute wrapper keeping (alias, sql, seconds) for every statement."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((self.alias, sql, time.perf_counter() - start))
+
+
+def sql_summary(statements, top=5):
+    repeated = Counter(sql for _, sql, _ in statements)
+    return {
+        "count": len(statements),
+        "total_ms": round(sum(seconds for _, _, seconds in statements) * 1000, 3),
+        "slowest": [
+            {"db": alias, "sql": sql, "ms": round(seconds * 1000, 3)}
+            for alias, sql, seconds in sorted(statements, key=lambda s: s[2], reverse=True)[:top]
+        ],
+        "duplicates": [
+            {"sql": sql, "count": count} for sql, count in repeated.most_common() if count > 1
+        ],
+    }
+
+
+# -------------------- SERIALIZER TIMING --------------------
+class TimedSerializerMixin:
+    """Add the outermost serializer's time to the active profile, if there is one."""
+
+    def to_representation(self, instance):
+        profile = current_profile.get()
+        if profile is None or profile.in_serializer:
+            return super().to_representation(instance)
+        profile.in_serializer = True  # nested serializers run inside this one
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serializer_seconds += time.perf_counter() - start
+            profile.in_serializer = False
+
+
+# -------------------- SAMPLING PROFILER --------------------
+class Sampler(threading.Thread):
+    """Sample the request thread's stack every PROFILE_SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self.done = threading.Event()
+
+    def run(self):
+        interval = settings.PROFILE_SAMPLE_INTERVAL
+        while not self.done.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{frame.f_lineno}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def report(self, top=30):
+        leaf_functions = Counter()
+        for stack, count in self.stacks.items():
+            leaf_functions[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "interval_ms": settings.PROFILE_SAMPLE_INTERVAL * 1000,
+            "samples": self.samples,
+            "top_functions": [{"frame": frame, "samples": n} for frame, n in leaf_functions.most_common(top)],
+            "stacks": [{"stack": stack, "samples": n} for stack, n in self.stacks.most_common(top)],
+        }
+
+
+class Profile:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.serializer_seconds = 0.0
+        self.in_serializer = False
+
+
+class Measurement:
+    """What ProfilingMiddleware collected while one request ran."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.capture = bool(profile) or random.random() < settings.SLOW_REQUEST_SQL_SAMPLE_RATE
+        self.recorders = [SQLRecorder(alias) for alias in connections] if self.capture else []
+        self.sampler = None
+        self.response = None
+        self.elapsed = 0.0
+
+    def wrappers(self):
+        return {recorder.alias: recorder for recorder in self.recorders}
+
+
+# -------------------- MIDDLEWARE --------------------
+class ProfilingMiddleware:
+    """
+    Under ASGI the sampler watches the event loop's thread, so a profile of an
+    async view also samples whatever else the loop ran meanwhile.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = Profile() if self.wants_profile(request, getattr(request, "user", None)) else None
+        if not (profile or settings.SLOW_REQUEST_MS):
+            return self.get_response(request)
+        with self.measuring(profile) as measured, wrapping_queries(measured.wrappers()):
+            measured.response = self.get_response(request)
+        self.finish(request, measured)
+        return measured.response
+
+    async def __acall__(self, request):
+        profile = Profile() if self.wants_profile(request, await self.auser(request)) else None
+        if not (profile or settings.SLOW_REQUEST_MS):
+            return await self.get_response(request)
+        with self.measuring(profile) as measured:
+            async with wrapping_queries_async(measured.wrappers()):
+                measured.response = await self.get_response(request)
+        if profile:  # it writes the report
+            await sync_to_async(self.finish)(request, measured)
+        else:
+            self.finish(request, measured)
+        return measured.response
+
+    async def auser(self, request):
+        """`request.user`, loaded without blocking the loop when wants_profile needs it."""
+        auser = getattr(request, "auser", None)
+        return await auser() if auser and request.GET.get(QUERY_PARAM) else None
+
+    @contextmanager
+    def measuring(self, profile):
+        measured = Measurement(profile)
+        if profile:
+            measured.sampler = Sampler(threading.get_ident())
+            measured.sampler.start()
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            yield measured
+        finally:
+            measured.elapsed = time.perf_counter() - start
+            current_profile.reset(token)
+            if measured.sampler:
+                measured.sampler.done.set()
+                measured.sampler.join()
+
+    def finish(self, request, measured):
+        """Log a slow request and write the profile report."""
+        profile, response, elapsed = measured.profile, measured.response, measured.elapsed
+        slow_ms = settings.SLOW_REQUEST_MS
+        statements = [statement for recorder in measured.recorders for statement in recorder.statements]
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            logger.warning(
+                "Slow request %s %s took %.0f ms: %s",
+                request.method,
+                request.path,
+                elapsed * 1000,
+                json.dumps(sql_summary(statements)) if measured.capture else "SQL not sampled",
+            )
+        if profile:
+            self.save_report(request, response, profile, measured.sampler, statements, elapsed)
+            response["X-Profile-Id"] = profile.id
+
+    def wants_profile(self, request, user):
+        token = request.headers.get(TOKEN_HEADER)
+        if token:
+            return valid_token(token)
+        if request.GET.get(QUERY_PARAM):
+            return bool(user and user.is_staff)
+        return False
+
+    def save_report(self, request, response, profile, sampler, statements, elapsed):
+        sql_seconds = sum(seconds for _, _, seconds in statements)
+        report = {
+            "id": profile.id,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "timing_ms": {
+                "total": round(elapsed * 1000, 3),
+                # Serializer time includes the SQL it triggers (e.g. nested relations).
+                "serializer": round(profile.serializer_seconds * 1000, 3),
+                "view": round((elapsed - profile.serializer_seconds) * 1000, 3),
+                "sql": round(sql_seconds * 1000, 3),
+            },
+            "sql": {
+                **sql_summary(statements),
+                "statements": [
+                    {"db": alias, "sql": sql, "ms": round(seconds * 1000, 3)}
+                    for alias, sql, seconds in statements
+                ],
+            },
+            "python_profile": sampler.report(),
+        }
+        directory = Path(settings.PROFILE_REPORT_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{profile.id}.json").write_text(json.dumps(report, indent=2))
+        remove_old_reports(directory)
+
+
+def remove_old_reports(directory):
+    """Delete reports older than PROFILE_REPORT_MAX_AGE; returns how many."""
+    cutoff = time.time() - settings.PROFILE_REPORT_MAX_AGE
+    removed = 0
+    for path in directory.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:  # removed by another worker
+            pass
+    return removed
+
+
+# -------------------- REPORT VIEW --------------------
+@staff_member_required
+def profile_report(request, profile_id):
+    """Return a stored profile report (staff only)."""
+    path = Path(settings.PROFILE_REPORT_DIR) / f"{profile_id}.json"
+    if not profile_id.isalnum() or not path.exists():
+        raise Http404("No such profile")
+    return JsonResponse(json.loads(path.read_text()))
@@ -6,6 +6,7 @@ Updated configuration for React + Django REST + Render deployment
 import os
 from pathlib import Path
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,16 +45,23 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # ---------------------------------------------------------
 MIDDLEWARE = [
+    # ✅ Per-endpoint latency / query metrics (exposed at /metrics)
+    "backend.metrics.MetricsMiddleware",
+
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
 
-    # ✅ Whitenoise for static file serving on Render
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # ✅ Whitenoise for static file serving on Render (async-capable, see backend/static.py)
+    "backend.static.AsyncWhiteNoiseMiddleware",
+    # Prebuilt product API documents (see shop/snapshots.py)
+    "shop.snapshots.SnapshotMiddleware",
 
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "backend.db.routing.ReplicaReadMiddleware",
+    "backend.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -90,6 +98,25 @@ DATABASES = {
     )
 }
 
+# Read replicas (comma-separated URLs). Catalog reads and admin lists use them;
+# writes and read-after-write stay on "default" (see backend/db/routing.py).
+# Locally: DATABASE_REPLICA_URLS=sqlite:///db-replica.sqlite3 (a copy of db.sqlite3).
+for index, url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(","))):
+    DATABASES[f"replica_{index}"] = {
+        **dj_database_url.parse(url.strip(), conn_max_age=600),
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Opt-in SQLite production profile: WAL, tuned pragmas, busy handling and
+# BEGIN IMMEDIATE for writes (see backend/db/sqlite3/base.py).
+SQLITE_PRODUCTION = os.environ.get("SQLITE_PRODUCTION", "False") == "True"
+for database in DATABASES.values():
+    if SQLITE_PRODUCTION and database["ENGINE"] == "django.db.backends.sqlite3":
+        database["ENGINE"] = "backend.db.sqlite3"
+
+DATABASE_ROUTERS = ["backend.db.routing.PrimaryReplicaRouter"]
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
 # ---------------------------------------------------------
 # PASSWORD VALIDATION
 # ---------------------------------------------------------
@@ -139,11 +166,67 @@ CORS_ALLOWED_ORIGINS = [
     "https://madicala.vercel.app",        # ✅ Your Vercel frontend
 ]
 
+# Read-your-writes pinning for the cross-origin frontend (see backend/db/routing.py):
+# it reads X-DB-Primary-Until from write responses and sends it back on reads.
+# Idempotency-Key makes its POSTs safe to retry (see shop/idempotency.py).
+CORS_ALLOW_HEADERS = (*default_headers, "x-db-primary-until", "idempotency-key")
+CORS_EXPOSE_HEADERS = ["X-DB-Primary-Until"]
+
 CSRF_TRUSTED_ORIGINS = [
     "https://madicala-backend.onrender.com",  # ✅ Render backend
     "https://madicala.vercel.app",            # ✅ Vercel frontend
 ]
 
+# ---------------------------------------------------------
+# IDEMPOTENCY (retried POSTs from flaky mobile networks)
+# ---------------------------------------------------------
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))  # seconds
+# An unanswered claim is given up after this long; keep it above the worker timeout (gunicorn: 30s).
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", 60))
+
+# ---------------------------------------------------------
+# STOCK RESERVATIONS (units held between order and payment)
+# ---------------------------------------------------------
+STOCK_RESERVATION_TTL = int(os.environ.get("STOCK_RESERVATION_TTL", 15 * 60))  # seconds
+
+# ---------------------------------------------------------
+# PAYMENT STATUS STREAM (Server-Sent Events)
+# ---------------------------------------------------------
+SSE_HEARTBEAT_SECONDS = int(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+SSE_TIMEOUT_SECONDS = int(os.environ.get("SSE_TIMEOUT_SECONDS", 300))
+
+# ---------------------------------------------------------
+# CATALOG SNAPSHOTS (manage.py build_snapshots, served by SnapshotMiddleware)
+# ---------------------------------------------------------
+SNAPSHOT_ROOT = os.environ.get("SNAPSHOT_ROOT", os.path.join(BASE_DIR, "snapshots"))
+# Scheme and host the documents' absolute URLs are built for; other hosts get the views.
+SNAPSHOT_BASE_URL = os.environ.get("SNAPSHOT_BASE_URL", "http://localhost:8000")
+
+# ---------------------------------------------------------
+# PRODUCT VIEW / CLICK COUNTERS (buffered per worker, see shop/counters.py)
+# ---------------------------------------------------------
+# Counts a worker holds at most this long, and loses if killed; 0 writes through.
+COUNTER_FLUSH_SECONDS = float(os.environ.get("COUNTER_FLUSH_SECONDS", 10))
+
+# ---------------------------------------------------------
+# METRICS (/metrics answers these scrapers only, see backend/metrics.py)
+# ---------------------------------------------------------
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")  # sent as "Authorization: Bearer <token>"
+METRICS_ALLOWED_IPS = [
+    network.strip() for network in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if network.strip()
+]  # addresses or CIDR networks
+
+# ---------------------------------------------------------
+# PROFILING (X-Profile-Token header or ?_profile=1 for staff)
+# ---------------------------------------------------------
+PROFILE_REPORT_DIR = os.environ.get("PROFILE_REPORT_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get("PROFILE_TOKEN_MAX_AGE", 60 * 60))  # seconds
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", 0.005))  # seconds
+PROFILE_REPORT_MAX_AGE = int(os.environ.get("PROFILE_REPORT_MAX_AGE", 7 * 24 * 60 * 60))  # seconds
+SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 1000))  # 0: no slow-request log
+# Share of requests whose SQL is captured, so that a slow one's log can break it down.
+SLOW_REQUEST_SQL_SAMPLE_RATE = float(os.environ.get("SLOW_REQUEST_SQL_SAMPLE_RATE", 0.01))
+
 # ---------------------------------------------------------
 # LOGGING (optional)
 # ---------------------------------------------------------
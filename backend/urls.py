@@ -4,6 +4,9 @@ from django.http import JsonResponse
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics
+from .profiling import profile_report
+
 
 # -------------------- ROOT HEALTH CHECK --------------------
 def home(request):
@@ -12,7 +15,8 @@ def home(request):
         "status": "ok",
         "message": "Django backend is running ✅",
         "api_base": "/api/",
-        "admin_panel": "/admin/"
+        "admin_panel": "/admin/",
+        "metrics": "/metrics",
     })
 
 
@@ -21,6 +25,12 @@ urlpatterns = [
     # Health check
     path("", home, name="home"),
 
+    # Prometheus metrics
+    path("metrics", metrics, name="metrics"),
+
+    # Stored per-request profiles (staff only)
+    path("profiles/<str:profile_id>/", profile_report, name="profile_report"),
+
     # Admin site
     path("admin/", admin.site.urls),
 
@@ -0,0 +1,21 @@
+"""
+Gunicorn settings picked up automatically from the project root.
+Command-line flags (workers, bind, worker class) still take precedence.
+"""
+
+import os
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared Prometheus metrics directory."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """Write the worker's buffered product view and click counts (see shop/counters.py)."""
+    from shop.counters import buffer
+
+    buffer.stop()
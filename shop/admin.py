@@ -1,6 +1,98 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
-from .models import Product, ProductReview, Order, Transaction, UPIConfig
+from .catalog_import import FORMATS, guess_format
+from .counters import FIELDS as BUFFERED_FIELDS
+from .changelists import ScalableAdminMixin, prefix_match
+from .exports import export_response
+from .inventory import fail_orders, pay_orders
+from .models import (
+    Product,
+    ProductImport,
+    ProductReview,
+    ProductStock,
+    Order,
+    Transaction,
+    UPIConfig,
+    SalesRollup,
+    PaymentRollup,
+    Seller,
+    seller_key,
+)
+from .similarity import SOURCE_FIELDS, queue_refresh
+from .rollups import (
+    RollupQueryError,
+    date_range,
+    payment_mix,
+    record_order_changes,
+    record_transaction_changes,
+    sales_report,
+    sales_totals,
+)
+
+
+# -------------------- EXPORT ACTIONS (Orders & Transactions) --------------------
+@admin.action(description="Export selected as CSV", permissions=["view"])
+def export_csv(modeladmin, request, queryset):
+    return export_response(request, queryset, modeladmin.export_dataset, "csv")
+
+
+@admin.action(description="Export selected as JSONL", permissions=["view"])
+def export_jsonl(modeladmin, request, queryset):
+    return export_response(request, queryset, modeladmin.export_dataset, "jsonl")
+
+
+# -------------------- LIST FILTERS --------------------
+class PaymentMethodFilter(admin.SimpleListFilter):
+    """Choices come from the small rollup table instead of SELECT DISTINCT over every transaction."""
+    title = "payment method"
+    parameter_name = "payment_method"
+
+    def lookups(self, request, model_admin):
+        methods = PaymentRollup.objects.filter(period="day").values_list("payment_method", flat=True)
+        return [(method, method) for method in methods.distinct().order_by("payment_method")]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(payment_method=self.value())
+        return queryset
+
+
+class RatingFilter(admin.SimpleListFilter):
+    """Whole-star ranges on the rating index; the stock filter lists distinct ratings with a scan."""
+    title = "rating"
+    parameter_name = "stars"
+
+    def lookups(self, request, model_admin):
+        return [(str(stars), f"{stars}★") for stars in range(5, 0, -1)]
+
+    def queryset(self, request, queryset):
+        if self.value() in {str(stars) for stars in range(1, 6)}:
+            stars = int(self.value())
+            queryset = queryset.filter(rating__gte=stars)
+            return queryset if stars == 5 else queryset.filter(rating__lt=stars + 1)
+        return queryset
+
+
+class SellerFilter(admin.SimpleListFilter):
+    """`?seller=<id>` from the seller list; only the chosen seller is offered, so there is no DISTINCT over products."""
+    title = "seller"
+    parameter_name = "seller"
+
+    def lookups(self, request, model_admin):
+        if self.value() and self.value().isdigit():
+            return [(seller.pk, seller.name) for seller in Seller.objects.filter(pk=self.value())]
+        return []
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(seller_id=int(self.value()))
+        return queryset
 
 
 # -------------------- INLINE REVIEWS (Inside Product) --------------------
@@ -11,6 +103,50 @@ class ProductReviewInline(admin.TabularInline):
     readonly_fields = ("created_at",)
 
 
+# -------------------- INLINE STOCK (Inside Product) --------------------
+class ProductStockInline(admin.TabularInline):
+    model = ProductStock
+    extra = 1
+    fields = ("size", "shard", "quantity")
+
+
+# -------------------- PRODUCT IMPORT FORM --------------------
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row, or JSONL (one JSON object per line).")
+    format = forms.ChoiceField(
+        choices=[("", "From file extension")] + [(fmt, fmt.upper()) for fmt in FORMATS], required=False
+    )
+    default_seller = forms.CharField(required=False, help_text="Seller for rows that do not name one in sold_by.")
+    fetch_images = forms.BooleanField(required=False, help_text="Download image_url into the product image.")
+
+
+# -------------------- SELLER --------------------
+@admin.register(Seller)
+class SellerAdmin(admin.ModelAdmin):
+    list_display = ("name", "product_count", "review_count", "average_rating", "products_link", "created_at")
+    search_fields = ("name",)
+    search_help_text = "Seller name prefix"
+    sortable_by = ("product_count",)
+    fields = ("name", "product_count", "review_count", "rating_total", "created_at")
+    readonly_fields = ("product_count", "review_count", "rating_total", "created_at")
+
+    def products_link(self, obj):
+        url = reverse("admin:shop_product_changelist")
+        return format_html('<a href="{}?seller={}">Products</a>', url, obj.pk)
+    products_link.short_description = "Products"
+
+    def get_search_results(self, request, queryset, search_term):
+        """Prefix match on the normalized-name index (also serves the product form's autocomplete)."""
+        key = seller_key(search_term)
+        if not key:
+            return queryset, False
+        return queryset.filter(prefix_match(queryset, "key", [key])), False
+
+    def has_delete_permission(self, request, obj=None):
+        # Products protect their seller; an emptied seller can go.
+        return super().has_delete_permission(request, obj) and (obj is None or not obj.product_count)
+
+
 # -------------------- PRODUCT --------------------
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -18,18 +154,20 @@ class ProductAdmin(admin.ModelAdmin):
         "name",
         "price",
         "discount",
-        "sold_by",
+        "seller",
         "country_of_origin",
         "image_preview",
     )
-    search_fields = ("name", "sold_by")
-    list_filter = ("country_of_origin",)
-    readonly_fields = ("image_preview",)
-    inlines = [ProductReviewInline]
+    list_select_related = ("seller",)
+    search_fields = ("name", "seller_sku")
+    list_filter = (SellerFilter, "country_of_origin")
+    autocomplete_fields = ("seller",)
+    readonly_fields = ("image_preview", "view_count", "click_count")
+    inlines = [ProductStockInline, ProductReviewInline]
 
     fieldsets = (
         ("🧾 Basic Info", {
-            "fields": ("name", "price", "discount", "sold_by"),
+            "fields": ("name", "price", "discount", "seller", "seller_sku"),
         }),
         ("🖼️ Product Images", {
             "fields": ("image_url", "image_file", "image_preview"),
@@ -46,6 +184,9 @@ class ProductAdmin(admin.ModelAdmin):
         ("📋 Product Details", {
             "fields": ("fabric", "sleeve_length", "country_of_origin"),
         }),
+        ("📈 Engagement", {
+            "fields": ("view_count", "click_count"),
+        }),
     )
 
     def image_preview(self, obj):
@@ -58,19 +199,105 @@ class ProductAdmin(admin.ModelAdmin):
         return "No image"
     image_preview.short_description = "Preview"
 
+    def save_model(self, request, obj, form, change):
+        """
+        Queue a similar-products refresh when the attributes it is based on
+        change. (Seller totals and the change feed follow from shop.signals.)
+        The counters and popularity scores are left out of the UPDATE: flushes
+        (shop.counters) add to them after the form loaded its copy.
+        """
+        if change:
+            obj.save(update_fields=[
+                field.name
+                for field in Product._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in BUFFERED_FIELDS
+            ])
+        else:
+            super().save_model(request, obj, form, change)
+        if not change or set(form.changed_data) & set(SOURCE_FIELDS):
+            queue_refresh([obj.pk])
+
+    change_list_template = "admin/shop/product/change_list.html"
+
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="shop_product_import"),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        """
+        Upload a CSV/JSONL catalog; rows are upserted on (seller, seller_sku).
+        The file is queued and imported by `import_products --queued`, not in the request.
+        """
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect("admin:shop_product_changelist")
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            queued = ProductImport.objects.create(
+                file=upload,
+                format=form.cleaned_data["format"] or guess_format(upload.name),
+                default_seller=form.cleaned_data["default_seller"],
+                fetch_images=form.cleaned_data["fetch_images"],
+            )
+            self.message_user(request, f"{queued} queued; its result will show here once it has run.")
+            return redirect("admin:shop_productimport_change", queued.pk)
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import products",
+            "form": form,
+        }
+        return render(request, "admin/shop/product/import.html", context)
+
+
+@admin.register(ProductImport)
+class ProductImportAdmin(admin.ModelAdmin):
+    """Uploads from "Import products"; read-only, as the worker fills them in."""
+    list_display = ("__str__", "file", "status", "summary", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = (
+        "file",
+        "format",
+        "default_seller",
+        "fetch_images",
+        "status",
+        "summary",
+        "row_errors",
+        "created_at",
+        "finished_at",
+    )
+    exclude = ("errors",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Row errors")
+    def row_errors(self, obj):
+        return format_html_join(mark_safe("<br>"), "line {}: {}", obj.errors) or "-"
+
 
 # -------------------- PRODUCT REVIEW --------------------
 @admin.register(ProductReview)
-class ProductReviewAdmin(admin.ModelAdmin):
+class ProductReviewAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("product", "reviewer_name", "rating", "created_at")
-    search_fields = ("reviewer_name", "product__name")
-    list_filter = ("rating", "created_at")
+    list_select_related = ("product",)
+    search_fields = ("=product_id",)
+    search_help_text = "Product ID"
+    list_filter = (RatingFilter, "created_at")
+    sortable_by = ("rating", "created_at")
     readonly_fields = ("created_at",)
+    raw_id_fields = ("product",)
+    keyset_field = "created_at"
 
 
 # -------------------- ORDER --------------------
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "order_id",
         "product",
@@ -80,9 +307,16 @@ class OrderAdmin(admin.ModelAdmin):
         "payment_status",
         "created_at",
     )
+    list_select_related = ("product",)
     list_filter = ("payment_status", "created_at")
-    search_fields = ("order_id", "product__name")
+    search_fields = ("^order_id", "=product_id")
+    search_help_text = "Order ID prefix, or product ID"
+    sortable_by = ("order_id", "payment_status", "created_at")
     readonly_fields = ("created_at",)
+    raw_id_fields = ("product",)
+    actions = [export_csv, export_jsonl]
+    export_dataset = "orders"
+    keyset_field = "created_at"
 
     fieldsets = (
         ("🛍️ Order Details", {
@@ -96,14 +330,50 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        """
+        Keep the sales rollups in step with orders added or re-statused here.
+        Moving an order to paid or failed goes through shop.inventory, which
+        confirms or releases its stock hold like a payment or the sweeper would.
+        """
+        old_status = form.initial.get("payment_status") if change else None
+        new_status = obj.payment_status
+        if change and old_status != new_status and new_status in ("paid", "failed"):
+            obj.payment_status = old_status
+            super().save_model(request, obj, form, change)
+            if new_status == "failed":
+                fail_orders([obj.pk])
+            elif pay_orders([obj.pk])[1]:
+                self.message_user(
+                    request, f"Size {obj.size} is sold out, so {obj.order_id} stays failed.", messages.WARNING
+                )
+            obj.refresh_from_db(fields=["payment_status"])
+            return
+        super().save_model(request, obj, form, change)
+        if not change or old_status != obj.payment_status:
+            record_order_changes([(obj, old_status)])
+
 
 # -------------------- TRANSACTION --------------------
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
-    list_display = ("product_name", "amount", "payment_method", "transaction_time")
-    list_filter = ("payment_method", "transaction_time")
-    search_fields = ("product_name",)
+class TransactionAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("transaction_id", "product_name", "amount", "payment_method", "status", "transaction_time")
+    list_filter = ("status", PaymentMethodFilter, "transaction_time")
+    search_fields = ("^transaction_id", "^order__order_id")
+    search_help_text = "Transaction ID or order ID prefix"
+    sortable_by = ("transaction_id", "transaction_time")
     readonly_fields = ("transaction_time",)
+    raw_id_fields = ("order",)
+    actions = [export_csv, export_jsonl]
+    export_dataset = "transactions"
+    keyset_field = "transaction_time"
+
+    def save_model(self, request, obj, form, change):
+        """Keep the payment rollups in step with transactions added or re-statused here."""
+        old_status = form.initial.get("status") if change else None
+        super().save_model(request, obj, form, change)
+        if not change or old_status != obj.status:
+            record_transaction_changes([(obj, old_status)])
 
 
 # -------------------- UPI CONFIG --------------------
@@ -121,3 +391,40 @@ class UPIConfigAdmin(admin.ModelAdmin):
         if obj.is_active:
             UPIConfig.objects.exclude(pk=obj.pk).update(is_active=False)
         super().save_model(request, obj, form, change)
+
+
+# -------------------- SALES DASHBOARD --------------------
+@admin.register(SalesRollup)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Read-only dashboard over the rollup tables (`?from=&to=` dates)."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            return redirect("admin:index")
+        try:
+            start, end = date_range(request.GET)
+        except RollupQueryError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            start, end = date_range({})
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Sales dashboard",
+            "start": start,
+            "last_day": end - timedelta(days=1),
+            "totals": sales_totals(start, end),
+            "days": sales_report(start, end, "day", "total"),
+            "top_products": sales_report(start, end, "day", "product", limit=10),
+            "top_sellers": sales_report(start, end, "day", "seller", limit=10),
+            "payment_methods": payment_mix(start, end),
+        }
+        return render(request, "admin/shop/salesrollup/dashboard.html", context)
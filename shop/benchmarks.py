@@ -0,0 +1,210 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.test import Client
+
+from .loadtest import summarize
+from . import changefeed
+from .models import Order, Product, ProductReview, Transaction, UPIConfig
+from .sellers import recount, resolve
+
+SIZES = ["S", "M", "L", "XL", "XXL"]
+OCCASIONS = ["Casual", "Festive", "Party", "Wedding", "Daily"]
+FABRICS = ["Cotton Blend", "Silk", "Georgette", "Chiffon", "Rayon"]
+
+
+# -------------------- DATASET --------------------
+def seed_benchmark_data(products=500, orders=2000, seed=38):
+    """
+    Create a deterministic catalog: products with sizes, a skewed number of
+    reviews per product, past orders with transactions, and an active UPI ID.
+    Returns the ids the scenarios need.
+    """
+    rng = random.Random(seed)
+    sellers = resolve([f"Seller {n}" for n in range(1, 41)])
+    catalog = Product.objects.bulk_create(
+        Product(
+            name=f"Benchmark Saree {i}",
+            price=Decimal(rng.randint(199, 2999)),
+            discount=rng.choice([0, 0, 10, 20, 35, 50]),
+            occasion=rng.choice(OCCASIONS),
+            fabric=rng.choice(FABRICS),
+            seller_id=sellers[f"Seller {rng.randint(1, 40)}"],
+            # Every product stocks M, which the checkout scenario orders.
+            **{f"size_{size.lower()}": size == "M" or rng.random() < 0.7 for size in SIZES},
+        )
+        for i in range(products)
+    )
+    ProductReview.objects.bulk_create(
+        ProductReview(
+            product=product,
+            reviewer_name=f"Reviewer {n}",
+            rating=Decimal(rng.randint(1, 5)),
+            comment="Nice fabric, true to size.",
+        )
+        for product in catalog
+        for n in range(min(int(rng.paretovariate(1.2)), 50))
+    )
+    past_orders = Order.objects.bulk_create(
+        Order(
+            product=product,
+            size="M",
+            final_price=product.selling_price,
+            order_id=f"BENCH:{i:08d}",
+            payment_status=rng.choice(["pending", "paid", "paid", "failed"]),
+        )
+        for i, product in enumerate(rng.choices(catalog, k=orders))
+    )
+    Transaction.objects.bulk_create(
+        Transaction(
+            order=order,
+            product_name=order.product.name,
+            amount=order.final_price,
+            payment_method="UPI",
+            transaction_id=f"BTID{i:08d}",
+            status="pending",
+        )
+        for i, order in enumerate(past_orders)
+    )
+    UPIConfig.objects.create(upi_id="benchmark@upi", is_active=True)
+    changefeed.record([product.pk for product in catalog])
+    recount()
+    return {
+        "product_ids": [product.pk for product in catalog],
+        "pending_transactions": [f"BTID{i:08d}" for i in range(orders)],
+    }
+
+
+# -------------------- CLIENTS --------------------
+class InProcessClient:
+    """Drive the app through Django's test client (no network, no server)."""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, payload=None):
+        if method == "GET":
+            response = self.client.get(path)
+        else:
+            response = self.client.post(path, payload or {}, content_type="application/json")
+        data = json.loads(response.content) if response.get("Content-Type", "").startswith("application/json") else None
+        return response.status_code, data
+
+
+# -------------------- SCENARIOS --------------------
+class Scenarios:
+    """
+    Scripted user journeys. Each step is timed and recorded under
+    "<scenario>:<step>"; a journey stops at its first failed step.
+    """
+
+    def __init__(self, dataset, seed=38):
+        self.product_ids = dataset["product_ids"]
+        self.pending_transactions = list(dataset["pending_transactions"])
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def timed(self, client, label, method, path, payload=None):
+        start = time.perf_counter()
+        code, data = client.request(method, path, payload)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies.setdefault(label, []).append(elapsed)
+            if not 200 <= code < 300:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        return code, data
+
+    def pick_products(self, k):
+        with self.lock:
+            return self.rng.sample(self.product_ids, k)
+
+    def browse_catalog(self, client):
+        self.timed(client, "browse:product-list", "GET", "/api/products/")
+
+    def view_product(self, client):
+        (product_id,) = self.pick_products(1)
+        self.timed(client, "view:product-detail", "GET", f"/api/products/{product_id}/")
+
+    def checkout(self, client):
+        items = [{"product_id": pk, "size": "M", "quantity": 1} for pk in self.pick_products(3)]
+        code, data = self.timed(client, "checkout:orders-checkout", "POST", "/api/orders/checkout/", {"items": items})
+        if code != 201:
+            return
+        order = data["orders"][0]
+        self.timed(
+            client,
+            "checkout:create-transaction",
+            "POST",
+            "/api/create-transaction/",
+            {"order_id": order["order_id"], "amount": data["total_amount"], "payment_method": "UPI"},
+        )
+        self.timed(client, "checkout:generate-upi", "GET", f"/api/generate-upi/{order['order_id']}/")
+
+    def verify_payment(self, client):
+        with self.lock:
+            if not self.pending_transactions:
+                return
+            transaction_id = self.pending_transactions.pop()
+        self.timed(
+            client,
+            "verify:verify-transaction",
+            "POST",
+            f"/api/verify-transaction/{transaction_id}/",
+            {"status": "success"},
+        )
+
+    MIX = [("browse_catalog", 5), ("view_product", 8), ("checkout", 2), ("verify_payment", 1)]
+
+    def run(self, client_factory, iterations, concurrency):
+        """Run `iterations` journeys drawn from MIX on `concurrency` threads; returns results."""
+        names = [name for name, _ in self.MIX]
+        weights = [weight for _, weight in self.MIX]
+        plan = self.rng.choices(names, weights=weights, k=iterations)
+        local = threading.local()
+
+        def journey(name):
+            if not hasattr(local, "client"):
+                local.client = client_factory()
+            getattr(self, name)(local.client)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(journey, plan))
+        elapsed = time.perf_counter() - start
+        return self.results(elapsed)
+
+    def results(self, elapsed):
+        results = {}
+        for label, latencies in sorted(self.latencies.items()):
+            summary = summarize(latencies, elapsed)
+            summary["errors"] = self.errors.get(label, 0)
+            results[label] = summary
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        results["all"] = summarize(everything, elapsed)
+        results["all"]["errors"] = sum(self.errors.values())
+        return results
+
+
+# -------------------- BASELINE --------------------
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Return (label, metric, baseline, current) for every regression beyond
+    `tolerance` (a fraction): p95/p99 latency up, or throughput down.
+    """
+    regressions = []
+    for label, current in results.items():
+        previous = baseline.get(label)
+        if not previous:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((label, metric, previous[metric], current[metric]))
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append((label, "rps", previous["rps"], current["rps"]))
+    return regressions
@@ -0,0 +1,300 @@
+"""
+Bulk product import from CSV or JSONL (`manage.py import_products`, or the
+"Import products" button on the product changelist, which stores the upload
+as a ProductImport for `import_products --queued` to run outside the request).
+
+The file is read as a stream and handled BATCH_SIZE rows at a time: each row
+is validated with ProductImportSerializer, the batch's existing products are
+loaded with one query on (seller, seller_sku), then new products go through
+bulk_create and known ones through bulk_update (only the rows and fields that
+actually changed). A bad row is recorded in the
+result and skipped; it never aborts the run. Seller names in `sold_by` are
+resolved to Seller rows (created on first sight) and new products added to
+their sellers' totals. New and changed products are logged for the change
+feed, and those whose similarity attributes changed (or are new) are queued
+for `compute_similar --changed`.
+
+With image fetching on, image URLs of new or changed products are downloaded
+and verified by a thread pool while parsing continues; finished images are
+saved to media storage and attached with bulk_update.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+
+from . import changefeed
+from .models import Product, ProductImport
+from .sellers import record_products, resolve
+from .serializers import ProductImportSerializer
+from .similarity import SOURCE_FIELDS, queue_refresh
+
+FORMATS = ("csv", "jsonl")
+BATCH_SIZE = 500
+IMAGE_WORKERS = 8
+IMAGE_MAX_BYTES = 5 * 1024 * 1024
+IMAGE_TIMEOUT = 15
+MAX_REPORTED_ERRORS = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class ImportResult:
+    """Counters plus the first MAX_REPORTED_ERRORS per-row errors as (line, message)."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.images = 0
+        self.image_errors = 0
+        self.errors = []
+
+    def error(self, line, message):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self):
+        text = (
+            f"{self.rows} rows: {self.created} created, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.failed} failed"
+        )
+        if self.images or self.image_errors:
+            text += f"; {self.images} images attached, {self.image_errors} image errors"
+        return text
+
+
+def guess_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def flatten_errors(detail):
+    if isinstance(detail, dict):
+        return "; ".join(f"{field}: {flatten_errors(value)}" for field, value in detail.items())
+    if isinstance(detail, list):
+        return " ".join(flatten_errors(value) for value in detail)
+    return str(detail)
+
+
+# -------------------- PARSING --------------------
+def read_rows(binary_file, fmt):
+    """
+    Yield (line_number, row) from a binary file object without loading it.
+    Empty CSV cells are dropped, so they leave the current value (or the default) alone.
+    """
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError("Each line must be a JSON object.")
+
+
+# -------------------- IMAGES --------------------
+def download_image(url):
+    """Fetch an image and check it really is one; returns (bytes, extension)."""
+    request = urllib.request.Request(url, headers={"User-Agent": "meesho-backend-importer"})
+    with urllib.request.urlopen(request, timeout=IMAGE_TIMEOUT) as response:
+        data = response.read(IMAGE_MAX_BYTES + 1)
+    if len(data) > IMAGE_MAX_BYTES:
+        raise ValueError(f"image is larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+    with Image.open(io.BytesIO(data)) as image:
+        image.verify()
+        extension = (image.format or "jpeg").lower()
+    return data, "jpg" if extension == "jpeg" else extension
+
+
+class ImageFetcher:
+    """Download images on a thread pool; the caller's thread saves files and updates rows."""
+
+    def __init__(self, result, workers=IMAGE_WORKERS):
+        self.result = result
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = {}
+
+    def submit(self, product_id, url, line):
+        # Bound the images held in memory: wait for some to finish before queueing more.
+        while len(self.pending) >= self.workers * 4:
+            self.collect(block=True)
+        self.pending[self.executor.submit(download_image, url)] = (product_id, url, line)
+
+    def collect(self, block=False):
+        if not self.pending:
+            return
+        done, _ = wait(self.pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        attached = []
+        for future in done:
+            product_id, url, line = self.pending.pop(future)
+            try:
+                data, extension = future.result()
+            except Exception as e:
+                self.result.image_errors += 1
+                self.result.error(line, f"image_url: could not fetch {url}: {e}")
+                continue
+            digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+            name = default_storage.save(f"products/{product_id}-{digest}.{extension}", ContentFile(data))
+            attached.append(Product(pk=product_id, image_file=name))
+        if attached:
+            with transaction.atomic():
+                Product.objects.bulk_update(attached, ["image_file"])  # logged by ProductQuerySet.update
+            self.result.images += len(attached)
+
+    def close(self):
+        while self.pending:
+            self.collect(block=True)
+        self.executor.shutdown()
+
+
+# -------------------- IMPORT --------------------
+def import_products(
+    binary_file,
+    fmt="csv",
+    batch_size=BATCH_SIZE,
+    default_seller=None,
+    fetch_images=False,
+    image_workers=IMAGE_WORKERS,
+):
+    """Import products from a CSV/JSONL binary stream; returns an ImportResult."""
+    result = ImportResult()
+    # One serializer validates every row, so its fields are built once per import.
+    validator = ProductImportSerializer(context={"default_seller": default_seller})
+    fetcher = ImageFetcher(result, image_workers) if fetch_images else None
+    batch = []
+    try:
+        for line, row in read_rows(binary_file, fmt):
+            result.rows += 1
+            batch.append((line, row))
+            if len(batch) >= batch_size:
+                import_batch(batch, result, validator, fetcher)
+                batch = []
+        if batch:
+            import_batch(batch, result, validator, fetcher)
+    finally:
+        if fetcher:
+            fetcher.close()
+    return result
+
+
+def import_batch(batch, result, validator, fetcher):
+    valid = []
+    for line, row in batch:
+        if isinstance(row, Exception):
+            result.failed += 1
+            result.error(line, str(row))
+            continue
+        try:
+            data = validator.run_validation(row)
+        except serializers.ValidationError as e:
+            result.failed += 1
+            result.error(line, flatten_errors(e.detail))
+            continue
+        valid.append((line, data))
+    if not valid:
+        return
+
+    sellers = resolve({data["sold_by"] for _, data in valid})
+    rows = {}
+    for line, data in valid:
+        data["seller_id"] = sellers[data.pop("sold_by")]
+        # A SKU repeated within the batch: the later row wins.
+        rows[data["seller_id"], data["seller_sku"]] = (line, data)
+
+    candidates = Product.objects.filter(
+        seller_sku__in={sku for _, sku in rows}, seller_id__in={seller for seller, _ in rows}
+    )
+    existing = {(p.seller_id, p.seller_sku): p for p in candidates}
+
+    new, changed, changed_fields, images, reencode = [], [], set(), [], []
+    for key, (line, data) in rows.items():
+        product = existing.get(key)
+        if product is None:
+            product = Product(**data)
+            new.append(product)
+            fetch = bool(data.get("image_url"))
+        else:
+            # Only write what differs: re-importing an unchanged catalog costs one SELECT per batch.
+            diff = {field: value for field, value in data.items() if getattr(product, field) != value}
+            fetch = bool(data.get("image_url")) and ("image_url" in diff or not product.image_file)
+            if not diff:
+                result.unchanged += 1
+            else:
+                for field, value in diff.items():
+                    setattr(product, field, value)
+                changed.append(product)
+                changed_fields.update(diff)
+                if set(diff) & set(SOURCE_FIELDS):
+                    reencode.append(product)
+        if fetcher and fetch:
+            images.append((product, data["image_url"], line))
+
+    try:
+        with transaction.atomic():
+            Product.objects.bulk_create(new)
+            record_products(Product.objects.filter(pk__in=[product.pk for product in new]))
+            if changed:
+                Product.objects.bulk_update(changed, sorted(changed_fields))
+            queue_refresh([product.pk for product in new + reencode])
+            changefeed.record([product.pk for product in new])  # bulk_update logs the changed ones
+    except DatabaseError as e:
+        result.failed += len(new) + len(changed)
+        for product in new + changed:
+            result.error(rows[product.seller_id, product.seller_sku][0], f"batch not saved: {e}")
+        return
+    result.created += len(new)
+    result.updated += len(changed)
+
+    for product, url, line in images:
+        fetcher.submit(product.pk, url, line)
+    if fetcher:
+        fetcher.collect()
+
+
+# -------------------- QUEUED IMPORTS --------------------
+def run_queued():
+    """Import the oldest queued upload; returns its ProductImport, or None if none is queued."""
+    while True:
+        upload = ProductImport.objects.filter(status="queued").order_by("id").first()
+        if upload is None:
+            return None
+        # Claimed by whichever worker moves it out of "queued" first.
+        if ProductImport.objects.filter(pk=upload.pk, status="queued").update(status="running"):
+            break
+    try:
+        with upload.file.open("rb") as stream:
+            result = import_products(
+                stream,
+                fmt=upload.format,
+                default_seller=upload.default_seller or None,
+                fetch_images=upload.fetch_images,
+            )
+    except Exception as e:
+        logger.exception("Product import #%s stopped", upload.pk)
+        upload.status, upload.summary = "failed", f"Import stopped: {e}"[:255]
+    else:
+        upload.status, upload.summary, upload.errors = "done", result.summary(), result.errors
+    upload.finished_at = timezone.now()
+    upload.save(update_fields=["status", "summary", "errors", "finished_at"])
+    return upload
@@ -0,0 +1,86 @@
+"""
+Catalog change feed for client-side sync (`/api/products/changes/?since=`).
+
+Every write to a product, or to anything shown inside it (its reviews, its
+seller's name), appends a ProductChange row with `record`: shop.signals does
+it for saves, deletes and queryset updates wherever they come from, and bulk
+loaders for the rows they bulk_create. Deletions append a tombstone. ProductChange ids only
+grow, so a client keeps the token of the last change it has seen and asks
+for the ones after it: a sync reads as many rows as products changed since,
+whatever the catalog size. `?since=0` returns the whole catalog (the
+migration logged every existing product).
+
+Ids are allocated when a transaction inserts its row but become visible when
+it commits, so a slower transaction can commit a lower id after a higher one
+has been served. The feed therefore stops at the first change younger than
+SETTLE; transactions that write the catalog are much shorter than that.
+
+`manage.py compact_changes` deletes changes superseded by a later change of
+the same product, keeping the log about one row per product ever seen.
+Tombstones are kept, so an old token still learns about every deletion.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import ProductChange
+
+SETTLE = timedelta(seconds=5)
+PAGE_SIZE = 500
+BATCH_SIZE = 5000
+
+
+def record(product_ids, deleted=False):
+    """Log products as changed (or deleted); call in the transaction that writes them."""
+    ProductChange.objects.bulk_create(
+        [ProductChange(product_id=pk, deleted=deleted) for pk in sorted(set(product_ids))],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def read(since, limit=PAGE_SIZE):
+    """
+    Up to `limit` changes after token `since`, oldest first. Returns
+    (token, more, changed_ids, deleted_ids), each product once with its latest state.
+    """
+    settled = timezone.now() - SETTLE
+    rows = ProductChange.objects.filter(pk__gt=since).order_by("pk")
+    rows = list(rows.values_list("pk", "product_id", "deleted", "changed_at")[: limit + 1])
+    more = len(rows) > limit
+    token, latest = since, {}
+    for pk, product_id, deleted, changed_at in rows[:limit]:
+        if changed_at > settled:
+            more = False  # the rest is served once it settles
+            break
+        token = pk
+        latest[product_id] = deleted
+    changed = [product_id for product_id, deleted in latest.items() if not deleted]
+    deleted = [product_id for product_id, deleted in latest.items() if deleted]
+    return token, more, changed, deleted
+
+
+def latest():
+    """Token of the newest settled change: a reader starting from it sees every later change."""
+    settled = ProductChange.objects.filter(changed_at__lte=timezone.now() - SETTLE).order_by("-pk")
+    return settled.values_list("pk", flat=True).first() or 0
+
+
+def compact(batch_size=BATCH_SIZE):
+    """Delete changes superseded by a later change of the same product; returns the rows deleted."""
+    removed = 0
+    last = 0
+    while True:
+        ids = list(ProductChange.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return removed
+        later = ProductChange.objects.filter(product_id=OuterRef("product_id"), pk__gt=OuterRef("pk"))
+        superseded = list(
+            ProductChange.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+            .filter(Exists(later))
+            .values_list("pk", flat=True)
+        )
+        if superseded:
+            removed += ProductChange.objects.filter(pk__in=superseded).delete()[0]
+        last = ids[-1]
@@ -0,0 +1,210 @@
+"""
+Admin changelists for tables with millions of rows (orders, transactions,
+reviews).
+
+The stock changelist runs an exact COUNT(*) (twice), pages with OFFSET, and
+searches with `icontains`; each of those is a full scan. ScalableAdminMixin
+swaps in:
+
+- EstimatedCountPaginator: the planner's row estimate for the unfiltered
+  table (on SQLite, ANALYZE's count or the largest rowid), exact only below
+  EXACT_COUNT_BELOW rows, and a COUNT capped at COUNT_LIMIT rows for filtered
+  lists.
+- KeysetChangeList: with the default newest-first ordering, pages are read
+  with `?after=<pk>` / `?before=<pk>` cursors, i.e. `WHERE (date, pk) < anchor
+  ORDER BY date DESC, pk DESC LIMIT n` on the date index, so page 10,000 costs
+  the same as page 1. Other sorts fall back to numbered pages.
+- Search that only uses indexes: `^field` is a case-sensitive prefix match
+  (a B-tree range scan; PostgreSQL adds a `_like` index for indexed
+  CharFields) and `=field` an exact match on an integer column.
+"""
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+AFTER_VAR = "after"
+BEFORE_VAR = "before"
+COUNT_LIMIT = 10000
+EXACT_COUNT_BELOW = 100000
+
+
+def estimated_row_count(model, using):
+    """The planner's row estimate for a table, or None where the backend keeps none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == "sqlite":
+        return sqlite_row_estimate(connection, table)
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)"
+    elif connection.vendor == "mysql":
+        sql = "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first analyzed.
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+def sqlite_row_estimate(connection, table):
+    """
+    The row count ANALYZE stored in sqlite_stat1, or before the first ANALYZE
+    the largest rowid (one step down the table's B-tree; rows deleted since
+    make it an overestimate).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if cursor.fetchone():
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            row = cursor.fetchone()
+            if row and row[0]:
+                return int(row[0].split()[0])  # "rows [rows per key ...]"
+        cursor.execute(f"SELECT max(rowid) FROM {connection.ops.quote_name(table)}")
+        row = cursor.fetchone()
+    return row[0] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Count without scanning: estimate unfiltered tables, cap filtered counts."""
+
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= EXACT_COUNT_BELOW:
+                self.estimated = True
+                return estimate
+            return queryset.count()
+        # SELECT COUNT(*) FROM (... LIMIT n): stops after COUNT_LIMIT matches.
+        count = queryset.order_by()[:COUNT_LIMIT].count()
+        self.capped = count >= COUNT_LIMIT
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """Cursor pagination on the admin's `keyset_field` when the default ordering is in effect."""
+
+    keyset = False
+    next_url = None
+    previous_url = None
+    first_url = None
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # Like the page number, the cursor is not a filter and must not stick to
+        # the filter, sort and search links built from self.params.
+        if not hasattr(self, "cursor"):
+            self.cursor = {}
+            for var in (AFTER_VAR, BEFORE_VAR):
+                if var in self.params:
+                    self.cursor[var] = self.params.pop(var)
+                    del self.filter_params[var]
+        return super().get_queryset(request, exclude_parameters)
+
+    def get_results(self, request):
+        field = self.model_admin.keyset_field
+        self.keyset = bool(
+            field
+            and ORDER_VAR not in self.params
+            and not self.list_editable
+            and list(self.queryset.query.order_by) == [f"-{field}", "-pk"]
+        )
+        if self.keyset:
+            # Numbered pages are ignored; the page is chosen by the cursor below.
+            self.page_num = 1
+        super().get_results(request)
+        self.count_estimated = self.paginator.estimated
+        self.count_capped = self.paginator.capped
+        if self.keyset and not self.show_all and self.multi_page:
+            self.result_list = self.keyset_page(field)
+
+    def keyset_page(self, field):
+        per_page = self.list_per_page
+        after, before = self.cursor.get(AFTER_VAR), self.cursor.get(BEFORE_VAR)
+        queryset = self.queryset
+        if after or before:
+            try:
+                anchor_pk = after or before
+                anchor = self.model._base_manager.values_list(field, flat=True).get(pk=anchor_pk)
+            except (self.model.DoesNotExist, ValueError, ValidationError) as e:
+                raise IncorrectLookupParameters(e)
+            if after:
+                queryset = queryset.filter(**{f"{field}__lte": anchor}).exclude(
+                    Q(**{field: anchor}) & Q(pk__gte=anchor_pk)
+                )
+            else:
+                queryset = queryset.filter(**{f"{field}__gte": anchor}).exclude(
+                    Q(**{field: anchor}) & Q(pk__lte=anchor_pk)
+                ).reverse()
+        rows = list(queryset[: per_page + 1])
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before:
+            rows.reverse()
+
+        if rows and (after or (before and more)):
+            self.previous_url = self.get_query_string({BEFORE_VAR: rows[0].pk})
+            self.first_url = self.get_query_string()
+        if rows and (before or more):
+            self.next_url = self.get_query_string({AFTER_VAR: rows[-1].pk})
+        return rows
+
+
+def prefix_match(queryset, field, terms):
+    """
+    `field` starts with one of `terms`. A field behind a relation is matched in
+    a subquery on the related table's index; ORing a joined column into the
+    WHERE clause would make the planner walk this whole table.
+    """
+    relation, _, name = field.rpartition("__")
+    query = Q()
+    for term in terms:
+        if connections[queryset.db].vendor == "sqlite":
+            # SQLite's LIKE is case-insensitive, so it can't use a BINARY index; a range can.
+            query |= Q(**{f"{name}__gte": term, f"{name}__lt": term + "\U0010ffff"})
+        else:
+            query |= Q(**{f"{name}__startswith": term})
+    if not relation:
+        return query
+    related = queryset.model._meta.get_field(relation).related_model
+    return Q(**{f"{relation}__in": related._base_manager.filter(query).values("pk")})
+
+
+class ScalableAdminMixin:
+    """
+    Constant-cost changelists for big tables. Set `keyset_field` to the date
+    column of the model's `-date` Meta.ordering (backed by an index).
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Facet counts are one COUNT per filter choice over the filtered table.
+    show_facets = admin.ShowFacets.NEVER
+    keyset_field = None
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        query = Q()
+        for field in self.get_search_fields(request):
+            if field.startswith("^"):
+                query |= prefix_match(queryset, field[1:], {term, term.upper()})
+            elif field.startswith("=") and term.isdigit():
+                query |= Q(**{field[1:]: int(term)})
+        if not query:
+            return queryset.none(), False
+        return queryset.filter(query), False
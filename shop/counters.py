@@ -0,0 +1,130 @@
+"""
+Write-behind product view and click counters (and popularity score deltas).
+
+Counting a detail view with an UPDATE per request would put a row write on
+the hottest read path and queue it behind admin and checkout writes to the
+same product. Instead each worker process adds to an in-memory buffer,
+`buffer.add("view_count", product_id)`, and a background thread flushes it
+every COUNTER_FLUSH_SECONDS as a few batched statements:
+
+    UPDATE shop_product SET view_count = view_count + 3 WHERE id IN (...)
+
+(one per counter and increment, UPDATE_BATCH ids at a time, in one
+transaction). A failed flush is merged back into the buffer and retried on
+the next one. Workers flush on exit (atexit, and gunicorn's worker_exit hook
+in gunicorn.conf.py), so only a worker killed outright loses counts, at most
+one interval's worth. COUNTER_FLUSH_SECONDS = 0 writes every increment
+through at once, for tests and debugging.
+
+shop.popularity buffers its per-order score increments here too, once the
+order's transaction commits, rather than locking the product row for the
+rest of the checkout.
+
+Ids are not checked when counted: increments of products that no longer
+exist update nothing. The buffer flushes early once it holds MAX_PENDING
+entries, bounding its memory.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("view_count", "click_count")
+FIELDS = (*COUNTERS, "trending_score", "bestseller_score")  # every column buffered here
+UPDATE_BATCH = 500
+MAX_PENDING = 10000  # (counter, product) entries
+
+
+def write(pending):
+    """Apply {(counter, product_id): n} to the database in one transaction."""
+    by_increment = defaultdict(list)
+    for (field, product_id), n in pending.items():
+        by_increment[field, n].append(product_id)
+    with transaction.atomic():
+        for (field, n), product_ids in sorted(by_increment.items()):
+            product_ids.sort()
+            for start in range(0, len(product_ids), UPDATE_BATCH):
+                Product.objects.filter(pk__in=product_ids[start : start + UPDATE_BATCH]).update(
+                    **{field: F(field) + n}
+                )
+
+
+class CounterBuffer:
+    """Per-process increments waiting to be written; see the module docstring."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.stopped = threading.Event()
+        self.flusher = None
+        self.pid = None
+
+    def add(self, field, product_id, n=1):
+        if field not in FIELDS:
+            raise ValueError(f"Unknown counter: {field}")
+        if not settings.COUNTER_FLUSH_SECONDS:
+            write({(field, product_id): n})
+            return
+        with self.lock:
+            if self.pid != os.getpid() or self.flusher is None:
+                self.start()
+            self.pending[field, product_id] += n
+            full = len(self.pending) >= MAX_PENDING
+        if full:
+            self.flush()
+
+    def start(self):
+        # Lazily, after a stop, and again in a forked worker (gunicorn --preload): threads don't survive fork.
+        if self.pid not in (None, os.getpid()):
+            self.pending.clear()  # the parent's, which it flushes itself
+        self.pid = os.getpid()
+        self.stopped.clear()
+        self.flusher = threading.Thread(target=self.run, name="counter-flusher", daemon=True)
+        self.flusher.start()
+
+    def run(self):
+        while not self.stopped.wait(settings.COUNTER_FLUSH_SECONDS):
+            self.flush()
+            connections.close_all()  # this thread's connections
+
+    def flush(self):
+        """Write the buffered increments; returns the entries written."""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return 0
+        try:
+            write(pending)
+        except DatabaseError:
+            logger.exception("Flushing %d product counters failed; retrying with the next flush", len(pending))
+            with self.lock:
+                self.pending.update(pending)
+            return 0
+        return len(pending)
+
+    def stop(self):
+        """
+        Stop the flusher and write what is left; called when the worker exits,
+        and before switching databases (`manage.py bench`). Counting again restarts it.
+        """
+        if self.pid != os.getpid():
+            return
+        self.stopped.set()
+        flusher, self.flusher = self.flusher, None
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join()  # let a flush in progress finish on the same database
+        self.flush()
+
+
+buffer = CounterBuffer()
+atexit.register(buffer.stop)
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+
+# -------------------- IN-PROCESS PUB/SUB --------------------
+class StatusBroker:
+    """
+    Fan out transaction status changes to the SSE streams connected to this process.
+
+    Subscribers are asyncio queues living on the ASGI event loop; publishers may be
+    sync views running in worker threads, so delivery goes through
+    `call_soon_threadsafe`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, transaction_id):
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[transaction_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, transaction_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(transaction_id)
+            if not subscribers:
+                return
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                del self._subscribers[transaction_id]
+
+    def publish(self, transaction_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(transaction_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, payload)
+            except RuntimeError:
+                # Event loop already closed; the stream is gone.
+                pass
+
+
+broker = StatusBroker()
+
+
+def publish_status(transaction):
+    """Notify connected clients of a transaction's current status."""
+    broker.publish(
+        transaction.transaction_id,
+        {"transaction_id": transaction.transaction_id, "status": transaction.status},
+    )
+
+
+def sse_message(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpRequest, JsonResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def expiry_cutoff():
+    """Keys created before this moment are expired."""
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def request_fingerprint(request):
+    if isinstance(request, Request):
+        payload = json.dumps(request.data, sort_keys=True, default=str)
+    else:
+        payload = request.body.decode(errors="replace")
+    return hashlib.sha256(f"{request.path}\n{payload}".encode()).hexdigest()
+
+
+def lease_end():
+    return timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+
+
+def claim_key(scope, key, fingerprint):
+    """
+    Insert the key as "in progress". Returns (record, created).
+    Racing requests are serialized by the unique constraint: only one insert wins.
+    A claim whose lease ran out without a response (its worker crashed or was
+    killed) is taken over by the next request, with one conditional UPDATE so
+    that only one retry wins that race too; should the first request finish
+    after all, its response and release no longer touch the row.
+    """
+    keys = IdempotencyKey.objects.filter(scope=scope, key=key)
+    keys.filter(created_at__lt=expiry_cutoff()).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                scope=scope, key=key, request_hash=fingerprint, locked_until=lease_end()
+            )
+            return record, True
+    except IntegrityError:
+        pass
+    now = timezone.now()
+    stale = keys.filter(status_code__isnull=True, locked_until__lt=now)
+    if stale.update(request_hash=fingerprint, locked_until=lease_end()):
+        return keys.first(), True
+    return keys.first(), False
+
+
+def held(record):
+    """The record's row, unless another request has taken the key over since."""
+    return IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until)
+
+
+def release_key(record):
+    held(record).delete()
+
+
+def store_response(record, response):
+    """Save the first response for replay; server errors release the key instead."""
+    if response.status_code >= 500:
+        release_key(record)
+        return
+    if isinstance(response, Response):
+        data = response.data
+    else:
+        data = json.loads(response.content)
+    held(record).update(status_code=response.status_code, response=data, locked_until=None)
+
+
+def idempotent(scope):
+    """
+    Make a POST handler safe to retry with an `Idempotency-Key` header.
+
+    The first response is stored and replayed for later requests with the same
+    key, without running the handler again. Requests without the header are
+    handled normally. Works on DRF views and viewset methods, and on plain
+    (sync or async) Django views returning JsonResponse.
+    """
+    def decorator(handler):
+        if asyncio.iscoroutinefunction(handler):
+            @wraps(handler)
+            async def async_wrapper(*args, **kwargs):
+                request, key = find_request(args)
+                if not key:
+                    return await handler(*args, **kwargs)
+                if len(key) > 255:
+                    return key_too_long(request)
+
+                fingerprint = request_fingerprint(request)
+                record, created = await sync_to_async(claim_key)(scope, key, fingerprint)
+                if not created:
+                    return replay(request, record, fingerprint)
+
+                try:
+                    response = await handler(*args, **kwargs)
+                except Exception:
+                    await sync_to_async(release_key)(record)
+                    raise
+                await sync_to_async(store_response)(record, response)
+                return response
+            return async_wrapper
+
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            request, key = find_request(args)
+            if not key:
+                return handler(*args, **kwargs)
+            if len(key) > 255:
+                return key_too_long(request)
+
+            fingerprint = request_fingerprint(request)
+            record, created = claim_key(scope, key, fingerprint)
+            if not created:
+                return replay(request, record, fingerprint)
+
+            try:
+                response = handler(*args, **kwargs)
+            except Exception:
+                release_key(record)
+                raise
+            store_response(record, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def find_request(args):
+    request = next(arg for arg in args if isinstance(arg, (Request, HttpRequest)))
+    return request, request.headers.get(HEADER)
+
+
+def respond(request, data, status_code, headers=None):
+    """Build a response of the kind the wrapped view returns."""
+    if isinstance(request, Request):
+        return Response(data, status=status_code, headers=headers)
+    return JsonResponse(data, status=status_code, headers=headers, safe=False)
+
+
+def key_too_long(request):
+    return respond(
+        request,
+        {"status": "error", "message": f"{HEADER} must be at most 255 characters."},
+        status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def replay(request, record, fingerprint):
+    if record is None or record.status_code is None:
+        return respond(
+            request,
+            {"status": "error", "message": "A request with this Idempotency-Key is still being processed."},
+            status.HTTP_409_CONFLICT,
+            headers={"Retry-After": "1"},
+        )
+    if record.request_hash != fingerprint:
+        return respond(
+            request,
+            {"status": "error", "message": "Idempotency-Key was already used with a different request."},
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return respond(
+        request,
+        record.response,
+        record.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
@@ -0,0 +1,227 @@
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Order, ProductStock, StockReservation
+from .rollups import ORDER_FIELDS, change_order_status
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, size, requested, available):
+        self.product_id = product_id
+        self.size = size
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Only {available} unit(s) left in size {size}.")
+
+
+# -------------------- STOCK DECREMENT --------------------
+def decrement_stock(product_id, size, quantity):
+    """
+    Take `quantity` units of a product size, or raise OutOfStock.
+
+    Fast path: a conditional `UPDATE ... SET quantity = quantity - n WHERE
+    quantity >= n` on one shard, trying shards in random order so concurrent
+    buyers spread over different rows. Only when no single shard can cover the
+    request are all shards locked and drained together.
+    Returns False if the size has no stock rows (untracked), True otherwise.
+    """
+    shards = list(
+        ProductStock.objects.filter(product_id=product_id, size=size).values_list("shard", "quantity")
+    )
+    if not shards:
+        return False
+
+    random.shuffle(shards)
+    # Shards that looked big enough are tried first; the quantities are only a hint.
+    shards.sort(key=lambda shard: shard[1] < quantity)
+    rows = ProductStock.objects.filter(product_id=product_id, size=size)
+    for shard, _ in shards:
+        if rows.filter(shard=shard, quantity__gte=quantity).update(quantity=F("quantity") - quantity):
+            return True
+
+    if len(shards) > 1:
+        drain_shards(product_id, size, quantity)
+        return True
+
+    available = rows.aggregate(total=Sum("quantity"))["total"] or 0
+    raise OutOfStock(product_id, size, quantity, available)
+
+
+def drain_shards(product_id, size, quantity):
+    """Slow path: take units across several shards under a row lock."""
+    with transaction.atomic():
+        locked = list(
+            ProductStock.objects.select_for_update()
+            .filter(product_id=product_id, size=size, quantity__gt=0)
+            .order_by("shard")
+        )
+        available = sum(stock.quantity for stock in locked)
+        if available < quantity:
+            raise OutOfStock(product_id, size, quantity, available)
+
+        remaining = quantity
+        for stock in locked:
+            taken = min(stock.quantity, remaining)
+            stock.quantity -= taken
+            remaining -= taken
+            if not remaining:
+                break
+        ProductStock.objects.bulk_update(locked, ["quantity"])
+
+
+def release_stock(product_id, size, quantity):
+    """Return units to a random shard (e.g. when an unpaid order is cancelled)."""
+    shard = (
+        ProductStock.objects.filter(product_id=product_id, size=size)
+        .order_by("?")
+        .values_list("shard", flat=True)
+        .first()
+    )
+    if shard is not None:
+        ProductStock.objects.filter(product_id=product_id, size=size, shard=shard).update(
+            quantity=F("quantity") + quantity
+        )
+
+
+# -------------------- STOCK SETUP --------------------
+def set_stock(product, size, quantity, shards=1):
+    """Replace the stock of a product size, split evenly over `shards` rows."""
+    base, extra = divmod(quantity, shards)
+    with transaction.atomic():
+        ProductStock.objects.filter(product=product, size=size).delete()
+        ProductStock.objects.bulk_create(
+            ProductStock(product=product, size=size, shard=i, quantity=base + (i < extra))
+            for i in range(shards)
+        )
+
+
+def stock_level(product_id, size):
+    """Total units left for a size, or None when the size isn't tracked."""
+    return ProductStock.objects.filter(product_id=product_id, size=size).aggregate(
+        total=Sum("quantity")
+    )["total"]
+
+
+# -------------------- RESERVATIONS --------------------
+def reserve_stock(orders, tracked):
+    """
+    Hold the stock taken for `orders` until the payment TTL runs out.
+    `tracked` is the set of (product_id, size) pairs whose stock was decremented.
+    """
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    StockReservation.objects.bulk_create(
+        StockReservation(
+            order_id=order.pk,
+            product_id=order.product_id,
+            size=order.size,
+            quantity=order.quantity,
+            expires_at=expires_at,
+        )
+        for order in orders
+        if (order.product_id, order.size) in tracked
+    )
+
+
+def confirm_reservations(order_ids):
+    """The orders are paid: keep their units sold and drop the holds."""
+    StockReservation.objects.filter(order_id__in=order_ids).delete()
+
+
+def return_held_units(reservations):
+    """Put the units of these holds back in stock and delete them."""
+    returned = defaultdict(int)
+    for reservation in reservations:
+        returned[reservation.product_id, reservation.size] += reservation.quantity
+    for (product_id, size), quantity in sorted(returned.items()):
+        release_stock(product_id, size, quantity)
+    StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()
+
+
+def release_reservations(order_ids):
+    """
+    The orders won't be paid: drop their holds and put the units back in stock.
+    Holds of orders marked paid are left for confirm_reservations. Returns the holds released.
+    """
+    unpaid = Order.objects.filter(pk__in=order_ids).exclude(payment_status="paid").values("pk")
+    with transaction.atomic():
+        held = list(StockReservation.objects.select_for_update().filter(order_id__in=unpaid))
+        return_held_units(held)
+    return len(held)
+
+
+# -------------------- PAYMENT OUTCOMES --------------------
+# Every path that moves an order to paid or failed goes through these, so holds
+# are confirmed or released in one place.
+def fail_orders(order_ids, from_status=None):
+    """Mark orders failed and return their held units to stock; returns the orders changed."""
+    with transaction.atomic():
+        failed = change_order_status(order_ids, "failed", from_status=from_status)
+        release_reservations(order_ids)
+    return failed
+
+
+def pay_orders(order_ids):
+    """
+    A payment succeeded: mark the orders paid and keep their units. An order the
+    sweeper already failed, whose units went back to stock, takes them again;
+    when they have sold out meanwhile it stays failed, is logged and returned
+    for refund (`manage.py reconcile` keeps reporting it). Returns (paid, unfilled).
+    """
+    with transaction.atomic():
+        paid = change_order_status(order_ids, "paid", from_status="pending")
+        late = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, payment_status="failed")
+            .only(*ORDER_FIELDS, "size")
+        )
+        still_held = set(StockReservation.objects.filter(order__in=late).values_list("order_id", flat=True))
+        restocked, unfilled = [], []
+        for order in late:
+            try:
+                if order.pk not in still_held:
+                    with transaction.atomic():
+                        decrement_stock(order.product_id, order.size, order.quantity)
+                restocked.append(order.pk)
+            except OutOfStock:
+                unfilled.append(order)
+        paid += change_order_status(restocked, "paid", from_status="failed")
+        confirm_reservations([order.pk for order in paid])
+    for order in unfilled:
+        logger.warning("Order %s was paid after its hold expired and size %s sold out; refund it", order.pk, order.size)
+    return paid, unfilled
+
+
+def expire_reservations(batch_size=1000, now=None):
+    """
+    Release one batch of expired holds, oldest first, using the expires_at index.
+    Orders still pending are marked failed; the units of every order not paid
+    (including ones failed earlier by hand or by reconcile) go back to stock.
+    Returns the number of reservations removed.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(
+            StockReservation.objects.select_for_update(
+                skip_locked=connection.features.has_select_for_update_skip_locked
+            )
+            .filter(expires_at__lte=now)
+            .order_by("expires_at")[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        order_ids = [reservation.order_id for reservation in batch]
+        change_order_status(order_ids, "failed", from_status="pending")
+        paid = set(Order.objects.filter(pk__in=order_ids, payment_status="paid").values_list("pk", flat=True))
+        return_held_units([reservation for reservation in batch if reservation.order_id not in paid])
+        confirm_reservations(paid)
+    return len(batch)
@@ -0,0 +1,118 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+DEPLOYMENTS = {
+    "wsgi": ["backend.wsgi:application"],
+    "asgi": ["backend.asgi:application", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+
+# -------------------- HTTP LOAD GENERATOR --------------------
+def timed_request(url, method="GET", body=None, headers=None, timeout=30):
+    """Issue one request; returns (latency_seconds, status_code)."""
+    request = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            code = response.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    except OSError:
+        code = 0
+    return time.perf_counter() - start, code
+
+
+def run_load(urls, total, concurrency):
+    """
+    Fire `total` GET requests, cycling through `urls`, from `concurrency` threads.
+    Returns a summary dict (see `summarize`).
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: timed_request(urls[i % len(urls)]), range(total)))
+    elapsed = time.perf_counter() - start
+    return summarize([latency for latency, _ in results], elapsed, [code for _, code in results])
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, codes=()):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": sum(1 for code in codes if not 200 <= code < 400),
+        "rps": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+    }
+
+
+def format_summary(label, summary):
+    return (
+        f"{label:<30} {summary['requests']:>7} req  {summary['errors']:>5} err  "
+        f"{summary['rps']:>9.1f} req/s  p50 {summary['p50_ms']:>7.1f} ms  "
+        f"p95 {summary['p95_ms']:>7.1f} ms  p99 {summary['p99_ms']:>7.1f} ms"
+    )
+
+
+def wait_until_up(url, timeout=30):
+    """Poll `url` until the server answers; raises TimeoutError otherwise."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        _, code = timed_request(url, timeout=2)
+        if code:
+            return
+        time.sleep(0.2)
+    raise TimeoutError(f"Server at {url} did not start within {timeout}s")
+
+
+def start_server(deployment, workers, port, env=None):
+    """Start gunicorn for a WSGI or ASGI (uvicorn worker) deployment of the project."""
+    command = [
+        sys.executable, "-m", "gunicorn", *DEPLOYMENTS[deployment],
+        "--workers", str(workers),
+        "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=settings.BASE_DIR, env={**os.environ, "DEBUG": "False", **(env or {})})
+
+
+# -------------------- HTTP CLIENT --------------------
+class HTTPClient:
+    """Minimal JSON client against a running server, mirroring `request()` of InProcessClient."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=body,
+            method=method,
+            headers={"Content-Type": "application/json"} if body else {},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, None
+        except OSError:
+            return 0, None
@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop import counters
+from shop.benchmarks import InProcessClient, Scenarios, compare_to_baseline, seed_benchmark_data
+from shop.loadtest import DEPLOYMENTS, HTTPClient, format_summary, start_server, wait_until_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with a deterministic dataset, run the browse / "
+        "product detail / checkout / verify payment scenarios against the app "
+        "in-process or over gunicorn (WSGI) / uvicorn workers (ASGI), and compare "
+        "throughput and p95/p99 latency with a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["inprocess", *sorted(DEPLOYMENTS)], default="inprocess")
+        parser.add_argument("--iterations", type=int, default=1000, help="Scenario runs (default: 1000).")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8).")
+        parser.add_argument("--workers", type=int, default=2, help="Server worker processes (default: 2).")
+        parser.add_argument("--port", type=int, default=8766, help="Port to bind the server under test.")
+        parser.add_argument("--products", type=int, default=500, help="Seeded products (default: 500).")
+        parser.add_argument("--orders", type=int, default=2000, help="Seeded orders (default: 2000).")
+        parser.add_argument("--seed", type=int, default=38, help="Random seed for data and scenarios.")
+        parser.add_argument(
+            "--baseline",
+            default=str(Path(settings.BASE_DIR) / "benchmarks" / "baseline.json"),
+            help="Baseline file; results are stored per mode.",
+        )
+        parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed slowdown before a metric counts as a regression (default: 0.2 = 20%%).",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The benchmark uses a scratch SQLite database; run it with a SQLite DATABASE_URL.")
+
+        with tempfile.TemporaryDirectory() as scratch:
+            # Never touch the real database: build, migrate and seed a throwaway copy.
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(scratch, "bench.sqlite3")
+            old_name = connection.settings_dict["NAME"]
+            database = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                dataset = seed_benchmark_data(options["products"], options["orders"], seed=options["seed"])
+                results = self.run_scenarios(dataset, database, options)
+            finally:
+                # Counts from the in-process scenarios belong to the scratch database.
+                counters.buffer.stop()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{options['mode']} ({options['iterations']} scenario runs)"))
+        for label, summary in results.items():
+            self.stdout.write(format_summary(label, summary))
+        self.check_baseline(results, options)
+
+    def run_scenarios(self, dataset, database, options):
+        scenarios = Scenarios(dataset, seed=options["seed"])
+        if options["mode"] == "inprocess":
+            return scenarios.run(InProcessClient, options["iterations"], options["concurrency"])
+
+        base = f"http://127.0.0.1:{options['port']}"
+        connection.close()
+        server = start_server(
+            options["mode"], options["workers"], options["port"], env={"DATABASE_URL": f"sqlite:///{database}"}
+        )
+        try:
+            wait_until_up(f"{base}/")
+            return scenarios.run(lambda: HTTPClient(base), options["iterations"], options["concurrency"])
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def check_baseline(self, results, options):
+        path = Path(options["baseline"])
+        baselines = json.loads(path.read_text()) if path.exists() else {}
+
+        if options["save_baseline"]:
+            baselines[options["mode"]] = results
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(baselines, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f"Saved {options['mode']} baseline to {path}."))
+            return
+
+        if options["mode"] not in baselines:
+            self.stdout.write(self.style.WARNING(f"No {options['mode']} baseline in {path}; run with --save-baseline."))
+            return
+        regressions = compare_to_baseline(results, baselines[options["mode"]], options["tolerance"])
+        for label, metric, before, after in regressions:
+            self.stdout.write(self.style.ERROR(f"{label} {metric}: {before:.1f} -> {after:.1f}"))
+        if regressions:
+            raise CommandError(f"{len(regressions)} metric(s) regressed by more than {options['tolerance']:.0%}.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
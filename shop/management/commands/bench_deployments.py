@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from shop.loadtest import DEPLOYMENTS, format_summary, run_load, start_server, wait_until_up
+from shop.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/second and latency percentiles of the payment endpoints "
+        "under gunicorn sync workers (WSGI) and uvicorn workers (ASGI)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint (default: 2000).")
+        parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients (default: 64).")
+        parser.add_argument("--workers", type=int, default=2, help="Server worker processes (default: 2).")
+        parser.add_argument("--port", type=int, default=8765, help="Port to bind the server under test.")
+        parser.add_argument(
+            "--deployment",
+            choices=sorted(DEPLOYMENTS),
+            action="append",
+            help="Only benchmark this deployment (repeatable). Default: all.",
+        )
+
+    def handle(self, *args, **options):
+        base = f"http://127.0.0.1:{options['port']}"
+        endpoints = {"get_active_upi": "/api/get-upi/"}
+        order_id = Order.objects.values_list("order_id", flat=True).first()
+        if order_id:
+            endpoints["generate_upi"] = f"/api/generate-upi/{order_id}/"
+        else:
+            self.stdout.write(self.style.WARNING("No orders in the database; skipping generate_upi."))
+
+        for name in options["deployment"] or sorted(DEPLOYMENTS, reverse=True):
+            server = start_server(name, options["workers"], options["port"])
+            try:
+                wait_until_up(f"{base}/")
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{name.upper()} ({options['workers']} workers)"))
+                for label, path in endpoints.items():
+                    run_load([f"{base}{path}"], min(100, options["requests"]), options["concurrency"])  # warm-up
+                    summary = run_load([f"{base}{path}"], options["requests"], options["concurrency"])
+                    self.stdout.write(format_summary(label, summary))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
@@ -0,0 +1,97 @@
+import multiprocessing
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from backend.db.sqlite3.base import configure_connection
+
+SCHEMA = """
+CREATE TABLE stock (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL);
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY,
+    stock_id INTEGER NOT NULL,
+    order_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL
+);
+INSERT INTO stock (id, quantity) VALUES (1, 1000000000);
+"""
+
+
+def run_writer(path, profile, worker, transactions, results):
+    """
+    One worker process placing orders: read stock, decrement it, insert the
+    order - the read-then-write shape of checkout, one transaction per order.
+    """
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    begin = "BEGIN"
+    if profile == "production":
+        configure_connection(conn)
+        begin = "BEGIN IMMEDIATE"
+
+    committed = errors = 0
+    start = time.perf_counter()
+    for i in range(transactions):
+        try:
+            conn.execute(begin)
+            conn.execute("SELECT quantity FROM stock WHERE id = 1").fetchone()
+            conn.execute("UPDATE stock SET quantity = quantity - 1 WHERE id = 1 AND quantity >= 1")
+            conn.execute(
+                "INSERT INTO orders (stock_id, order_id, created_at) VALUES (1, ?, ?)",
+                (f"{worker}-{i}", time.time()),
+            )
+            conn.execute("COMMIT")
+            committed += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    results.put((committed, errors, time.perf_counter() - start))
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare multi-process write throughput on SQLite with the default "
+        "settings and with the production profile (WAL, tuned pragmas, BEGIN IMMEDIATE). "
+        "Runs against a scratch database file, not the project database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8, help="Writer processes (default: 8).")
+        parser.add_argument(
+            "--transactions", type=int, default=500, help="Transactions per process (default: 500)."
+        )
+
+    def handle(self, *args, **options):
+        for profile in ("default", "production"):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = str(Path(tmp) / "bench.sqlite3")
+                setup = sqlite3.connect(path)
+                setup.executescript(SCHEMA)
+                setup.close()
+
+                results = multiprocessing.Queue()
+                workers = [
+                    multiprocessing.Process(
+                        target=run_writer,
+                        args=(path, profile, n, options["transactions"], results),
+                    )
+                    for n in range(options["processes"])
+                ]
+                start = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                outcomes = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                elapsed = time.perf_counter() - start
+
+            committed = sum(outcome[0] for outcome in outcomes)
+            errors = sum(outcome[1] for outcome in outcomes)
+            self.stdout.write(
+                f"{profile:<11} {committed:>7} committed  {errors:>6} 'database is locked'  "
+                f"{committed / elapsed:>9.1f} tx/s  ({elapsed:.2f}s)"
+            )
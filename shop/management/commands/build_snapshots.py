@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.snapshots import build, refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the product list, its hot ranked pages and every product's detail "
+        "document to SNAPSHOT_ROOT for SnapshotMiddleware to serve, or with --changed "
+        "only what changed since the last run. Run the full build nightly and "
+        "--changed from cron, or with --loop as a background worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--changed",
+            action="store_true",
+            help="Only re-render products changed since the last run, the list and the ranked pages.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="With --changed, keep running, refreshing every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=30,
+            help="Seconds between passes with --loop (default: 30).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            written, removed = refresh() if options["changed"] else build()
+            if written or removed or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Wrote {written} documents and removed {removed} "
+                        f"in {time.perf_counter() - started:.1f}s."
+                    )
+                )
+            if not (options["changed"] and options["loop"]):
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.changefeed import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete catalog change-log rows superseded by a later change of the "
+        "same product, so the change feed stays about one row per product. "
+        "Run from cron, or with --loop as a background worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, compacting every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=3600,
+            help="Seconds between passes with --loop (default: 3600).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            removed = compact()
+            self.stdout.write(
+                self.style.SUCCESS(f"Removed {removed} superseded changes in {time.perf_counter() - started:.1f}s.")
+            )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.popularity import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the trending and bestseller scores from the sales rollups, "
+        "applying the decay and the sliding windows. Run from cron, or with "
+        "--loop as a background worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, compacting every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=600,
+            help="Seconds between passes with --loop (default: 600).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            trending, bestseller = compact()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Scored {trending} trending and {bestseller} bestselling products "
+                    f"in {time.perf_counter() - started:.1f}s."
+                )
+            )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.similarity import Catalog, compute_all, refresh_queued
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute every product's most similar products, or with --changed only "
+        "those queued since their attributes changed. Run the full pass nightly "
+        "and --changed from cron, or with --loop as a background worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--changed",
+            action="store_true",
+            help="Only refresh products queued after an edit or import.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=10000,
+            help="Queued products refreshed per pass with --changed (default: 10000).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help=(
+                "With --changed, keep running, refreshing every --interval seconds. The worker "
+                "loads the catalog once and then reads only queued and changed products."
+            ),
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds between passes with --loop (default: 60).",
+        )
+
+    def handle(self, *args, **options):
+        if not options["changed"]:
+            started = time.perf_counter()
+            products = compute_all()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Computed neighbours for {products} products in {time.perf_counter() - started:.1f}s."
+                )
+            )
+            return
+        # A worker keeps the catalog and reads only what changed on each pass.
+        catalog = Catalog.load() if options["loop"] else None
+        while True:
+            started = time.perf_counter()
+            queued, recomputed = refresh_queued(limit=options["limit"], catalog=catalog)
+            if queued or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Refreshed {queued} changed products ({recomputed} neighbour lists) "
+                        f"in {time.perf_counter() - started:.1f}s."
+                    )
+                )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from shop.idempotency import expiry_cutoff
+from shop.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of keys deleted per statement (default: 5000).",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = expiry_cutoff()
+        expired = IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by("created_at")
+
+        deleted = 0
+        while True:
+            pks = list(expired.values_list("pk", flat=True)[: options["batch_size"]])
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.inventory import expire_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Release stock held by orders whose payment was not confirmed within "
+        "STOCK_RESERVATION_TTL. Run from cron, or with --loop as a background sweeper."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Reservations released per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, sweeping every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=30,
+            help="Seconds between sweeps with --loop (default: 30).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = 0
+            while batch := expire_reservations(batch_size=options["batch_size"]):
+                released += batch
+            if released or not options["loop"]:
+                self.stdout.write(self.style.SUCCESS(f"Released {released} expired reservations."))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,97 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_import import BATCH_SIZE, FORMATS, IMAGE_WORKERS, guess_format, import_products, run_queued
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products from a CSV or JSONL file, matched on (seller, seller_sku). "
+        "Invalid rows are reported and skipped. With --queued, run the files uploaded in the admin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="CSV or JSONL file with one product per row.")
+        parser.add_argument(
+            "--queued",
+            action="store_true",
+            help="Import the files queued from the admin's product import, oldest first.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="With --queued, keep running, checking for uploads every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10,
+            help="Seconds between checks with --loop (default: 10).",
+        )
+        parser.add_argument("--format", choices=FORMATS, help="File format (default: from the extension).")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Rows validated and written per batch (default: {BATCH_SIZE}).",
+        )
+        parser.add_argument("--seller", help="sold_by for rows that do not name a seller.")
+        parser.add_argument(
+            "--fetch-images",
+            action="store_true",
+            help="Download image_url into the product's uploaded image.",
+        )
+        parser.add_argument(
+            "--image-workers",
+            type=int,
+            default=IMAGE_WORKERS,
+            help=f"Concurrent image downloads (default: {IMAGE_WORKERS}).",
+        )
+
+    def handle(self, *args, **options):
+        if options["queued"]:
+            return self.run_queued(options["loop"], options["interval"])
+        if not options["path"]:
+            raise CommandError("Give a file to import, or --queued.")
+        if options["batch_size"] < 1 or options["image_workers"] < 1:
+            raise CommandError("--batch-size and --image-workers must be positive.")
+        try:
+            stream = open(options["path"], "rb")
+        except OSError as e:
+            raise CommandError(f"Cannot open {options['path']}: {e}")
+
+        start = time.perf_counter()
+        with stream:
+            result = import_products(
+                stream,
+                fmt=options["format"] or guess_format(options["path"]),
+                batch_size=options["batch_size"],
+                default_seller=options["seller"],
+                fetch_images=options["fetch_images"],
+                image_workers=options["image_workers"],
+            )
+        elapsed = time.perf_counter() - start
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.failed + result.image_errors > len(result.errors):
+            self.stderr.write(f"... only the first {len(result.errors)} errors are shown.")
+        summary = (
+            f"{result.rows} rows in {elapsed:.1f}s: {result.created} created, {result.updated} updated, "
+            f"{result.unchanged} unchanged, {result.failed} failed"
+        )
+        if options["fetch_images"]:
+            summary += f"; {result.images} images attached, {result.image_errors} image errors"
+        self.stdout.write(self.style.SUCCESS(summary) if not result.failed else self.style.WARNING(summary))
+
+    def run_queued(self, loop, interval):
+        while True:
+            upload = run_queued()
+            if upload:
+                style = self.style.SUCCESS if upload.status == "done" else self.style.WARNING
+                self.stdout.write(style(f"{upload}: {upload.summary}"))
+                continue
+            if not loop:
+                return
+            time.sleep(interval)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.profiling import TOKEN_HEADER, make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed token that enables per-request profiling when sent as a header."
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{TOKEN_HEADER}: {make_token()}\n"
+            f"(valid for {settings.PROFILE_TOKEN_MAX_AGE} seconds)"
+        )
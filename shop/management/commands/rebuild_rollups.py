@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop.rollups import RollupQueryError, date_range, first_moment, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the hourly and daily sales / payment rollups from orders and "
+        "transactions, one day per transaction. Use after bulk loads or manual SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from", help="First day to rebuild (default: first order).")
+        parser.add_argument("--to", dest="to", help="Last day to rebuild (default: today).")
+
+    def handle(self, *args, **options):
+        if not options["from"]:
+            first = first_moment()
+            if not first:
+                self.stdout.write("No orders or transactions; nothing to rebuild.")
+                return
+            options["from"] = timezone.localdate(first).isoformat()
+        try:
+            start, end = date_range({"from": options["from"], "to": options["to"]})
+        except RollupQueryError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        day = start
+        days = 0
+        while day < end:
+            following = timezone.make_aware(timezone.make_naive(day) + timedelta(days=1))
+            rebuild(day, following)
+            day = following
+            days += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {days} day(s) of rollups in {time.perf_counter() - started:.1f}s.")
+        )
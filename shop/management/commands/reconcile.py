@@ -0,0 +1,113 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from shop.inventory import fail_orders, pay_orders
+from shop.models import Order, Transaction
+from shop.rollups import ORDER_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile Order.payment_status against linked transactions. "
+        "Walks orders and transactions in primary-key order, one batch at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of orders loaded and updated per batch (default: 1000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report changes and mismatches without writing them.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        verbose = options["verbosity"] >= 2
+
+        scanned = updated = mismatches = 0
+        last_pk = 0
+        while True:
+            orders = list(
+                Order.objects.filter(pk__gt=last_pk)
+                .only("order_id", *ORDER_FIELDS)
+                .order_by("pk")[:batch_size]
+            )
+            if not orders:
+                break
+            last_pk = orders[-1].pk
+            scanned += len(orders)
+
+            payments = self.payments_by_order(orders[0].pk, last_pk)
+            changed = []
+            for order in orders:
+                rows = payments.get(order.pk, [])
+                for problem in self.find_mismatches(order, rows):
+                    mismatches += 1
+                    if verbose:
+                        self.stdout.write(self.style.WARNING(f"{order.order_id}: {problem}"))
+
+                expected = self.expected_status(rows)
+                if expected and expected != order.payment_status:
+                    changed.append((order, order.payment_status))
+                    order.payment_status = expected
+
+            if changed and not dry_run:
+                # Through the inventory helpers, so holds are kept or released and a
+                # failed order paid late takes its units again (or stays failed if sold out).
+                with db_transaction.atomic():
+                    pay_orders([order.pk for order, _ in changed if order.payment_status == "paid"])
+                    fail_orders([order.pk for order, _ in changed if order.payment_status == "failed"])
+            updated += len(changed)
+
+        unlinked = Transaction.objects.filter(order__isnull=True).count()
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Scanned {scanned} orders, updated {updated}, "
+                f"{mismatches} mismatches, {unlinked} unlinked transactions."
+            )
+        )
+
+    def payments_by_order(self, first_pk, last_pk):
+        """Return {order_pk: [(status, amount, transaction_id), ...]} for a key range."""
+        rows = (
+            Transaction.objects.filter(order_id__gte=first_pk, order_id__lte=last_pk)
+            .order_by("order_id", "pk")
+            .values_list("order_id", "status", "amount", "transaction_id")
+        )
+        return {
+            order_pk: [row[1:] for row in group]
+            for order_pk, group in groupby(rows.iterator(), key=lambda row: row[0])
+        }
+
+    def expected_status(self, rows):
+        """
+        Derive an order's payment status from its transactions.
+        Returns None when the transactions are inconclusive.
+        """
+        statuses = {status for status, _, _ in rows}
+        if "success" in statuses:
+            return "paid"
+        if statuses == {"failed"}:
+            return "failed"
+        return None
+
+    def find_mismatches(self, order, rows):
+        successes = [(amount, tid) for status, amount, tid in rows if status == "success"]
+        if order.payment_status == "paid" and not successes:
+            yield "marked paid without a successful transaction"
+        if order.payment_status == "failed" and successes:
+            yield "paid after its hold expired and sold out; refund it"
+        if len(successes) > 1:
+            yield f"{len(successes)} successful transactions"
+        for amount, tid in successes:
+            if amount != order.final_price:
+                yield f"transaction {tid} amount {amount} != order total {order.final_price}"
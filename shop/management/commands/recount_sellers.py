@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.sellers import recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every seller's cached product count and rating totals from "
+        "the products and reviews. Run from cron, or with --loop as a "
+        "background worker, to repair drift from concurrent edits or bulk SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, recounting every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=3600,
+            help="Seconds between passes with --loop (default: 3600).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            corrected = recount()
+            self.stdout.write(
+                self.style.SUCCESS(f"Corrected {corrected} sellers in {time.perf_counter() - started:.1f}s.")
+            )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
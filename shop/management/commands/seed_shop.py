@@ -0,0 +1,122 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from shop import popularity
+from shop.models import Order, Product, ProductReview, Transaction, UPIConfig
+from shop.seeding import record_reviewed, run_chunk, seed_sellers, seed_upi_configs
+from shop.sellers import recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset (products, reviews, orders, "
+        "transactions, UPI IDs) with realistic distributions. Rows are inserted with "
+        "batched bulk_create, optionally from several processes, and the rollups, "
+        "popularity scores and seller counts they bypass are rebuilt afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000, help="Products to create (default: 10000).")
+        parser.add_argument("--reviews", type=int, default=100000, help="Reviews to create (default: 100000).")
+        parser.add_argument("--orders", type=int, default=100000, help="Orders to create (default: 100000).")
+        parser.add_argument("--upi-configs", type=int, default=3, help="UPI IDs to create (default: 3).")
+        parser.add_argument("--days", type=int, default=365, help="Spread orders and reviews over this many days.")
+        parser.add_argument("--seed", type=int, default=39, help="Random seed (default: 39).")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows generated and inserted per bulk_create (default: 5000).",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Worker processes inserting chunks in parallel (default: 1; ignored on SQLite).",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["processes"] < 1:
+            raise CommandError("--batch-size and --processes must be positive.")
+        if options["processes"] > 1 and connection.vendor == "sqlite":
+            self.stdout.write(self.style.WARNING("SQLite allows one writer at a time; using a single process."))
+            options["processes"] = 1
+        if options["reviews"] or options["orders"]:
+            if options["products"] < 1:
+                raise CommandError("Reviews and orders need at least one seeded product.")
+
+        plan = {
+            "seed": options["seed"],
+            "products": options["products"],
+            "days": options["days"],
+            "now": timezone.now(),
+            # Seeded products and orders take the primary keys after the current maximum.
+            "product_base": (Product.objects.aggregate(last=Max("pk"))["last"] or 0) + 1,
+            "order_base": (Order.objects.aggregate(last=Max("pk"))["last"] or 0) + 1,
+            # Reviews keep database-assigned keys; the seeded ones come after this one.
+            "last_review": ProductReview.objects.aggregate(last=Max("pk"))["last"] or 0,
+        }
+
+        started = time.perf_counter()
+        seed_upi_configs(options["upi_configs"], options["seed"])
+        plan["seller_ids"] = seed_sellers(max(1, options["products"] // 50))
+        for kind in ("products", "orders", "reviews"):
+            self.seed(kind, plan, options[kind], options)
+        self.reset_sequences()
+        self.rebuild_derived(plan, options)
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s."))
+
+    def seed(self, kind, plan, total, options):
+        if not total:
+            return
+        size = options["batch_size"]
+        chunks = [(kind, plan, start, min(start + size, total)) for start in range(0, total, size)]
+
+        start = time.perf_counter()
+        if options["processes"] == 1:
+            created = sum(run_chunk(*chunk) for chunk in chunks)
+        else:
+            # Forked workers inherit the configured Django; each opens its own connection.
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=options["processes"], mp_context=context) as pool:
+                created = sum(pool.map(run_chunk, *zip(*chunks)))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{kind}: {created} rows in {elapsed:.1f}s ({created / elapsed:,.0f} rows/s)")
+
+    def rebuild_derived(self, plan, options):
+        """bulk_create skips the hooks that keep rollups, scores, seller counts and the change feed current."""
+        if options["reviews"]:
+            record_reviewed(plan["last_review"])
+        if options["orders"]:
+            now = plan["now"]
+            call_command(
+                "rebuild_rollups",
+                **{
+                    "from": timezone.localdate(now - timedelta(days=plan["days"])).isoformat(),
+                    # Payments land up to ten minutes after their order.
+                    "to": timezone.localdate(now + timedelta(minutes=10)).isoformat(),
+                },
+                stdout=self.stdout,
+            )
+            trending, bestseller = popularity.compact()
+            self.stdout.write(f"Scored {trending} trending and {bestseller} bestselling products.")
+        recount()
+
+    def reset_sequences(self):
+        """Explicit primary keys bypass PostgreSQL sequences; move them past the seeded rows."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Product, Order, ProductReview, Transaction, UPIConfig]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework import serializers
+
+from shop import counters
+from shop.inventory import set_stock, stock_level
+from shop.models import Order, Product, Seller
+from shop.serializers import OrderSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire many concurrent buyers at a single product size in a scratch "
+        "database and check that exactly the stocked number of units is sold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--units", type=int, default=100, help="Units in stock (default: 100).")
+        parser.add_argument("--buyers", type=int, default=500, help="Purchase attempts (default: 500).")
+        parser.add_argument("--concurrency", type=int, default=32, help="Concurrent buyer threads (default: 32).")
+        parser.add_argument("--shards", type=int, default=4, help="Stock shards for the SKU (default: 4).")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as scratch:
+            # Never touch the real database: the buyers' orders go to a throwaway copy.
+            if connection.vendor == "sqlite":
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(scratch, "stress.sqlite3")
+            old_name = connection.settings_dict["NAME"]
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                result = self.stress(options["units"], options["buyers"], options["concurrency"], options["shards"])
+            finally:
+                # Popularity increments from the orders belong to the scratch database.
+                counters.buffer.stop()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        outcomes = result["outcomes"]
+        self.stdout.write(
+            f"{options['buyers']} buyers in {result['elapsed']:.2f}s: {outcomes['sold']} sold, "
+            f"{outcomes['out_of_stock']} out of stock, {outcomes['error']} errors; "
+            f"{result['orders']} orders, {result['remaining']} units left."
+        )
+        if not result["consistent"]:
+            raise CommandError("Stock accounting is inconsistent: units were oversold or lost.")
+        self.stdout.write(self.style.SUCCESS("No overselling."))
+
+    def stress(self, units, buyers, concurrency, shards):
+        """Sell one stocked size to `buyers` concurrent buyers; every sale must be an order and a unit gone."""
+        seller = Seller.objects.create(name="Stress test seller")
+        product = Product.objects.create(name="Stress test product", price=100, size_m=True, seller=seller)
+        set_stock(product, "M", units, shards=shards)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = Counter(pool.map(lambda _: self.buy(product.pk), range(buyers)))
+        elapsed = time.perf_counter() - start
+
+        remaining = stock_level(product.pk, "M")
+        orders = Order.objects.filter(product=product).count()
+        return {
+            "outcomes": outcomes,
+            "elapsed": elapsed,
+            "remaining": remaining,
+            "orders": orders,
+            "consistent": outcomes["sold"] + remaining == units and orders == outcomes["sold"],
+        }
+
+    def buy(self, product_id):
+        try:
+            serializer = OrderSerializer(data={"product_id": product_id, "size": "M", "quantity": 1})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return "sold"
+        except serializers.ValidationError:
+            return "out_of_stock"
+        except Exception as e:
+            self.stderr.write(f"Buyer failed: {e}")
+            return "error"
+        finally:
+            connection.close()
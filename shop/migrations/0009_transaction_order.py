@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_transaction_status_transaction_transaction_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='order',
+            field=models.ForeignKey(blank=True, help_text='Order this payment belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='shop.order'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_transaction_order(apps, schema_editor):
+    """
+    Link historical transactions to the most recent unclaimed order with the
+    same product name and amount placed at or before the payment time.
+
+    Product names aren't indexed, so they are mapped to product ids once; each
+    batch of transactions then loads its candidate orders in one query and is
+    matched in memory.
+    """
+    Order = apps.get_model("shop", "Order")
+    Product = apps.get_model("shop", "Product")
+    Transaction = apps.get_model("shop", "Transaction")
+
+    names = dict(Product.objects.values_list("pk", "name").iterator())
+    product_ids = defaultdict(list)
+    for pk, name in names.items():
+        product_ids[name].append(pk)
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Transaction.objects.filter(order__isnull=True, pk__gt=last_pk)
+            .only("id", "product_name", "amount", "transaction_time")
+            .order_by("pk")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        # (product name, amount) -> [(created_at, order pk)], newest first
+        candidates = defaultdict(list)
+        orders = (
+            Order.objects.filter(
+                product_id__in={pk for txn in batch for pk in product_ids.get(txn.product_name, ())},
+                final_price__in={txn.amount for txn in batch},
+                created_at__lte=max(txn.transaction_time for txn in batch),
+                transactions__isnull=True,
+            )
+            .order_by("-created_at")
+            .values_list("created_at", "pk", "product_id", "final_price")
+        )
+        for created_at, pk, product_id, final_price in orders.iterator():
+            candidates[names[product_id], final_price].append((created_at, pk))
+
+        linked, claimed = [], set()
+        for txn in batch:
+            order_pk = next(
+                (
+                    pk
+                    for created_at, pk in candidates.get((txn.product_name, txn.amount), ())
+                    if created_at <= txn.transaction_time and pk not in claimed
+                ),
+                None,
+            )
+            if order_pk is not None:
+                txn.order_id = order_pk
+                claimed.add(order_pk)
+                linked.append(txn)
+
+        if linked:
+            Transaction.objects.bulk_update(linked, ["order"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0009_transaction_order"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_transaction_order, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='discount',
+            field=models.PositiveIntegerField(default=0, help_text='Percentage discount', validators=[django.core.validators.MaxValueValidator(100)]),
+        ),
+    ]
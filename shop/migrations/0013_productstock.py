@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_alter_product_discount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=32)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='shop.product')),
+            ],
+            options={
+                'verbose_name': 'Product Stock',
+                'verbose_name_plural': 'Product Stock',
+                'ordering': ['product', 'size', 'shard'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productstock',
+            constraint=models.UniqueConstraint(fields=('product', 'size', 'shard'), name='unique_product_size_shard'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='seller_sku',
+            field=models.CharField(blank=True, help_text="Seller's own SKU; bulk imports update products by it", max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('sold_by', 'seller_sku'), name='unique_seller_sku'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_product_seller_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour or day (local time)')),
+                ('payment_method', models.CharField(max_length=50)),
+                ('transactions', models.IntegerField(default=0)),
+                ('successful', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, help_text='Value of successful payments', max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Payment Rollup',
+                'verbose_name_plural': 'Payment Rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour or day (local time)')),
+                ('orders', models.IntegerField(default=0, help_text='Orders placed')),
+                ('paid_orders', models.IntegerField(default=0)),
+                ('failed_orders', models.IntegerField(default=0)),
+                ('units_sold', models.IntegerField(default=0, help_text='Units in paid orders')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Value of paid orders', max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Sales Rollup',
+                'verbose_name_plural': 'Sales Dashboard',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'bucket', 'payment_method'), name='unique_payment_rollup'),
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='shop.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'bucket', 'product'), name='unique_sales_rollup'),
+        ),
+    ]
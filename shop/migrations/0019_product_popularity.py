@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_similar_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='bestseller_score',
+            field=models.IntegerField(default=0, help_text='Units sold in paid orders, last 30 days'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='trending_score',
+            field=models.FloatField(default=0, help_text='Recent orders, decayed by age'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-trending_score', '-id'], name='product_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-bestseller_score', '-id'], name='product_bestseller_idx'),
+        ),
+    ]
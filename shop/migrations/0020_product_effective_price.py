@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:35
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('price'), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', django.db.models.functions.comparison.Least('discount', 100))), models.FloatField()), '/', models.Value(100)), output_field=models.DecimalField(decimal_places=4, max_digits=12)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_effective_price_idx'),
+        ),
+    ]
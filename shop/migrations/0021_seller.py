@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Seller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Store or seller name', max_length=255)),
+                ('key', models.CharField(editable=False, help_text='Normalized name', max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product_count', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_total', models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Seller',
+                'verbose_name_plural': 'Sellers',
+                'ordering': ['key'],
+                'indexes': [models.Index(fields=['-product_count', '-id'], name='seller_product_count_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='seller',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='shop.seller'),
+        ),
+    ]
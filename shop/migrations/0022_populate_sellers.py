@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 500
+UNKNOWN_SELLER = "Unknown Seller"
+
+
+def seller_key(name):
+    return " ".join(name.split()).casefold()
+
+
+def populate_sellers(apps, schema_editor):
+    """
+    One Seller per distinct sold_by, ignoring case and spacing; the most used
+    spelling becomes its name. Products are then linked to their seller and
+    the storefront totals computed.
+    """
+    Product = apps.get_model("shop", "Product")
+    ProductReview = apps.get_model("shop", "ProductReview")
+    Seller = apps.get_model("shop", "Seller")
+
+    spellings = (
+        Product.objects.values("sold_by").annotate(n=Count("id")).order_by("-n", "sold_by").values_list("sold_by", "n")
+    )
+    sellers = {}
+    for name, _ in spellings:
+        key = seller_key(name) or seller_key(UNKNOWN_SELLER)
+        if key not in sellers:
+            sellers[key] = Seller.objects.create(name=" ".join(name.split()) or UNKNOWN_SELLER, key=key)
+
+    # Spellings of one seller may have used the same SKU; the oldest product keeps it.
+    members = defaultdict(list)
+    skus, duplicate_skus = set(), []
+    products = Product.objects.order_by("pk").values_list("pk", "sold_by", "seller_sku")
+    for pk, name, sku in products.iterator(chunk_size=5000):
+        seller = sellers[seller_key(name) or seller_key(UNKNOWN_SELLER)]
+        members[seller.pk].append(pk)
+        if sku is not None:
+            if (seller.pk, sku) in skus:
+                duplicate_skus.append(pk)
+            skus.add((seller.pk, sku))
+    for seller_id, pks in members.items():
+        for start in range(0, len(pks), BATCH_SIZE):
+            Product.objects.filter(pk__in=pks[start : start + BATCH_SIZE]).update(seller_id=seller_id)
+    for start in range(0, len(duplicate_skus), BATCH_SIZE):
+        Product.objects.filter(pk__in=duplicate_skus[start : start + BATCH_SIZE]).update(seller_sku=None)
+
+    reviews = {
+        row["product__seller"]: row
+        for row in ProductReview.objects.values("product__seller")
+        .annotate(n=Count("id"), total=Sum("rating"))
+        .order_by()
+    }
+    for seller in sellers.values():
+        seller.product_count = len(members[seller.pk])
+        seller.review_count = reviews.get(seller.pk, {}).get("n", 0)
+        seller.rating_total = reviews.get(seller.pk, {}).get("total") or 0
+    Seller.objects.bulk_update(sellers.values(), ["product_count", "review_count", "rating_total"], BATCH_SIZE)
+
+
+def restore_sold_by(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    Seller = apps.get_model("shop", "Seller")
+    for seller in Seller.objects.all():
+        Product.objects.filter(seller=seller).update(sold_by=seller.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0021_seller"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_sellers, restore_sold_by),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0022_populate_sellers'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='product',
+            name='unique_seller_sku',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='sold_by',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='seller',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='shop.seller'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['seller', '-id'], name='product_seller_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('seller', 'seller_sku'), name='unique_seller_sku'),
+        ),
+    ]
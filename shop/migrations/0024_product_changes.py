@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:47
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def log_existing_products(apps, schema_editor):
+    """One change per existing product, so `?since=0` is a full sync."""
+    Product = apps.get_model("shop", "Product")
+    ProductChange = apps.get_model("shop", "ProductChange")
+    batch = []
+    for pk in Product.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=BATCH_SIZE):
+        batch.append(ProductChange(product_id=pk))
+        if len(batch) == BATCH_SIZE:
+            ProductChange.objects.bulk_create(batch)
+            batch = []
+    ProductChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_product_seller_required'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Product Change',
+                'verbose_name_plural': 'Product Changes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['product_id', '-id'], name='product_change_product_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_products, migrations.RunPython.noop),
+    ]
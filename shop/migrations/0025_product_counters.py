@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0024_product_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='click_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Clicks from listings'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='view_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Detail page views'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0025_product_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='paymentrollup',
+            name='unique_payment_rollup',
+        ),
+        migrations.RemoveConstraint(
+            model_name='salesrollup',
+            name='unique_sales_rollup',
+        ),
+        migrations.AddField(
+            model_name='paymentrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'bucket', 'payment_method', 'shard'), name='unique_payment_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'bucket', 'product', 'shard'), name='unique_sales_rollup'),
+        ),
+    ]
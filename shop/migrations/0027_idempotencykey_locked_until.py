@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0026_rollup_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, help_text='End of the in-progress claim', null=True),
+        ),
+    ]
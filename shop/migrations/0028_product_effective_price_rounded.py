@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:30
+
+from django.db import migrations, models
+from django.db.models.functions import Least, Round
+
+
+class Migration(migrations.Migration):
+    """
+    Round effective_price to paise. Generated columns can't be altered, so the
+    column (and its index) is dropped and added again; the database recomputes
+    it for every row.
+    """
+
+    dependencies = [
+        ('shop', '0027_idempotencykey_locked_until'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_effective_price_idx',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='effective_price',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=Round(models.F('price') * (100 - Least('discount', 100)) * models.Value(0.01), 2),
+                output_field=models.DecimalField(decimal_places=2, max_digits=12),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_effective_price_idx'),
+        ),
+    ]
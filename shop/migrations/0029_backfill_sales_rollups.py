@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+from shop.rollups import bucket_start, first_moment, rebuild
+
+
+def backfill_rollups(apps, schema_editor):
+    """Roll up the orders and transactions placed before the rollups existed."""
+    first = first_moment(apps)
+    if first:
+        rebuild(bucket_start(first, "day"), timezone.now() + timedelta(days=1), apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0028_product_effective_price_rounded'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
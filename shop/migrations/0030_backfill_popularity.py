@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from shop.popularity import compact
+
+
+def score_existing_orders(apps, schema_editor):
+    """Score products from the orders rolled up in 0029, rather than waiting for compact_popularity."""
+    compact(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0029_backfill_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(score_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0030_backfill_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/')),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('jsonl', 'JSONL')], max_length=5)),
+                ('default_seller', models.CharField(blank=True, max_length=255)),
+                ('fetch_images', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('summary', models.CharField(blank=True, max_length=255)),
+                ('errors', models.JSONField(blank=True, default=list, help_text='[line, message] of the first failed rows')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Product Import',
+                'verbose_name_plural': 'Product Imports',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='product_import_queue_idx')],
+            },
+        ),
+    ]
@@ -1,11 +1,72 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Least, Round
+
+
+# -------------------- SELLER --------------------
+def seller_key(name):
+    """Sellers are the same seller whatever the case and spacing of their name."""
+    return " ".join(name.split()).casefold()
+
+
+class Seller(models.Model):
+    name = models.CharField(max_length=255, help_text="Store or seller name")
+    key = models.CharField(max_length=255, unique=True, editable=False, help_text="Normalized name")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Storefront totals (maintained by shop.sellers)
+    product_count = models.IntegerField(default=0)
+    review_count = models.IntegerField(default=0)
+    rating_total = models.DecimalField(max_digits=14, decimal_places=1, default=0)
+
+    class Meta:
+        ordering = ["key"]  # alphabetical, on the unique index
+        indexes = [
+            models.Index(fields=["-product_count", "-id"], name="seller_product_count_idx"),
+        ]
+        verbose_name = "Seller"
+        verbose_name_plural = "Sellers"
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return (self.rating_total / self.review_count).quantize(Decimal("0.01"))
+
+    def clean(self):
+        self.name = " ".join(self.name.split())
+        if Seller.objects.filter(key=seller_key(self.name)).exclude(pk=self.pk).exists():
+            raise ValidationError({"name": "A seller with this name already exists."})
+
+    def save(self, *args, **kwargs):
+        self.key = seller_key(self.name)
+        super().save(*args, **kwargs)
 
 
 # -------------------- PRODUCT --------------------
+class ProductQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # No signals for queryset updates; shop.signals does what their receivers would.
+        from .signals import updating_products
+
+        with updating_products(self, kwargs):
+            return super().update(**kwargs)
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    discount = models.PositiveIntegerField(default=0, help_text="Percentage discount")
+    discount = models.PositiveIntegerField(
+        default=0, validators=[MaxValueValidator(100)], help_text="Percentage discount"
+    )
 
     # Image (upload or external link)
     image_url = models.URLField(blank=True, null=True, help_text="External image link (optional)")
@@ -24,7 +85,11 @@ class Product(models.Model):
     size_7xl = models.BooleanField(default=False)
     size_8xl = models.BooleanField(default=False)
 
-    sold_by = models.CharField(max_length=255, default="Unknown Seller", help_text="Store or seller name")
+    # Indexed together with id below, for newest-first seller storefronts.
+    seller = models.ForeignKey(Seller, on_delete=models.PROTECT, related_name="products", db_index=False)
+    seller_sku = models.CharField(
+        max_length=100, blank=True, null=True, help_text="Seller's own SKU; bulk imports update products by it"
+    )
 
     # Highlights
     occasion = models.CharField(max_length=100, blank=True, help_text="Example: Casual")
@@ -37,8 +102,40 @@ class Product(models.Model):
     sleeve_length = models.CharField(max_length=100, blank=True, help_text="Example: Long Sleeves")
     country_of_origin = models.CharField(max_length=100, default="India")
 
+    # Unit price after discount, computed by the database on every write
+    # (including bulk and raw SQL updates), so the catalog can be sorted and
+    # filtered by it. Rounded to paise, so the stored value is exactly the
+    # Decimal read back and price cursors compare equal to it.
+    effective_price = models.GeneratedField(
+        # Times 0.01 rather than / 100: SQLite would divide integer-valued prices as integers.
+        expression=Round(F("price") * (100 - Least("discount", 100)) * Value(0.01), 2),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
+
+    # Popularity (maintained by shop.popularity)
+    trending_score = models.FloatField(default=0, help_text="Recent orders, decayed by age")
+    bestseller_score = models.IntegerField(default=0, help_text="Units sold in paid orders, last 30 days")
+
+    # Engagement (buffered and flushed by shop.counters)
+    view_count = models.PositiveBigIntegerField(default=0, editable=False, help_text="Detail page views")
+    click_count = models.PositiveBigIntegerField(default=0, editable=False, help_text="Clicks from listings")
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["country_of_origin"], name="product_country_idx"),
+            models.Index(fields=["-trending_score", "-id"], name="product_trending_idx"),
+            models.Index(fields=["-bestseller_score", "-id"], name="product_bestseller_idx"),
+            models.Index(fields=["effective_price", "id"], name="product_effective_price_idx"),
+            models.Index(fields=["seller", "-id"], name="product_seller_idx"),
+        ]
+        constraints = [
+            # NULL SKUs never collide, so products created by hand are unaffected.
+            models.UniqueConstraint(fields=["seller", "seller_sku"], name="unique_seller_sku"),
+        ]
         verbose_name = "Product"
         verbose_name_plural = "Products"
 
@@ -52,6 +149,12 @@ class Product(models.Model):
             return self.image_file.url
         return self.image_url or ""
 
+    @property
+    def selling_price(self):
+        """Unit price after the percentage discount, rounded to paise."""
+        discount = min(self.discount, 100)
+        return (self.price * (100 - discount) / 100).quantize(Decimal("0.01"))
+
     @property
     def available_sizes(self):
         """Return list of enabled sizes (for frontend)."""
@@ -71,7 +174,40 @@ class Product(models.Model):
         return [size for size, enabled in all_sizes.items() if enabled]
 
 
+# -------------------- PRODUCT STOCK --------------------
+class ProductStock(models.Model):
+    """
+    Units left for one size of a product. Hot SKUs can be split across several
+    shard rows so concurrent buyers don't all contend on the same row; the
+    available stock is the sum over shards. Sizes without rows are not tracked.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock")
+    size = models.CharField(max_length=32)
+    shard = models.PositiveSmallIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["product", "size", "shard"]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "size", "shard"], name="unique_product_size_shard"),
+        ]
+        verbose_name = "Product Stock"
+        verbose_name_plural = "Product Stock"
+
+    def __str__(self):
+        return f"{self.product_id} / {self.size} #{self.shard}: {self.quantity}"
+
+
 # -------------------- PRODUCT REVIEW --------------------
+class ProductReviewQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # No signals for queryset updates; shop.signals does what their receivers would.
+        from .signals import updating_reviews
+
+        with updating_reviews(self, kwargs):
+            return super().update(**kwargs)
+
+
 class ProductReview(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reviews")
     reviewer_name = models.CharField(max_length=255)
@@ -80,8 +216,15 @@ class ProductReview(models.Model):
     image = models.ImageField(upload_to="reviews/", blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductReviewQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["product", "-created_at"], name="review_product_created_idx"),
+            models.Index(fields=["-created_at"], name="review_created_idx"),
+            models.Index(fields=["rating"], name="review_rating_idx"),
+        ]
         verbose_name = "Product Review"
         verbose_name_plural = "Product Reviews"
 
@@ -107,6 +250,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["payment_status", "-created_at"], name="order_status_created_idx"),
+            models.Index(fields=["-created_at"], name="order_created_idx"),
+        ]
         verbose_name = "Order"
         verbose_name_plural = "Orders"
 
@@ -114,6 +261,28 @@ class Order(models.Model):
         return f"{self.order_id} - {self.product.name}"
 
 
+# -------------------- STOCK RESERVATION --------------------
+class StockReservation(models.Model):
+    """
+    Units held for an unpaid order. The row is deleted when the payment is
+    confirmed, or by the expiry sweeper (which returns the units to stock),
+    so the table only ever holds open checkouts.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="reservation")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    size = models.CharField(max_length=32)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["expires_at"]
+        verbose_name = "Stock Reservation"
+        verbose_name_plural = "Stock Reservations"
+
+    def __str__(self):
+        return f"{self.order_id}: {self.quantity} x {self.size} until {self.expires_at}"
+
+
 # -------------------- UPI CONFIG --------------------
 class UPIConfig(models.Model):
     upi_id = models.CharField(max_length=255)
@@ -122,6 +291,12 @@ class UPIConfig(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Only the active row is ever looked up; the partial index stays one entry wide.
+            models.Index(
+                fields=["-created_at"], condition=models.Q(is_active=True), name="upi_active_created_idx"
+            ),
+        ]
         verbose_name = "UPI Configuration"
         verbose_name_plural = "UPI Configurations"
 
@@ -137,6 +312,14 @@ class Transaction(models.Model):
         ("failed", "Failed"),
     ]
 
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="transactions",
+        help_text="Order this payment belongs to",
+    )
     product_name = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.CharField(max_length=50)
@@ -146,8 +329,189 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ["-transaction_time"]
+        indexes = [
+            models.Index(fields=["status", "-transaction_time"], name="txn_status_time_idx"),
+            models.Index(fields=["-transaction_time"], name="txn_time_idx"),
+            models.Index(fields=["payment_method"], name="txn_payment_method_idx"),
+        ]
         verbose_name = "Transaction"
         verbose_name_plural = "Transactions"
 
     def __str__(self):
         return f"{self.product_name} - ₹{self.amount} ({self.status})"
+
+
+# -------------------- IDEMPOTENCY KEY --------------------
+class IdempotencyKey(models.Model):
+    """
+    First response of a POST sent with an `Idempotency-Key` header.
+    A row without a status code is still being processed, until `locked_until`;
+    after that its request is presumed dead and a retry may take the key over.
+    """
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=50, help_text="Endpoint the key was used on")
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True, help_text="End of the in-progress claim")
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="unique_idempotency_key"),
+        ]
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+# -------------------- SALES ROLLUPS --------------------
+ROLLUP_PERIOD_CHOICES = [
+    ("hour", "Hour"),
+    ("day", "Day"),
+]
+
+
+class SalesRollup(models.Model):
+    """
+    Orders placed in one hour/day for one product, kept up to date by shop.rollups.
+    Counters are signed so a late status change never violates a constraint.
+    Split over shard rows so concurrent checkouts of one product don't queue
+    on the same row; the figures for a bucket are the sum over its shards.
+    """
+    period = models.CharField(max_length=4, choices=ROLLUP_PERIOD_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the hour or day (local time)")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="sales_rollups")
+    shard = models.PositiveSmallIntegerField(default=0)
+    orders = models.IntegerField(default=0, help_text="Orders placed")
+    paid_orders = models.IntegerField(default=0)
+    failed_orders = models.IntegerField(default=0)
+    units_sold = models.IntegerField(default=0, help_text="Units in paid orders")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Value of paid orders")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["period", "bucket", "product", "shard"], name="unique_sales_rollup"),
+        ]
+        verbose_name = "Sales Rollup"
+        verbose_name_plural = "Sales Dashboard"
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} product {self.product_id}"
+
+
+class PaymentRollup(models.Model):
+    """Transactions created in one hour/day per payment method, sharded like SalesRollup."""
+    period = models.CharField(max_length=4, choices=ROLLUP_PERIOD_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the hour or day (local time)")
+    payment_method = models.CharField(max_length=50)
+    shard = models.PositiveSmallIntegerField(default=0)
+    transactions = models.IntegerField(default=0)
+    successful = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Value of successful payments")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "bucket", "payment_method", "shard"], name="unique_payment_rollup"
+            ),
+        ]
+        verbose_name = "Payment Rollup"
+        verbose_name_plural = "Payment Rollups"
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.payment_method}"
+
+
+# -------------------- SIMILAR PRODUCTS --------------------
+class SimilarProduct(models.Model):
+    """One of a product's precomputed nearest neighbours (see shop.similarity)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="similar_products")
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField(help_text="0 is the closest match")
+    score = models.FloatField(help_text="Cosine similarity of the attribute vectors")
+
+    class Meta:
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="unique_similar_rank"),
+        ]
+        verbose_name = "Similar Product"
+        verbose_name_plural = "Similar Products"
+
+    def __str__(self):
+        return f"{self.product_id} ~ {self.similar_id} ({self.score:.3f})"
+
+
+class SimilarityRefresh(models.Model):
+    """A product whose attributes changed since its neighbours were computed."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Similarity Refresh"
+        verbose_name_plural = "Similarity Refreshes"
+
+    def __str__(self):
+        return f"{self.product_id} queued {self.queued_at}"
+
+
+# -------------------- CATALOG CHANGE LOG --------------------
+class ProductChange(models.Model):
+    """
+    A product written or deleted. The id is the sync token of
+    /api/products/changes/ (see shop.changefeed); no foreign key, so
+    tombstones outlive their product.
+    """
+    product_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["product_id", "-id"], name="product_change_product_idx"),
+        ]
+        verbose_name = "Product Change"
+        verbose_name_plural = "Product Changes"
+
+    def __str__(self):
+        return f"#{self.pk}: product {self.product_id} {'deleted' if self.deleted else 'changed'}"
+
+
+# -------------------- PRODUCT IMPORT --------------------
+class ProductImport(models.Model):
+    """
+    A catalog file uploaded in the admin, waiting for (or imported by)
+    `import_products --queued` (see shop.catalog_import).
+    """
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    file = models.FileField(upload_to="imports/")
+    format = models.CharField(max_length=5, choices=[("csv", "CSV"), ("jsonl", "JSONL")])
+    default_seller = models.CharField(max_length=255, blank=True)
+    fetch_images = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    summary = models.CharField(max_length=255, blank=True)
+    errors = models.JSONField(default=list, blank=True, help_text="[line, message] of the first failed rows")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["status", "id"], name="product_import_queue_idx"),
+        ]
+        verbose_name = "Product Import"
+        verbose_name_plural = "Product Imports"
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.get_status_display()})"
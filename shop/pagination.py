@@ -0,0 +1,84 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ScoreKeysetPagination(BasePagination):
+    """
+    Pages ordered by one indexed column, with `id` breaking ties the same way
+    round: `ScoreKeysetPagination("-score")` or `ScoreKeysetPagination("price")`.
+
+    The opaque `?cursor=` holds the (score, id) of the last row served, and the
+    next page is `WHERE (score, id) < cursor ORDER BY score DESC, id DESC
+    LIMIT n` (or `>` ... ASC) on a matching index: every page costs the same,
+    and rows moving up or down between requests never repeat or skip a whole page.
+    """
+    page_size = 24
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def __init__(self, ordering):
+        self.descending = ordering.startswith("-")
+        self.field = ordering.lstrip("-")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            score, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if isinstance(score, str):
+                score = Decimal(score)  # decimal columns round-trip as strings
+            if not isinstance(score, (int, float, Decimal)) or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError, InvalidOperation):
+            raise NotFound("Invalid cursor.")
+        return score, pk
+
+    def encode_cursor(self, row):
+        score = getattr(row, self.field)
+        position = json.dumps([str(score) if isinstance(score, Decimal) else score, row.pk])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        if self.descending:
+            queryset = queryset.order_by(f"-{self.field}", "-id")
+        else:
+            queryset = queryset.order_by(self.field, "id")
+        cursor = self.decode_cursor(request)
+        if cursor:
+            score, pk = cursor
+            after, tie = ("lte", "gte") if self.descending else ("gte", "lte")
+            queryset = queryset.filter(**{f"{self.field}__{after}": score}).exclude(
+                **{self.field: score, f"pk__{tie}": pk}
+            )
+        rows = list(queryset[: size + 1])
+        self.next_cursor = self.encode_cursor(rows[size - 1]) if len(rows) > size else None
+        return rows[:size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({"first": self.get_first_link(), "next": self.get_next_link(), "results": data})
@@ -0,0 +1,110 @@
+"""
+"Trending now" and "bestseller" scores on Product, for `?ordering=trending`
+and `?ordering=bestseller` on the product list.
+
+- trending_score: orders placed in the last TRENDING_WINDOW, each halving in
+  weight every TRENDING_HALF_LIFE; a paid order counts twice.
+- bestseller_score: units sold in paid orders over the last BESTSELLER_WINDOW.
+
+Both are plain indexed columns, so ranking the catalog is an index walk.
+`record_order_changes` (called from shop.rollups for every placed or
+re-statused order) adds to them as orders come in, through the write-behind
+buffer in shop.counters once the order commits, so checkouts never lock the
+product row; `compact` periodically recomputes them from the hourly/daily
+SalesRollup rows, which applies the decay, drops orders that left the window
+and repairs any increment lost to a race with the previous compaction or to
+a worker killed before flushing.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import counters
+
+TRENDING_HALF_LIFE = timedelta(hours=6)
+TRENDING_WINDOW = timedelta(hours=48)
+BESTSELLER_WINDOW = timedelta(days=30)
+UPDATE_BATCH = 500
+
+
+# -------------------- INCREMENTS --------------------
+def record_order_changes(changes):
+    """Same [(order, old_status), ...] as shop.rollups.record_order_changes."""
+    trending = defaultdict(float)
+    bestseller = defaultdict(int)
+    for order, old_status in changes:
+        new_status = order.payment_status
+        if old_status is None:
+            trending[order.product_id] += 1
+        if new_status == "paid" and old_status != "paid":
+            trending[order.product_id] += 1
+            bestseller[order.product_id] += order.quantity
+        elif old_status == "paid" and new_status != "paid":
+            bestseller[order.product_id] -= order.quantity
+    increments = [("trending_score", product_id, n) for product_id, n in trending.items()]
+    increments += [("bestseller_score", product_id, n) for product_id, n in bestseller.items() if n]
+
+    def buffer_increments():
+        for field, product_id, n in increments:
+            counters.buffer.add(field, product_id, n)
+
+    transaction.on_commit(buffer_increments)
+
+
+# -------------------- COMPACTION --------------------
+def trending_scores(now, apps=global_apps):
+    # Hours are aged from their midpoint.
+    half_hour = timedelta(minutes=30)
+    SalesRollup = apps.get_model("shop", "SalesRollup")
+    rows = SalesRollup.objects.filter(period="hour", bucket__gte=now - TRENDING_WINDOW - half_hour).values_list(
+        "product_id", "bucket", "orders", "paid_orders"
+    )
+    scores = defaultdict(float)
+    for product_id, bucket, placed, paid in rows.iterator():
+        age = max((now - bucket - half_hour) / TRENDING_HALF_LIFE, 0)
+        scores[product_id] += (placed + paid) * 0.5**age
+    return {product_id: score for product_id, score in scores.items() if score > 0}
+
+
+def bestseller_scores(now, apps=global_apps):
+    since = timezone.localtime(now - BESTSELLER_WINDOW).replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = (
+        apps.get_model("shop", "SalesRollup").objects.filter(period="day", bucket__gte=since)
+        .values("product_id")
+        .annotate(units=Sum("units_sold"))
+        .filter(units__gt=0)
+        .values_list("product_id", "units")
+    )
+    return dict(rows.iterator())
+
+
+def write_scores(field, scores, apps=global_apps):
+    """Set `field` to `scores` for those products and to 0 for every other product that has one."""
+    Product = apps.get_model("shop", "Product")
+    stale = [
+        product_id
+        for product_id in Product.objects.exclude(**{field: 0}).values_list("pk", flat=True).iterator()
+        if product_id not in scores
+    ]
+    for start in range(0, len(stale), UPDATE_BATCH):
+        Product.objects.filter(pk__in=stale[start : start + UPDATE_BATCH]).update(**{field: 0})
+    products = [Product(pk=product_id, **{field: score}) for product_id, score in sorted(scores.items())]
+    Product.objects.bulk_update(products, [field], batch_size=UPDATE_BATCH)
+    return len(products)
+
+
+def compact(now=None, apps=global_apps):
+    """
+    Recompute both scores from the rollups; returns (trending, bestseller)
+    products scored. Migrations pass their historical `apps`.
+    """
+    now = now or timezone.now()
+    return (
+        write_scores("trending_score", trending_scores(now, apps), apps),
+        write_scores("bestseller_score", bestseller_scores(now, apps), apps),
+    )
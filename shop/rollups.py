@@ -0,0 +1,342 @@
+"""
+Hourly and daily sales / payment rollups, maintained incrementally.
+
+Every code path that places an order or changes its payment status passes the
+change through `record_order_changes` (or `change_order_status`), and the same
+for transactions with `record_transaction_changes`, inside the transaction
+that writes the order. Each change becomes a delta applied with
+`UPDATE ... SET col = col + n` on one of ROLLUP_SHARDS rows of its
+(period, bucket, key), picked at random so buyers of a hot product don't
+all wait on one row lock until they commit; readers aggregate a few hundred
+rollup rows, summing the shards, instead of scanning orders. Order
+changes also feed the product popularity scores (shop.popularity).
+
+Orders are bucketed by when they were placed (so conversion is per cohort),
+transactions by when they were created. `manage.py rebuild_rollups`
+recomputes any date range from the source tables, e.g. after bulk loads or
+manual SQL that bypassed these hooks.
+"""
+
+import random
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import popularity
+from .models import Order, PaymentRollup, SalesRollup
+
+PERIODS = ("hour", "day")
+ROLLUP_SHARDS = 8
+TRUNCATE = {"hour": TruncHour, "day": TruncDay}
+ORDER_FIELDS = ("id", "created_at", "product_id", "quantity", "final_price", "payment_status")
+
+
+def bucket_start(moment, period):
+    """Start of the local hour or day containing `moment`."""
+    local = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0) if period == "day" else local
+
+
+# -------------------- DELTAS --------------------
+def order_contribution(order, status):
+    if status is None:
+        return {}
+    if status == "paid":
+        return {"paid_orders": 1, "units_sold": order.quantity, "revenue": order.final_price}
+    if status == "failed":
+        return {"failed_orders": 1}
+    return {}
+
+
+def transaction_contribution(txn, status):
+    if status is None:
+        return {}
+    if status == "success":
+        return {"successful": 1, "amount": txn.amount}
+    if status == "failed":
+        return {"failed": 1}
+    return {}
+
+
+def diff(before, after):
+    delta = defaultdict(int)
+    for field, value in after.items():
+        delta[field] += value
+    for field, value in before.items():
+        delta[field] -= value
+    return delta
+
+
+def apply_deltas(model, key_fields, deltas):
+    """Add each {field: n} to a random shard row of its key, creating the row on first use."""
+    # Keys in a fixed order so concurrent writers lock rows the same way round.
+    for key in sorted(deltas):
+        values = {field: n for field, n in deltas[key].items() if n}
+        if not values:
+            continue
+        lookup = {**dict(zip(key_fields, key)), "shard": random.randrange(ROLLUP_SHARDS)}
+        increments = {field: F(field) + n for field, n in values.items()}
+        if model.objects.filter(**lookup).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **values)
+        except IntegrityError:
+            # Another writer created the row first.
+            model.objects.filter(**lookup).update(**increments)
+
+
+def record_order_changes(changes):
+    """
+    `changes` is [(order, old_status), ...] where `order.payment_status` is the
+    new status and old_status None means the order was just placed.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for order, old_status in changes:
+        delta = diff(order_contribution(order, old_status), order_contribution(order, order.payment_status))
+        if old_status is None:
+            delta["orders"] += 1
+        for period in PERIODS:
+            row = deltas[period, bucket_start(order.created_at, period), order.product_id]
+            for field, n in delta.items():
+                row[field] += n
+    apply_deltas(SalesRollup, ("period", "bucket", "product_id"), deltas)
+    popularity.record_order_changes(changes)
+
+
+def record_transaction_changes(changes):
+    """Same as record_order_changes for [(transaction, old_status), ...]."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for txn, old_status in changes:
+        delta = diff(transaction_contribution(txn, old_status), transaction_contribution(txn, txn.status))
+        if old_status is None:
+            delta["transactions"] += 1
+        for period in PERIODS:
+            row = deltas[period, bucket_start(txn.transaction_time, period), txn.payment_method]
+            for field, n in delta.items():
+                row[field] += n
+    apply_deltas(PaymentRollup, ("period", "bucket", "payment_method"), deltas)
+
+
+def change_order_status(order_ids, new_status, from_status=None):
+    """
+    Move orders to `new_status` (optionally only those currently `from_status`)
+    and update the rollups. Returns the orders that actually changed.
+    """
+    with transaction.atomic():
+        orders = Order.objects.select_for_update().filter(pk__in=order_ids).exclude(payment_status=new_status)
+        if from_status:
+            orders = orders.filter(payment_status=from_status)
+        orders = list(orders.only(*ORDER_FIELDS))
+        if not orders:
+            return []
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(payment_status=new_status)
+        changes = []
+        for order in orders:
+            changes.append((order, order.payment_status))
+            order.payment_status = new_status
+        record_order_changes(changes)
+    return orders
+
+
+# -------------------- REBUILD --------------------
+def first_moment(apps=global_apps):
+    """When the oldest order or transaction was created, or None if there are none."""
+    Order, Transaction = apps.get_model("shop", "Order"), apps.get_model("shop", "Transaction")
+    first = [
+        Order.objects.aggregate(first=Min("created_at"))["first"],
+        Transaction.objects.aggregate(first=Min("transaction_time"))["first"],
+    ]
+    first = [moment for moment in first if moment]
+    return min(first) if first else None
+
+
+def rebuild(start, end, batch_size=1000, apps=global_apps):
+    """
+    Recompute rollups for buckets in [start, end) from orders and transactions.
+    Migrations pass their historical `apps`.
+    """
+    Order, Transaction, SalesRollup, PaymentRollup = (
+        apps.get_model("shop", name) for name in ("Order", "Transaction", "SalesRollup", "PaymentRollup")
+    )
+    with transaction.atomic():
+        SalesRollup.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        PaymentRollup.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        for period in PERIODS:
+            paid = Q(payment_status="paid")
+            sales = (
+                Order.objects.filter(created_at__gte=start, created_at__lt=end)
+                .annotate(rollup_bucket=TRUNCATE[period]("created_at"))
+                .values("rollup_bucket", "product_id")
+                .annotate(
+                    n_orders=Count("id"),
+                    n_paid=Count("id", filter=paid),
+                    n_failed=Count("id", filter=Q(payment_status="failed")),
+                    n_units=Sum("quantity", filter=paid, default=0),
+                    total=Sum("final_price", filter=paid, default=Decimal(0)),
+                )
+                .order_by()
+            )
+            SalesRollup.objects.bulk_create(
+                (
+                    SalesRollup(
+                        period=period,
+                        bucket=row["rollup_bucket"],
+                        product_id=row["product_id"],
+                        orders=row["n_orders"],
+                        paid_orders=row["n_paid"],
+                        failed_orders=row["n_failed"],
+                        units_sold=row["n_units"],
+                        revenue=row["total"],
+                    )
+                    for row in sales.iterator()
+                ),
+                batch_size=batch_size,
+            )
+            success = Q(status="success")
+            payments = (
+                Transaction.objects.filter(transaction_time__gte=start, transaction_time__lt=end)
+                .annotate(rollup_bucket=TRUNCATE[period]("transaction_time"))
+                .values("rollup_bucket", "payment_method")
+                .annotate(
+                    n_transactions=Count("id"),
+                    n_success=Count("id", filter=success),
+                    n_failed=Count("id", filter=Q(status="failed")),
+                    total=Sum("amount", filter=success, default=Decimal(0)),
+                )
+                .order_by()
+            )
+            PaymentRollup.objects.bulk_create(
+                (
+                    PaymentRollup(
+                        period=period,
+                        bucket=row["rollup_bucket"],
+                        payment_method=row["payment_method"],
+                        transactions=row["n_transactions"],
+                        successful=row["n_success"],
+                        failed=row["n_failed"],
+                        amount=row["total"],
+                    )
+                    for row in payments.iterator()
+                ),
+                batch_size=batch_size,
+            )
+
+
+# -------------------- READS --------------------
+class RollupQueryError(ValueError):
+    pass
+
+
+def date_range(params, default_days=30):
+    """[start, end) from inclusive local `from` / `to` dates; defaults to the last `default_days`."""
+    today = timezone.localdate()
+    days = {}
+    for name, default in (("from", today - timedelta(days=default_days - 1)), ("to", today)):
+        value = params.get(name)
+        days[name] = parse_date(value) if value else default
+        if days[name] is None:
+            raise RollupQueryError(f"'{name}' must be a date (YYYY-MM-DD).")
+    start = timezone.make_aware(datetime.combine(days["from"], time.min))
+    end = timezone.make_aware(datetime.combine(days["to"] + timedelta(days=1), time.min))
+    return start, end
+
+
+def conversion(paid, placed):
+    return round(paid / placed, 4) if placed else None
+
+
+def money(value):
+    # SQLite sums decimals as floats; round back to paise.
+    return Decimal(value or 0).quantize(Decimal("0.01"))
+
+
+def sales_report(start, end, period="day", group="total", limit=100):
+    """
+    Revenue, orders and conversion per bucket (`group="total"`), or per product
+    or seller over the whole range ordered by revenue (`group="product"|"seller"`).
+    """
+    if period not in PERIODS:
+        raise RollupQueryError(f"'period' must be one of: {', '.join(PERIODS)}.")
+    rows = SalesRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end)
+    columns = {
+        "total": ["bucket"],
+        "product": ["product_id", "product__name"],
+        "seller": ["product__seller", "product__seller__name"],
+    }
+    if group not in columns:
+        raise RollupQueryError(f"'group' must be one of: {', '.join(columns)}.")
+    rows = rows.values(*columns[group]).annotate(
+        orders_placed=Sum("orders"),
+        orders_paid=Sum("paid_orders"),
+        orders_failed=Sum("failed_orders"),
+        units=Sum("units_sold"),
+        total_revenue=Sum("revenue"),
+    )
+    rows = rows.order_by("bucket") if group == "total" else rows.order_by("-total_revenue")[:limit]
+    report = []
+    for row in rows:
+        entry = {
+            "orders": row["orders_placed"],
+            "paid_orders": row["orders_paid"],
+            "failed_orders": row["orders_failed"],
+            "units_sold": row["units"],
+            "revenue": money(row["total_revenue"]),
+            "conversion": conversion(row["orders_paid"], row["orders_placed"]),
+        }
+        if group == "total":
+            entry = {"bucket": timezone.localtime(row["bucket"]), **entry}
+        elif group == "product":
+            entry = {"product_id": row["product_id"], "product_name": row["product__name"], **entry}
+        else:
+            entry = {"seller_id": row["product__seller"], "seller": row["product__seller__name"], **entry}
+        report.append(entry)
+    return report
+
+
+def sales_totals(start, end):
+    totals = SalesRollup.objects.filter(period="day", bucket__gte=start, bucket__lt=end).aggregate(
+        orders=Sum("orders", default=0),
+        paid_orders=Sum("paid_orders", default=0),
+        failed_orders=Sum("failed_orders", default=0),
+        units_sold=Sum("units_sold", default=0),
+        revenue=Sum("revenue", default=Decimal(0)),
+    )
+    totals["revenue"] = money(totals["revenue"])
+    totals["conversion"] = conversion(totals["paid_orders"], totals["orders"])
+    return totals
+
+
+def payment_mix(start, end):
+    """Share of transactions and successful amount per payment method."""
+    rows = list(
+        PaymentRollup.objects.filter(period="day", bucket__gte=start, bucket__lt=end)
+        .values("payment_method")
+        .annotate(
+            n_transactions=Sum("transactions"),
+            n_success=Sum("successful"),
+            n_failed=Sum("failed"),
+            total=Sum("amount"),
+        )
+        .order_by("-n_transactions")
+    )
+    overall = sum(row["n_transactions"] for row in rows)
+    return [
+        {
+            "payment_method": row["payment_method"],
+            "transactions": row["n_transactions"],
+            "share": round(row["n_transactions"] / overall, 4) if overall else None,
+            "successful": row["n_success"],
+            "failed": row["n_failed"],
+            "success_rate": conversion(row["n_success"], row["n_transactions"]),
+            "amount": money(row["total"]),
+        }
+        for row in rows
+    ]
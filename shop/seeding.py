@@ -0,0 +1,227 @@
+"""
+Deterministic synthetic data for load and scale testing (`manage.py seed_shop`).
+
+Rows are generated and inserted in chunks of --batch-size, so memory stays
+bounded by the chunk size. Every row draws from its own random stream seeded by
+(seed, kind, row number), so the dataset is identical whatever the batch size
+and however many processes run the chunks. Products and orders get explicit
+primary keys (contiguous from the current maximum) so reviews, orders and
+transactions can reference them without reading anything back.
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+from django.db import transaction
+
+from . import changefeed
+from .models import Order, Product, ProductReview, Transaction, UPIConfig
+from .sellers import resolve
+
+CATEGORIES = ["Saree", "Kurti", "Dupatta", "Lehenga", "Salwar Suit", "Gown", "Top", "Palazzo"]
+COLORS = ["Red", "Maroon", "Pink", "Peach", "Yellow", "Mustard", "Green", "Teal", "Blue", "Navy", "Black", "White"]
+FABRICS = ["Cotton Blend", "Cotton", "Silk", "Art Silk", "Georgette", "Chiffon", "Rayon", "Crepe"]
+OCCASIONS = ["Casual", "Festive", "Party", "Wedding", "Daily", "Office"]
+PATTERNS = ["Printed", "Solid", "Embroidered", "Woven Design", "Self-Design"]
+FITS = ["Regular", "A-Line", "Straight", "Flared", "Anarkali"]
+SLEEVES = ["Long Sleeves", "Short Sleeves", "Three-Quarter Sleeves", "Sleeveless"]
+REVIEWERS = [
+    "Priya", "Anjali", "Sneha", "Pooja", "Kavya", "Neha", "Ritu", "Meena", "Divya", "Sunita", "Asha", "Lakshmi",
+]
+COMMENTS = {
+    1: ["Very poor quality.", "Colour faded after one wash.", "Not as shown in the picture."],
+    2: ["Fabric is thin.", "Size runs small.", "Stitching came loose."],
+    3: ["Okay for the price.", "Average quality.", "Colour slightly different."],
+    4: ["Good quality, fits well.", "Nice fabric.", "Value for money."],
+    5: ["Loved it!", "Excellent quality, true to size.", "Beautiful colour, highly recommend."],
+}
+RATING_WEIGHTS = [5, 7, 15, 33, 40]  # 1..5 stars
+DISCOUNTS = [0, 10, 15, 20, 30, 40, 50, 60, 70]
+DISCOUNT_WEIGHTS = [20, 10, 10, 15, 15, 10, 10, 6, 4]
+ORDER_SIZES = ["S", "M", "L", "XL", "XXL"]
+ORDER_SIZE_WEIGHTS = [15, 35, 30, 15, 5]
+PAYMENT_METHODS = ["UPI", "Card", "NetBanking", "Wallet"]
+PAYMENT_METHOD_WEIGHTS = [70, 15, 10, 5]
+
+# Zipf-like popularity: index = count * u ** SKEW puts ~46% of reviews and
+# orders on the first 10% of products.
+POPULARITY_SKEW = 3
+
+
+def row_random(seed, kind, n):
+    return random.Random(f"{seed}:{kind}:{n}")
+
+
+def popular_index(rng, count):
+    return int(count * rng.random() ** POPULARITY_SKEW)
+
+
+def moment_in_past(rng, now, days):
+    """A timestamp within `days`, weighted towards the recent past (a growing shop)."""
+    return now - timedelta(seconds=days * 86400 * rng.random() ** 1.5)
+
+
+@contextmanager
+def historical_timestamps():
+    """Let bulk_create keep the generated created_at / transaction_time values."""
+    fields = [
+        Order._meta.get_field("created_at"),
+        ProductReview._meta.get_field("created_at"),
+        Transaction._meta.get_field("transaction_time"),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+# -------------------- PRODUCTS --------------------
+@lru_cache(maxsize=65536)
+def product_pricing(seed, index):
+    """(price, discount) of the index-th seeded product; orders re-derive it instead of querying."""
+    rng = random.Random(seed * 1_000_003 + index)
+    price = Decimal(min(9999, max(99, round(rng.lognormvariate(6.3, 0.6)))))
+    return price, rng.choices(DISCOUNTS, weights=DISCOUNT_WEIGHTS)[0]
+
+
+def selling_price(seed, index):
+    price, discount = product_pricing(seed, index)
+    return (price * (100 - discount) / 100).quantize(Decimal("0.01"))
+
+
+def product_name(index):
+    color = COLORS[index % len(COLORS)]
+    fabric = FABRICS[index // len(COLORS) % len(FABRICS)]
+    category = CATEGORIES[index // (len(COLORS) * len(FABRICS)) % len(CATEGORIES)]
+    return f"{color} {fabric} {category} #{index}"
+
+
+def seed_products(plan, start, stop):
+    products = []
+    for index in range(start, stop):
+        rng = row_random(plan["seed"], "products", index)
+        price, discount = product_pricing(plan["seed"], index)
+        sizes = {size: rng.random() < 0.6 for size in ("s", "xl", "xxl", "3xl")}
+        products.append(
+            Product(
+                pk=plan["product_base"] + index,
+                name=product_name(index),
+                price=price,
+                discount=discount,
+                size_m=True,
+                size_l=True,
+                **{f"size_{size}": offered for size, offered in sizes.items()},
+                seller_id=plan["seller_ids"][popular_index(rng, len(plan["seller_ids"]))],
+                occasion=rng.choice(OCCASIONS),
+                color=COLORS[index % len(COLORS)],
+                fit_shape=rng.choice(FITS),
+                pattern=rng.choice(PATTERNS),
+                fabric=FABRICS[index // len(COLORS) % len(FABRICS)],
+                sleeve_length=rng.choice(SLEEVES),
+            )
+        )
+    Product.objects.bulk_create(products)
+    changefeed.record([product.pk for product in products])
+    return len(products)
+
+
+# -------------------- ORDERS + TRANSACTIONS --------------------
+def seed_orders(plan, start, stop):
+    now = plan["now"]
+    orders, transactions = [], []
+    for n in range(start, stop):
+        rng = row_random(plan["seed"], "orders", n)
+        index = popular_index(rng, plan["products"])
+        pk = plan["order_base"] + n
+        quantity = 1 if rng.random() < 0.9 else rng.randint(2, 4)
+        status = rng.choices(["paid", "pending", "failed"], weights=[75, 12, 13])[0]
+        created_at = moment_in_past(rng, now, plan["days"])
+        order = Order(
+            pk=pk,
+            product_id=plan["product_base"] + index,
+            quantity=quantity,
+            size=rng.choices(ORDER_SIZES, weights=ORDER_SIZE_WEIGHTS)[0],
+            final_price=selling_price(plan["seed"], index) * quantity,
+            order_id=f"SEED-{pk}",
+            payment_status=status,
+            created_at=created_at,
+        )
+        orders.append(order)
+        # Abandoned checkouts never reach the payment step.
+        if status == "pending" and rng.random() < 0.5:
+            continue
+        transactions.append(
+            Transaction(
+                order_id=pk,
+                product_name=product_name(index),
+                amount=order.final_price,
+                payment_method=rng.choices(PAYMENT_METHODS, weights=PAYMENT_METHOD_WEIGHTS)[0],
+                transaction_id=f"SEEDTID{pk}",
+                status={"paid": "success", "pending": "pending", "failed": "failed"}[status],
+                transaction_time=created_at + timedelta(seconds=rng.randint(5, 600)),
+            )
+        )
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        Transaction.objects.bulk_create(transactions)
+    return len(orders)
+
+
+# -------------------- REVIEWS --------------------
+def seed_reviews(plan, start, stop):
+    now = plan["now"]
+    reviews = []
+    for n in range(start, stop):
+        rng = row_random(plan["seed"], "reviews", n)
+        rating = rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0]
+        reviews.append(
+            ProductReview(
+                product_id=plan["product_base"] + popular_index(rng, plan["products"]),
+                reviewer_name=f"{rng.choice(REVIEWERS)} {chr(65 + rng.randrange(26))}.",
+                rating=Decimal(rating),
+                comment=rng.choice(COMMENTS[rating]),
+                created_at=moment_in_past(rng, now, plan["days"]),
+            )
+        )
+    # Popular products collect reviews in every chunk; the seed_shop command logs
+    # each reviewed product once, after the last chunk (record_reviewed).
+    ProductReview.objects.bulk_create(reviews)
+    return len(reviews)
+
+
+def record_reviewed(after):
+    """Log the products reviewed by reviews with ids above `after` to the change feed, each once."""
+    reviewed = ProductReview.objects.filter(pk__gt=after).values_list("product_id", flat=True).distinct()
+    changefeed.record(reviewed)
+
+
+SEEDERS = {"products": seed_products, "orders": seed_orders, "reviews": seed_reviews}
+
+
+def run_chunk(kind, plan, start, stop):
+    with historical_timestamps():
+        return SEEDERS[kind](plan, start, stop)
+
+
+# -------------------- SELLERS --------------------
+def seed_sellers(count):
+    """Seller ids in popularity order; "Seller N" rows are created once and reused by later runs."""
+    names = [f"Seller {n + 1}" for n in range(count)]
+    ids = resolve(names)
+    return [ids[name] for name in names]
+
+
+# -------------------- UPI --------------------
+def seed_upi_configs(count, seed):
+    """A few historical UPI IDs; only the newest one is active."""
+    UPIConfig.objects.filter(is_active=True).update(is_active=False)
+    UPIConfig.objects.bulk_create(
+        UPIConfig(upi_id=f"meesho.seed{seed}.{n}@upi", is_active=n == count - 1) for n in range(count)
+    )
+    return count
@@ -0,0 +1,100 @@
+"""
+Sellers and their cached storefront totals.
+
+Products name their seller through a foreign key; `resolve` turns the seller
+names found in imports into Seller rows, creating the missing ones. Each
+Seller carries its product count, review count and rating total so a
+storefront page reads one row instead of aggregating the catalog.
+
+shop.signals keeps the totals current on every save, delete and queryset
+update of a product or review, as F() increments in the same transaction:
+a change takes the rows out of their sellers' totals as they were
+(`record_products(queryset, -1)`, `record_reviews`) and puts them back as
+they are (`+1`). Loaders that bulk_create rows count them themselves.
+`manage.py recount_sellers` recomputes every total from the source tables,
+repairing drift from concurrent edits of the same row or from raw SQL.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+
+from .models import Product, ProductReview, Seller, seller_key
+
+UPDATE_BATCH = 500
+TOTALS = ("product_count", "review_count", "rating_total")
+
+
+# -------------------- NAMES --------------------
+def resolve(names):
+    """{name: seller_id} for every name, creating sellers that don't exist yet."""
+    keys = {name: seller_key(name) for name in names}
+    found = dict(Seller.objects.filter(key__in=set(keys.values())).values_list("key", "pk"))
+    missing = {key: " ".join(name.split()) for name, key in keys.items() if key not in found}
+    if missing:
+        # Another import may create the same sellers meanwhile.
+        Seller.objects.bulk_create(
+            [Seller(name=name, key=key) for key, name in missing.items()], ignore_conflicts=True
+        )
+        found.update(Seller.objects.filter(key__in=missing).values_list("key", "pk"))
+    return {name: found[key] for name, key in keys.items()}
+
+
+# -------------------- INCREMENTS --------------------
+def rating_sum(value):
+    # SQLite sums decimals as floats; ratings have one decimal place.
+    return Decimal(str(value or 0)).quantize(Decimal("0.1"))
+
+
+def review_totals(reviews):
+    """{seller_id: {field: n}} for a ProductReview queryset."""
+    rows = reviews.values("product__seller").annotate(n=Count("id"), total=Sum("rating")).order_by()
+    return {
+        row["product__seller"]: {"review_count": row["n"], "rating_total": rating_sum(row["total"])}
+        for row in rows
+    }
+
+
+def apply(totals, sign):
+    # Fixed order so concurrent writers lock seller rows the same way round.
+    for seller_id in sorted(totals):
+        values = {field: n for field, n in totals[seller_id].items() if n}
+        if values:
+            Seller.objects.filter(pk=seller_id).update(
+                **{field: F(field) + sign * n for field, n in values.items()}
+            )
+
+
+def record_products(products, sign=1):
+    """Add (1) or take out (-1) a Product queryset and its reviews from their sellers' totals."""
+    totals = defaultdict(dict, review_totals(ProductReview.objects.filter(product__in=products.values("pk"))))
+    for seller_id, n in products.values("seller").annotate(n=Count("id")).order_by().values_list("seller", "n"):
+        totals[seller_id]["product_count"] = n
+    apply(totals, sign)
+
+
+def record_reviews(reviews, sign=1):
+    """Add (1) or take out (-1) a ProductReview queryset from its sellers' totals."""
+    apply(review_totals(reviews), sign)
+
+
+# -------------------- RECOUNT --------------------
+def recount():
+    """Recompute every seller's totals from products and reviews; returns the sellers changed."""
+    products = dict(Product.objects.values("seller").annotate(n=Count("id")).order_by().values_list("seller", "n"))
+    reviews = review_totals(ProductReview.objects.all())
+    stale = []
+    for seller in Seller.objects.only("pk", *TOTALS).iterator():
+        actual = {
+            "product_count": products.get(seller.pk, 0),
+            "review_count": 0,
+            "rating_total": 0,
+            **reviews.get(seller.pk, {}),
+        }
+        if any(getattr(seller, field) != actual[field] for field in TOTALS):
+            for field in TOTALS:
+                setattr(seller, field, actual[field])
+            stale.append(seller)
+    Seller.objects.bulk_update(stale, TOTALS, batch_size=UPDATE_BATCH)
+    return len(stale)
@@ -1,9 +1,16 @@
+import uuid
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Product, ProductReview, Order, Transaction, UPIConfig
+
+from backend.profiling import TimedSerializerMixin
+from .inventory import OutOfStock, decrement_stock, reserve_stock
+from .models import Product, ProductReview, Order, Transaction, UPIConfig, SimilarProduct, Seller
+from .rollups import record_order_changes
 
 
 # -------------------- PRODUCT REVIEW SERIALIZER --------------------
-class ProductReviewSerializer(serializers.ModelSerializer):
+class ProductReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
 
     class Meta:
@@ -17,10 +24,12 @@ class ProductReviewSerializer(serializers.ModelSerializer):
 
 
 # -------------------- PRODUCT SERIALIZER --------------------
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     reviews = ProductReviewSerializer(many=True, read_only=True)
     available_sizes = serializers.ReadOnlyField()  # ✅ use model property
+    selling_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    sold_by = serializers.CharField(source="seller.name", read_only=True)
 
     class Meta:
         model = Product
@@ -29,10 +38,12 @@ class ProductSerializer(serializers.ModelSerializer):
             "name",
             "price",
             "discount",
+            "selling_price",
             "image",
             "image_url",
             "image_file",
             "available_sizes",
+            "seller",
             "sold_by",
             "occasion",
             "color",
@@ -49,30 +60,237 @@ class ProductSerializer(serializers.ModelSerializer):
         return obj.image
 
 
+# -------------------- SIMILAR PRODUCT SERIALIZER --------------------
+class SimilarProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """A stored neighbour, flattened to the fields a product card needs."""
+    id = serializers.IntegerField(source="similar_id")
+    name = serializers.CharField(source="similar.name")
+    price = serializers.DecimalField(source="similar.price", max_digits=10, decimal_places=2)
+    discount = serializers.IntegerField(source="similar.discount")
+    image = serializers.CharField(source="similar.image")
+    sold_by = serializers.CharField(source="similar.seller.name")
+
+    class Meta:
+        model = SimilarProduct
+        fields = ["id", "name", "price", "discount", "image", "sold_by", "score"]
+
+
+# -------------------- SELLER SERIALIZER --------------------
+class SellerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """A seller storefront header; the totals are cached on the row (see shop.sellers)."""
+    average_rating = serializers.DecimalField(max_digits=4, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Seller
+        fields = ["id", "name", "product_count", "review_count", "average_rating", "created_at"]
+
+
+# -------------------- PRODUCT IMPORT SERIALIZER --------------------
+SIZE_FIELDS = {
+    label: f"size_{label.lower()}"
+    for label in ["S", "M", "L", "XL", "XXL", "3XL", "4XL", "5XL", "6XL", "7XL", "8XL"]
+}
+
+
+class SizesField(serializers.Field):
+    """Sizes as a list or a "S|M|L" / "S, M, L" string; returns the labels."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = data.replace("|", ",").replace(";", ",").split(",")
+        if not isinstance(data, list):
+            raise serializers.ValidationError("Expected a list of sizes or a 'S|M|L' string.")
+        sizes = [str(size).strip().upper() for size in data if str(size).strip()]
+        unknown = [size for size in sizes if size not in SIZE_FIELDS]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown size(s): {', '.join(unknown)}. Choose from: {', '.join(SIZE_FIELDS)}."
+            )
+        return sizes
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """
+    One catalog import row. `sizes` replaces the size_* flags when given;
+    `sold_by` falls back to the importer's default seller.
+    """
+    sizes = SizesField(required=False)
+    seller_sku = serializers.CharField(max_length=100)
+    sold_by = serializers.CharField(max_length=255, required=False)
+
+    class Meta:
+        model = Product
+        fields = [
+            "seller_sku",
+            "name",
+            "price",
+            "discount",
+            "image_url",
+            "sold_by",
+            *SIZE_FIELDS.values(),
+            "sizes",
+            "occasion",
+            "color",
+            "fit_shape",
+            "pattern",
+            "fabric",
+            "sleeve_length",
+            "country_of_origin",
+        ]
+        validators = []  # (seller, seller_sku) is the upsert key, not a uniqueness error
+
+    def validate(self, attrs):
+        if "sold_by" not in attrs:
+            if not self.context.get("default_seller"):
+                raise serializers.ValidationError({"sold_by": "This field is required (no default seller given)."})
+            attrs["sold_by"] = self.context["default_seller"]
+        sizes = attrs.pop("sizes", None)
+        if sizes is not None:
+            attrs.update({field: label in sizes for label, field in SIZE_FIELDS.items()})
+        return attrs
+
+
 # -------------------- ORDER SERIALIZER --------------------
-class OrderSerializer(serializers.ModelSerializer):
+MAX_CART_LINES = 50
+DEFAULT_SIZE = Order._meta.get_field("size").default
+
+
+def generate_order_id():
+    return f"ORDER:{uuid.uuid4().hex[:12].upper()}"
+
+
+def price_order_line(product, size, quantity):
+    """
+    Validate the size against the product and return the server-side total.
+    Products without size options only accept the default "Free Size".
+    """
+    sizes = product.available_sizes or [DEFAULT_SIZE]
+    if size not in sizes:
+        raise serializers.ValidationError(
+            {"size": f"Size '{size}' is not available for {product.name}. Choose from: {', '.join(sizes)}."}
+        )
+    return product.selling_price * quantity
+
+
+def take_stock(lines):
+    """
+    Decrement stock for (product_id, size, quantity) lines; call inside a transaction.
+    Lines are merged and taken in a fixed order so concurrent carts lock rows consistently.
+    Returns the (product_id, size) pairs whose stock is tracked.
+    """
+    tracked = set()
+    wanted = {}
+    for product_id, size, quantity in lines:
+        wanted[product_id, size] = wanted.get((product_id, size), 0) + quantity
+    for (product_id, size), quantity in sorted(wanted.items()):
+        try:
+            if decrement_stock(product_id, size, quantity):
+                tracked.add((product_id, size))
+        except OutOfStock as e:
+            raise serializers.ValidationError({"stock": f"Product {product_id}: {e}"})
+    return tracked
+
+
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
+    product_id = serializers.PrimaryKeyRelatedField(
+        source="product", queryset=Product.objects.all(), write_only=True
+    )
 
     class Meta:
         model = Order
         fields = "__all__"
-        read_only_fields = ("created_at",)
+        read_only_fields = ("order_id", "final_price", "payment_status", "created_at")
+        extra_kwargs = {"quantity": {"min_value": 1}}
+
+    def validate(self, attrs):
+        """Price the order on the server; any client-sent final_price is ignored."""
+        product = attrs["product"]
+        size = attrs.get("size", DEFAULT_SIZE)
+        quantity = attrs.get("quantity", 1)
+        attrs["final_price"] = price_order_line(product, size, quantity)
+        return attrs
 
     def create(self, validated_data):
-        import uuid
-        validated_data["order_id"] = f"ORDER:{uuid.uuid4().hex[:12].upper()}"
-        return Order.objects.create(**validated_data)
+        validated_data["order_id"] = generate_order_id()
+        with transaction.atomic():
+            tracked = take_stock([(
+                validated_data["product"].pk,
+                validated_data.get("size", DEFAULT_SIZE),
+                validated_data.get("quantity", 1),
+            )])
+            order = Order.objects.create(**validated_data)
+            reserve_stock([order], tracked)
+            record_order_changes([(order, None)])
+        return order
+
+
+# -------------------- CART CHECKOUT SERIALIZER --------------------
+class CartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    size = serializers.CharField(max_length=32, default=DEFAULT_SIZE)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartCheckoutSerializer(serializers.Serializer):
+    """
+    Place one order per cart line in a single request.
+    Products are loaded with one query and all orders are inserted with one bulk_create.
+    """
+    items = CartLineSerializer(many=True, allow_empty=False, max_length=MAX_CART_LINES)
+
+    def validate_items(self, items):
+        products = (
+            Product.objects.select_related("seller")
+            .prefetch_related("reviews")
+            .in_bulk({line["product_id"] for line in items})
+        )
+        errors = []
+        for line in items:
+            product = products.get(line["product_id"])
+            if product is None:
+                errors.append({"product_id": f"Product {line['product_id']} does not exist."})
+                continue
+            try:
+                line["final_price"] = price_order_line(product, line["size"], line["quantity"])
+            except serializers.ValidationError as e:
+                errors.append(e.detail)
+                continue
+            line["product"] = product
+            errors.append({})
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        orders = [
+            Order(
+                product=line["product"],
+                size=line["size"],
+                quantity=line["quantity"],
+                final_price=line["final_price"],
+                order_id=generate_order_id(),
+            )
+            for line in validated_data["items"]
+        ]
+        with transaction.atomic():
+            tracked = take_stock((order.product_id, order.size, order.quantity) for order in orders)
+            orders = Order.objects.bulk_create(orders)
+            reserve_stock(orders, tracked)
+            record_order_changes([(order, None) for order in orders])
+        return orders
 
 
 # -------------------- TRANSACTION SERIALIZER --------------------
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = "__all__"
 
 
 # -------------------- UPI CONFIG SERIALIZER --------------------
-class UPIConfigSerializer(serializers.ModelSerializer):
+class UPIConfigSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UPIConfig
         fields = "__all__"
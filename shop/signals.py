@@ -0,0 +1,152 @@
+"""
+Catalog write hooks: every save or delete of a product, review or seller, from
+any code path (views, admin, shell, management commands, cascades), logs the
+products it shows in to the change feed (shop.changefeed) and moves the
+product or review in or out of its seller's storefront totals (shop.sellers).
+
+`queryset.update()` sends no signals, so the Product and ProductReview
+querysets run `updating_products` / `updating_reviews` around it. bulk_create
+sends none either; the bulk loaders (shop.seeding, shop.catalog_import,
+shop.benchmarks) log their rows and count them for their sellers themselves.
+"""
+
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import changefeed, sellers
+from .models import Product, ProductReview, Seller
+
+# Columns no client shows; writes touching only these aren't catalog changes.
+UNLOGGED_FIELDS = {"view_count", "click_count", "trending_score", "bestseller_score"}
+
+
+def previous(instance, *fields):
+    """The stored values of `fields` of a row about to be saved, or None for a new one."""
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance)._base_manager.filter(pk=instance.pk).values(*fields).first()
+
+
+def seller_of(product_id):
+    return Product._base_manager.filter(pk=product_id).values_list("seller_id", flat=True).first()
+
+
+# -------------------- PRODUCTS --------------------
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._stored = previous(instance, "seller_id")
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    stored = getattr(instance, "_stored", None)
+    if created:
+        sellers.apply({instance.seller_id: {"product_count": 1}}, 1)
+    elif stored and stored["seller_id"] != instance.seller_id:
+        # The product takes its reviews along to the new seller.
+        reviews = ProductReview._base_manager.filter(product=instance.pk)
+        moved = {**sellers.review_totals(reviews).get(instance.seller_id, {}), "product_count": 1}
+        sellers.apply({stored["seller_id"]: moved}, -1)
+        sellers.apply({instance.seller_id: moved}, 1)
+    if update_fields is None or not set(update_fields) <= UNLOGGED_FIELDS:
+        changefeed.record([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # Its reviews, deleted with it, take themselves out (review_deleting).
+    # The stored seller: the instance may predate a queryset update.
+    sellers.apply({seller_of(instance.pk): {"product_count": 1}}, -1)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    changefeed.record([instance.pk], deleted=True)
+
+
+@contextmanager
+def updating_products(queryset, values):
+    """Log the products a `queryset.update(**values)` changes, and move them between sellers, in its transaction."""
+    if set(values) <= UNLOGGED_FIELDS:
+        yield
+        return
+    with transaction.atomic(using=queryset.db):
+        product_ids = list(queryset.values_list("pk", flat=True))
+        moving = "seller" in values or "seller_id" in values
+        if moving:
+            sellers.record_products(Product._base_manager.filter(pk__in=product_ids), -1)
+        yield
+        if moving:
+            sellers.record_products(Product._base_manager.filter(pk__in=product_ids))
+        changefeed.record(product_ids)
+
+
+# -------------------- REVIEWS --------------------
+def review_delta(seller_id, rating):
+    return {seller_id: {"review_count": 1, "rating_total": sellers.rating_sum(rating)}}
+
+
+@receiver(pre_save, sender=ProductReview)
+def review_saving(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._stored = previous(instance, "product_id", "product__seller_id", "rating")
+
+
+@receiver(post_save, sender=ProductReview)
+def review_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    stored = getattr(instance, "_stored", None)
+    if stored:  # out of the totals as it was, back in as it is
+        sellers.apply(review_delta(stored["product__seller_id"], stored["rating"]), -1)
+    sellers.apply(review_delta(seller_of(instance.product_id), instance.rating), 1)
+    # A review moved to another product leaves the first one changed too.
+    changefeed.record({instance.product_id, stored["product_id"] if stored else instance.product_id})
+
+
+@receiver(pre_delete, sender=ProductReview)
+def review_deleting(sender, instance, **kwargs):
+    sellers.record_reviews(ProductReview._base_manager.filter(pk=instance.pk), -1)
+
+
+@receiver(post_delete, sender=ProductReview)
+def review_deleted(sender, instance, **kwargs):
+    changefeed.record([instance.product_id])
+
+
+@contextmanager
+def updating_reviews(queryset, values):
+    """Move the reviews a `queryset.update(**values)` changes between sellers' totals, and log their products."""
+    if not {"rating", "product", "product_id"} & set(values):
+        yield
+        return
+    with transaction.atomic(using=queryset.db):
+        review_ids = list(queryset.values_list("pk", flat=True))
+        reviews = ProductReview._base_manager.filter(pk__in=review_ids)
+        product_ids = set(reviews.values_list("product_id", flat=True))
+        sellers.record_reviews(reviews, -1)
+        yield
+        sellers.record_reviews(reviews)
+        changefeed.record(product_ids | set(reviews.values_list("product_id", flat=True)))
+
+
+# -------------------- SELLERS --------------------
+@receiver(pre_save, sender=Seller)
+def seller_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._stored = previous(instance, "name")
+
+
+@receiver(post_save, sender=Seller)
+def seller_saved(sender, instance, raw=False, **kwargs):
+    """Products show their seller's name, so a rename changes all of them."""
+    stored = getattr(instance, "_stored", None)
+    if not raw and stored and stored["name"] != instance.name:
+        changefeed.record(Product.objects.filter(seller=instance).values_list("pk", flat=True))
@@ -0,0 +1,326 @@
+"""
+Precomputed "similar products" (`manage.py compute_similar`).
+
+Every product is encoded as a few small integer codes: per attribute
+(occasion, color, fabric, ...) the value's index among that attribute's
+MAX_VALUES most common values (-1 for rarer ones, which never match), plus
+two overlapping price bands. The similarity of two products is the cosine of
+the weighted one-hot vectors those codes stand for: the summed weights of the
+codes they share over the product of their lengths. That is about 30 bytes per
+product, so the whole catalog stays in memory; scores are computed for a block
+of products against all of it at a time, with blocks sized so the score matrix
+stays under SCORE_MEMORY, and only each row's top TOP_K neighbours are kept
+and stored in SimilarProduct.
+
+Products whose attributes change are queued in SimilarityRefresh;
+`compute_similar --changed` recomputes their neighbours and those of every
+product whose stored list they now enter or used to be in. A --loop worker
+loads the catalog once and on each pass reads only the queued products and
+the ones the change feed (shop.changefeed) names, so it also picks up
+products added or edited outside the admin and the importer.
+"""
+
+import math
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import changefeed
+from .models import Product, SimilarityRefresh, SimilarProduct
+
+# Score of one shared value, before dividing by the vectors' lengths.
+ATTRIBUTE_WEIGHTS = {
+    "occasion": 1.0,
+    "color": 1.0,
+    "fabric": 1.0,
+    "pattern": 0.8,
+    "fit_shape": 0.6,
+    "sleeve_length": 0.6,
+    "seller": 0.5,
+}
+PRICE_WEIGHT = 1.0
+PRICE_BAND_RATIO = 1.5  # one band spans prices x .. 1.5x
+PRICE_BANDS = 40
+# Product fields the codes are built from; a change to any of them queues a refresh.
+SOURCE_FIELDS = (*ATTRIBUTE_WEIGHTS, "price", "discount")
+# Per code column: the attributes, then the two price bands (half the price weight each).
+WEIGHTS = np.array([*ATTRIBUTE_WEIGHTS.values(), PRICE_WEIGHT / 2, PRICE_WEIGHT / 2], dtype=np.float32)
+
+MAX_VALUES = 64  # codes per attribute; rarer values never count as a match
+TOP_K = 12
+MIN_SCORE = 1e-6  # products with nothing in common aren't neighbours
+SCORE_MEMORY = 64 * 1024 * 1024  # bytes of scores (and their temporaries) per block
+MAX_BLOCK = 512
+LOAD_BATCH = 5000
+
+
+def normalize(value):
+    return "" if value is None else str(value).strip().lower()
+
+
+def price_bands(prices):
+    """
+    Band of each price in two grids offset by half a band: the same band in
+    both scores PRICE_WEIGHT, a nearby price in one of them half of it.
+    """
+    level = np.log(np.maximum(prices, 1.0)) / math.log(PRICE_BAND_RATIO)
+    return [np.minimum((level + offset).astype(np.int64), PRICE_BANDS - 1) for offset in (0.0, 0.5)]
+
+
+# -------------------- ENCODING --------------------
+ROW_FIELDS = ("pk", "effective_price", *ATTRIBUTE_WEIGHTS)
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode(vocabulary, rows, grow=False):
+    """
+    (ids, codes) of ROW_FIELDS rows, codes with one column per row. With
+    `grow`, values not seen yet get a code while the attribute has room.
+    """
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    codes = np.empty((len(WEIGHTS), len(rows)), dtype=np.int16)
+    for column, field in enumerate(ATTRIBUTE_WEIGHTS):
+        known = vocabulary[field]
+        for n, row in enumerate(rows):
+            key = normalize(row[2 + column])
+            if grow and key and key not in known and len(known) < MAX_VALUES:
+                known[key] = len(known)
+            codes[column, n] = known.get(key, -1)
+    codes[-2], codes[-1] = price_bands(np.array([float(row[1]) for row in rows], dtype=np.float64))
+    return ids, codes
+
+
+class Catalog:
+    """Every product's codes, one column per product in id order."""
+
+    def __init__(self, vocabulary, ids, codes, token=0):
+        self.vocabulary = vocabulary  # {field: {normalized value: code}}
+        self.token = token  # change feed token the rows are current to
+        self.ids = ids
+        self.codes = codes
+        self.lengths = np.sqrt(WEIGHTS @ (codes >= 0))
+
+    @classmethod
+    def load(cls):
+        # Changes made while the rows are read are replayed by the first sync().
+        token = changefeed.latest()
+        vocabulary = {}
+        for field in ATTRIBUTE_WEIGHTS:
+            # Most frequent values first; GROUP BY per attribute keeps Python memory flat.
+            # (Ties by the column itself: ordering by a foreign key would sort by the related model.)
+            values = (
+                Product.objects.values(field)
+                .annotate(n=Count("id"))
+                .order_by("-n", Product._meta.get_field(field).attname)
+                .values_list(field, flat=True)
+            )
+            known = vocabulary[field] = {}
+            for value in values.iterator():
+                key = normalize(value)
+                if key and key not in known:
+                    known[key] = len(known)
+                    if len(known) == MAX_VALUES:
+                        break
+
+        ids, codes = [], []
+        rows = Product.objects.order_by("pk").values_list(*ROW_FIELDS).iterator(chunk_size=LOAD_BATCH)
+        for batch in batches(rows, LOAD_BATCH):
+            batch_ids, batch_codes = encode(vocabulary, batch)
+            ids.append(batch_ids)
+            codes.append(batch_codes)
+        if not ids:
+            return cls(vocabulary, *encode(vocabulary, []), token)
+        return cls(vocabulary, np.concatenate(ids), np.hstack(codes), token)
+
+    def lookup(self, product_ids):
+        """(rows, found): the catalog column of each of `product_ids`, and which of them are in the catalog."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, product_ids), max(len(self.ids) - 1, 0))
+        found = self.ids[rows] == product_ids if len(self.ids) else np.zeros(len(product_ids), dtype=bool)
+        return rows, found
+
+    def positions(self, product_ids):
+        """Catalog columns of the products in `product_ids` that are in it, in id order."""
+        rows, found = self.lookup(np.unique(np.fromiter(product_ids, dtype=np.int64)))
+        return rows[found]
+
+    def reload(self, product_ids):
+        """Read `product_ids` again, adding new and dropping deleted products; returns the ids whose codes changed."""
+        product_ids = sorted(set(product_ids))
+        rows = []
+        for start in range(0, len(product_ids), LOAD_BATCH):
+            batch = product_ids[start : start + LOAD_BATCH]
+            rows += Product.objects.filter(pk__in=batch).values_list(*ROW_FIELDS)
+        ids, codes = encode(self.vocabulary, rows, grow=True)
+
+        replaced = np.isin(self.ids, np.array(product_ids, dtype=np.int64))
+        before = dict(zip(self.ids[replaced].tolist(), map(tuple, self.codes[:, replaced].T.tolist())))
+        changed = [pk for pk, row in zip(ids.tolist(), codes.T.tolist()) if before.get(pk) != tuple(row)]
+
+        ids = np.concatenate([self.ids[~replaced], ids])
+        codes = np.hstack([self.codes[:, ~replaced], codes])
+        order = np.argsort(ids, kind="stable")
+        self.ids, self.codes = ids[order], codes[:, order]
+        self.lengths = np.sqrt(WEIGHTS @ (self.codes >= 0))
+        return changed
+
+    def sync(self):
+        """Reload the products changed or deleted since the last sync; returns the ids whose codes changed."""
+        changed = []
+        more = True
+        while more:
+            self.token, more, updated, deleted = changefeed.read(self.token, limit=LOAD_BATCH)
+            changed += self.reload(updated + deleted)
+        return changed
+
+    def scores(self, rows):
+        """scores[i, j] = similarity of product rows[i] to product j (self excluded)."""
+        scores = np.zeros((len(rows), len(self.ids)), dtype=np.float32)
+        shared = np.empty(scores.shape, dtype=bool)
+        for column, weight in enumerate(WEIGHTS):
+            codes = self.codes[column, rows]
+            np.equal(codes[:, None], self.codes[column], out=shared)
+            shared &= (codes >= 0)[:, None]
+            np.add(scores, weight, out=scores, where=shared)
+        scores /= self.lengths[rows, None]
+        scores /= self.lengths
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return scores
+
+
+# -------------------- NEIGHBOURS --------------------
+def score_blocks(catalog, positions):
+    """Yield (rows, scores) for blocks of `positions`; see Catalog.scores."""
+    total = len(catalog.ids)
+    # Per score: the float32, a byte of shared codes and np.partition's float32 copy.
+    block = max(1, min(MAX_BLOCK, SCORE_MEMORY // (9 * max(total, 1))))
+    for start in range(0, len(positions), block):
+        rows = positions[start : start + block]
+        yield rows, catalog.scores(rows)
+
+
+def top_neighbours(catalog, scores):
+    """Per row, [(product_id, score), ...] best first; products with nothing in common are left out."""
+    total = scores.shape[1]
+    k = min(TOP_K, total - 1)
+    if k <= 0:
+        return [[] for _ in range(len(scores))]
+    # Scores are rounded so the float error of a different vocabulary order
+    # can't reorder equal matches; ties go to the lower id (columns are in id
+    # order), so reruns and incremental refreshes store the same lists.
+    scores = np.round(scores, 6, out=scores)
+    kth = np.partition(scores, total - k, axis=1)[:, total - k]
+    found = []
+    for row, cutoff in zip(scores, kth):
+        candidates = np.flatnonzero(row >= max(cutoff, MIN_SCORE))
+        best = candidates[np.argsort(-row[candidates], kind="stable")[:k]]
+        found.append([(int(catalog.ids[j]), round(float(row[j]), 6)) for j in best])
+    return found
+
+
+def store(catalog, rows, neighbours):
+    product_ids = [int(catalog.ids[row]) for row in rows]
+    with transaction.atomic():
+        # Products deleted since the catalog was read can't be listed.
+        listed = {similar_id for found in neighbours for similar_id, _ in found}
+        existing = set(Product.objects.filter(pk__in=listed).values_list("pk", flat=True))
+        SimilarProduct.objects.filter(product_id__in=product_ids).delete()
+        SimilarProduct.objects.bulk_create(
+            SimilarProduct(product_id=product_id, similar_id=similar_id, rank=rank, score=score)
+            for product_id, found in zip(product_ids, neighbours)
+            for rank, (similar_id, score) in enumerate(pair for pair in found if pair[0] in existing)
+        )
+
+
+def recompute(catalog, positions):
+    for rows, scores in score_blocks(catalog, positions):
+        store(catalog, rows, top_neighbours(catalog, scores))
+
+
+def compute_all():
+    """Recompute every product's neighbours; returns the number of products."""
+    started = timezone.now()
+    catalog = Catalog.load()
+    recompute(catalog, np.arange(len(catalog.ids)))
+    SimilarityRefresh.objects.filter(queued_at__lte=started).delete()
+    return len(catalog.ids)
+
+
+def refresh(product_ids, catalog=None):
+    """
+    Recompute the neighbours of `product_ids`, and of every product they now
+    outscore the weakest stored neighbour of or already appear among.
+    Returns the number of products recomputed.
+    """
+    catalog = catalog or Catalog.load()
+    changed = catalog.positions(product_ids)
+    if not len(changed):
+        return 0
+    total = len(catalog.ids)
+
+    # Score a product must beat to enter a stored list: its weakest neighbour
+    # once the list is full, else anything in common.
+    threshold = np.full(total, MIN_SCORE, dtype=np.float32)
+    weakest = SimilarProduct.objects.filter(rank=TOP_K - 1).values_list("product_id", "score")
+    for batch in batches(weakest.iterator(chunk_size=LOAD_BATCH), LOAD_BATCH):
+        rows, found = catalog.lookup([product_id for product_id, _ in batch])
+        threshold[rows[found]] = np.array([score for _, score in batch], dtype=np.float32)[found]
+
+    affected = np.zeros(total, dtype=bool)
+    for rows, scores in score_blocks(catalog, changed):
+        store(catalog, rows, top_neighbours(catalog, scores))
+        affected |= (scores >= threshold).any(axis=0)
+    changed_ids = catalog.ids[changed].tolist()
+    for start in range(0, len(changed_ids), MAX_BLOCK):
+        listed = SimilarProduct.objects.filter(similar_id__in=changed_ids[start : start + MAX_BLOCK])
+        affected[catalog.positions(listed.values_list("product_id", flat=True).distinct().iterator())] = True
+    affected[changed] = False
+
+    recompute(catalog, np.flatnonzero(affected))
+    return len(changed) + int(affected.sum())
+
+
+# -------------------- QUEUE --------------------
+def queue_refresh(product_ids):
+    """Mark products for the next `compute_similar --changed` run."""
+    SimilarityRefresh.objects.bulk_create(
+        [SimilarityRefresh(product_id=pk) for pk in product_ids],
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["queued_at"],
+    )
+
+
+def refresh_queued(limit=10000, catalog=None):
+    """
+    Refresh up to `limit` queued products; returns (refreshed, recomputed).
+    Products queued again while this runs stay queued for the next run.
+
+    Pass a worker's long-lived `catalog` to read only the queued products and
+    those changed since its last pass; the ones whose codes changed are
+    refreshed too, queued or not. Without one the whole catalog is loaded.
+    """
+    started = timezone.now()
+    queued = list(SimilarityRefresh.objects.order_by("queued_at").values_list("product_id", flat=True)[:limit])
+    if catalog is None:
+        if not queued:
+            return 0, 0
+        catalog = Catalog.load()
+        products = set(queued)
+    else:
+        products = {*catalog.sync(), *catalog.reload(queued), *queued}
+    recomputed = refresh(products, catalog) if products else 0
+    SimilarityRefresh.objects.filter(product_id__in=queued, queued_at__lte=started).delete()
+    return len(products), recomputed
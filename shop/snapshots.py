@@ -0,0 +1,435 @@
+"""
+Prebuilt product API documents, served from disk (`manage.py build_snapshots`).
+
+Most anonymous traffic asks for the same few documents: the bare
+`/api/products/` list, the first pages of each `/api/products/?ordering=`
+ranking and the product detail pages. The builder renders those through the
+real viewset and serializer, so the bytes are the ones the API would send,
+and writes each one under SNAPSHOT_ROOT with gzip (and, with the brotli
+package installed, brotli) copies:
+
+    list.json(.gz|.br)
+    pages/ordering%3Dtrending.json
+    pages/cursor%3D...%26ordering%3Dtrending.json
+    products/<id>.json
+
+The bare list is every product's detail document, newest first, so it is
+assembled from the product files rather than rendered again; it is streamed
+to disk and compressed from there, never held in memory.
+
+SnapshotMiddleware answers GET/HEAD requests for exactly those URLs from the
+files, ahead of sessions, auth, the ORM and DRF, choosing the encoding from
+Accept-Encoding and answering If-None-Match/If-Modified-Since with a 304.
+Anything else, or a document not on disk, goes to the view as before.
+
+Every file is written to a temporary name in its directory and renamed over
+the old one, so a reader gets the previous document or the new one, never
+part of either. The identity file is renamed last and removed first, so while
+it exists its compressed copies do too.
+
+A full build records the change-feed token it started from (shop.changefeed);
+`build_snapshots --changed` rewrites the documents of products changed since
+then, removes deleted ones, and re-renders the ranked pages, whose order
+moves with sales rather than with catalog edits, and the list if any product
+changed. Documents whose bytes didn't
+change are left alone, keeping their ETag.
+
+Absolute URLs in the documents (`next` links, uploaded images) are built for
+SNAPSHOT_BASE_URL, and only requests to that scheme and host are served.
+"""
+
+import filecmp
+import os
+import re
+import tempfile
+import zlib
+from pathlib import Path
+from urllib.parse import quote, urlencode, urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework.renderers import JSONRenderer
+
+from . import changefeed, counters
+from .models import ProductChange
+from .serializers import ProductSerializer
+from .views import ProductViewSet
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+PAGES = 3  # per ordering
+BATCH_SIZE = 500
+MAX_NAME = 200  # longer queries aren't ours, and would overflow file names
+MIN_SAVING = 0.05  # compressed copies must be at least this much smaller
+READ_SIZE = 1024 * 1024
+LIST_NAME = "list.json"  # the bare list; no query string quotes to it
+
+
+class BrotliCompressor:
+    """brotli.Compressor with zlib's compress/flush interface."""
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+# (Content-Encoding, file suffix, new incremental compressor), preferred first.
+ENCODINGS = [("gzip", ".gz", lambda: zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS))]
+if brotli:
+    ENCODINGS.insert(0, ("br", ".br", BrotliCompressor))
+SUFFIXES = (".br", ".gz")
+
+
+def page_name(query):
+    return f"pages/{quote(query, safe='')}.json"
+
+
+def product_name(pk):
+    return f"products/{pk}.json"
+
+
+# -------------------- FILES --------------------
+def stage(directory, chunks):
+    """Write the byte strings `chunks` to a new temporary file in `directory`; returns its path."""
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.chmod(temporary, 0o644)  # mkstemp creates 0600; the web server may run as another user
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return temporary
+
+
+def publish(temporary, path):
+    try:
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def write_atomic(path, data):
+    publish(stage(path.parent, [data]), path)
+
+
+def read_chunks(path):
+    with open(path, "rb") as file:
+        while chunk := file.read(READ_SIZE):
+            yield chunk
+
+
+def compressed(chunks, new_compressor):
+    compressor = new_compressor()
+    for chunk in chunks:
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+
+def write_document(root, name, chunks):
+    """
+    Write the document made of the byte strings `chunks`, and its compressed
+    copies, without holding it in memory; returns False if it was already this.
+    """
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    body = stage(path.parent, chunks)
+    try:
+        unchanged = path.exists() and filecmp.cmp(body, path, shallow=False)
+        size = os.path.getsize(body)
+        compressors = {suffix: new_compressor for _, suffix, new_compressor in ENCODINGS}
+        for suffix in SUFFIXES:
+            variant = path.with_name(path.name + suffix)
+            if unchanged and (suffix not in compressors or variant.exists()):
+                continue  # (a copy missing from an unchanged document: brotli was installed since)
+            if suffix in compressors:
+                copy = stage(path.parent, compressed(read_chunks(body), compressors[suffix]))
+                if os.path.getsize(copy) <= size * (1 - MIN_SAVING):
+                    publish(copy, variant)
+                    continue
+                os.unlink(copy)
+            variant.unlink(missing_ok=True)
+    except BaseException:
+        os.unlink(body)
+        raise
+    if unchanged:
+        os.unlink(body)
+        return False
+    publish(body, path)
+    return True
+
+
+def remove_document(root, name):
+    path = root / name
+    path.unlink(missing_ok=True)
+    for suffix in SUFFIXES:
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+
+def remove_stale(root, directory, keep):
+    """Remove documents in `directory` whose names aren't in `keep`; returns how many."""
+    removed = 0
+    for path in (root / directory).glob("*.json"):
+        name = f"{directory}/{path.name}"
+        if name not in keep:
+            remove_document(root, name)
+            removed += 1
+    return removed
+
+
+def read_token(root):
+    try:
+        return int((root / "token").read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_token(root, token):
+    root.mkdir(parents=True, exist_ok=True)
+    write_atomic(root / "token", str(token).encode())
+
+
+# -------------------- RENDERING --------------------
+def base_request(path):
+    """A GET for `path` as a client of SNAPSHOT_BASE_URL would send it."""
+    base = urlsplit(settings.SNAPSHOT_BASE_URL)
+    return RequestFactory().get(
+        path, HTTP_HOST=base.netloc, HTTP_ACCEPT="application/json", secure=base.scheme == "https"
+    )
+
+
+def build_pages(root):
+    """Render the first PAGES pages of every ordering; returns the documents rewritten."""
+    view = ProductViewSet.as_view({"get": "list"})
+    path = reverse("product-list")
+    written, names = 0, set()
+    for ordering in ProductViewSet.orderings:
+        query = urlencode({"ordering": ordering})
+        for _ in range(PAGES):
+            response = view(base_request(f"{path}?{query}"))
+            names.add(page_name(query))
+            written += write_document(root, page_name(query), [JSONRenderer().render(response.data)])
+            if not response.data["next"]:
+                break
+            query = urlsplit(response.data["next"]).query
+    remove_stale(root, "pages", names)
+    return written
+
+
+def build_products(root, product_ids):
+    """Render the detail documents of `product_ids`; returns (rewritten, ids no longer in the catalog)."""
+    request = base_request(reverse("product-list"))
+    queryset = ProductViewSet.queryset.prefetch_related("reviews")
+    written, missing = 0, []
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        batch = product_ids[start : start + BATCH_SIZE]
+        products = list(queryset.filter(pk__in=batch).order_by("pk"))
+        for product, data in zip(products, ProductSerializer(products, many=True, context={"request": request}).data):
+            written += write_document(root, product_name(product.pk), [JSONRenderer().render(data)])
+        missing += sorted(set(batch) - {product.pk for product in products})
+    return written, missing
+
+
+def build_list(root):
+    """
+    Write the bare list, as the list view renders it: the product documents
+    newest first, in a JSON array. Returns whether it was rewritten.
+    """
+    ids = sorted((int(path.stem) for path in (root / "products").glob("*.json")), reverse=True)
+
+    def chunks():
+        yield b"["
+        for n, pk in enumerate(ids):
+            yield (b"," if n else b"") + (root / product_name(pk)).read_bytes()
+        yield b"]"
+
+    return write_document(root, LIST_NAME, chunks())
+
+
+def settled_token():
+    """The last change the feed would serve now; later ones are replayed by the next --changed pass."""
+    rows = ProductChange.objects.filter(changed_at__lte=timezone.now() - changefeed.SETTLE)
+    return rows.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+
+# -------------------- BUILDS --------------------
+def build(root=None):
+    """Render every snapshot document and remove stale ones; returns (documents rewritten, removed)."""
+    root = Path(root or settings.SNAPSHOT_ROOT)
+    token = settled_token()
+    product_ids = list(ProductViewSet.queryset.order_by("pk").values_list("pk", flat=True).iterator())
+    written, missing = build_products(root, product_ids)
+    written += build_pages(root)
+    removed = remove_stale(root, "products", {product_name(pk) for pk in set(product_ids) - set(missing)})
+    written += build_list(root)
+    write_token(root, token)
+    return written, removed
+
+
+def refresh(root=None):
+    """
+    Rewrite the documents of products changed since the last build or refresh;
+    returns (documents rewritten, removed). Without a previous build, builds.
+    """
+    root = Path(root or settings.SNAPSHOT_ROOT)
+    token = read_token(root)
+    if token is None:
+        return build(root)
+    written = removed = 0
+    more = True
+    while more:
+        token, more, changed, deleted = changefeed.read(token)
+        rewritten, missing = build_products(root, changed)
+        written += rewritten
+        for pk in deleted + missing:
+            remove_document(root, product_name(pk))
+            removed += 1
+    if written or removed or not (root / LIST_NAME).exists():
+        written += build_list(root)
+    written += build_pages(root)
+    write_token(root, token)
+    return written, removed
+
+
+# -------------------- SERVING --------------------
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+async def read_async(file):
+    """The file's chunks, read off the event loop; ASGI would read a sync iterator whole first."""
+    try:
+        while chunk := await sync_to_async(file.read, thread_sensitive=False)(READ_SIZE):
+            yield chunk
+    finally:
+        file.close()
+
+
+class SnapshotMiddleware:
+    """Serve built snapshot documents; see the module docstring. Place it before sessions and auth."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.root = Path(settings.SNAPSHOT_ROOT)
+        self.base_url = settings.SNAPSHOT_BASE_URL.rstrip("/")
+        self.list_path = reverse("product-list")
+        self.detail_path = re.compile(re.escape(self.list_path) + r"(\d+)/")
+
+    def document(self, request):
+        """(document name, product id or None) for a request snapshots can answer, else None."""
+        if request.method not in ("GET", "HEAD") or "text/html" in request.headers.get("Accept", ""):
+            return None  # browsers get the browsable API
+        query = request.META.get("QUERY_STRING", "")
+        if request.path_info == self.list_path and not query:
+            document = LIST_NAME, None
+        elif request.path_info == self.list_path and len(query) <= MAX_NAME:
+            document = page_name(query), None
+        elif (match := self.detail_path.fullmatch(request.path_info)) and not query:
+            document = product_name(int(match[1])), int(match[1])
+        else:
+            return None
+        try:
+            if f"{request.scheme}://{request.get_host()}" != self.base_url:
+                return None
+        except DisallowedHost:
+            return None
+        return document
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        document = self.base_url and self.document(request)
+        response = self.serve(request, self.root / document[0]) if document else None
+        if response is None:
+            return self.get_response(request)
+        if document[1] and request.method == "GET":
+            counters.buffer.add("view_count", document[1])  # as ProductViewSet.retrieve would
+        return response
+
+    async def __acall__(self, request):
+        document = self.base_url and self.document(request)
+        response = self.serve(request, self.root / document[0], asynchronous=True) if document else None
+        if response is None:
+            return await self.get_response(request)
+        if document[1] and request.method == "GET":
+            await sync_to_async(counters.buffer.add)("view_count", document[1])  # it may write through
+        return response
+
+    def serve(self, request, path, asynchronous=False):
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        candidates = [
+            (encoding, suffix) for encoding, suffix, _ in ENCODINGS if encoding in accepted or "*" in accepted
+        ]
+        try:
+            file = open(path, "rb")  # the identity file exists whenever its copies do
+        except FileNotFoundError:
+            return None
+        encoding = None
+        for candidate, suffix in candidates:
+            try:
+                compressed = open(path.with_name(path.name + suffix), "rb")
+            except FileNotFoundError:
+                continue
+            file.close()
+            file, encoding = compressed, candidate
+            break
+
+        stat = os.fstat(file.fileno())
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        request.resolver_match = resolve(request.path_info)  # metrics label it as the view it stands in for
+        if_none_match = request.headers.get("If-None-Match")
+        if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        if (if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == "*")) or (
+            not if_none_match and if_modified_since and int(stat.st_mtime) <= if_modified_since
+        ):
+            file.close()
+            response = HttpResponseNotModified()
+        elif request.method == "HEAD":
+            file.close()
+            response = HttpResponse(content_type="application/json")
+            response["Content-Length"] = stat.st_size
+        elif asynchronous:
+            response = StreamingHttpResponse(read_async(file), content_type="application/json")
+            response["Content-Length"] = stat.st_size
+        else:
+            response = FileResponse(file, content_type="application/json")
+            del response["Content-Disposition"]
+        if encoding:
+            response["Content-Encoding"] = encoding
+        response["Vary"] = "Accept, Accept-Encoding"
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Cache-Control"] = "no-cache"  # revalidate: documents change with the catalog
+        return response
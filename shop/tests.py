@@ -1,3 +1,1432 @@
-from django.test import TestCase
+import csv
+import functools
+import gzip
+import importlib
+import io
+import itertools
+import json
+import os
+import random
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from backend import metrics, profiling
+from backend.db import routing
+
+from . import (
+    catalog_import,
+    changefeed,
+    changelists,
+    counters,
+    idempotency,
+    inventory,
+    popularity,
+    rollups,
+    sellers,
+    similarity,
+    snapshots,
+)
+from .admin import ProductAdmin
+from .models import (
+    IdempotencyKey,
+    Order,
+    Product,
+    ProductChange,
+    ProductImport,
+    ProductReview,
+    SalesRollup,
+    Seller,
+    StockReservation,
+    Transaction,
+    UPIConfig,
+)
+from .views import OrderViewSet, ProductViewSet
+
+
+# -------------------- QUERY PLAN REGRESSION --------------------
+class PlanRecorder:
+    """Execute wrapper that keeps every SELECT (with params) run through the connection."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith("SELECT"):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "Query plans are checked against SQLite's EXPLAIN output")
+# Plans are checked on "default"; replicas share its schema. Counters are
+# written through, so no flusher thread writes behind the test's transaction.
+@override_settings(DATABASE_ROUTERS=[], COUNTER_FLUSH_SECONDS=0)
+class QueryPlanTests(TestCase):
+    """
+    Run each endpoint and admin changelist on a seeded dataset and fail if any of
+    its SELECTs makes SQLite scan a whole table instead of using an index.
+    """
+
+    ALLOWED_SCANS = {
+        # Reads in primary-key (rowid) order are index walks, but SQLite reports them as "SCAN <table>".
+        "products-list": {"shop_product"},
+        "admin:shop_product": {"shop_product"},
+        # A handful of rows; the changelist COUNT(*) can't use the partial is_active index.
+        "admin:shop_upiconfig": {"shop_upiconfig"},
+        # Filtered changelist counts read at most COUNT_LIMIT rows of a LIMITed subquery.
+        "admin:shop_order?payment_status": {"subquery"},
+        "admin:shop_order?q": {"subquery"},
+        "admin:shop_transaction?q": {"subquery"},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(33)
+        sellers = Seller.objects.bulk_create(Seller(name=f"Seller {i}", key=f"seller {i}") for i in range(10))
+        products = Product.objects.bulk_create(
+            Product(name=f"Saree {i}", price=Decimal(rng.randint(199, 2999)), size_m=True, seller=sellers[i % 10])
+            for i in range(300)
+        )
+        ProductReview.objects.bulk_create(
+            ProductReview(
+                product=rng.choice(products),
+                reviewer_name=f"Reviewer {i}",
+                rating=Decimal(rng.randint(1, 5)),
+            )
+            for i in range(3000)
+        )
+        orders = Order.objects.bulk_create(
+            Order(
+                product=rng.choice(products),
+                final_price=Decimal(rng.randint(199, 2999)),
+                order_id=f"ORDER:{i:012d}",
+                payment_status=rng.choice(["pending", "paid", "failed"]),
+            )
+            for i in range(3000)
+        )
+        Transaction.objects.bulk_create(
+            Transaction(
+                order=order,
+                product_name=order.product.name,
+                amount=order.final_price,
+                payment_method=rng.choice(["PhonePe", "Paytm", "GPay"]),
+                transaction_id=f"TID{i:06d}",
+                status=rng.choice(["pending", "success", "failed"]),
+            )
+            for i, order in enumerate(orders)
+        )
+        UPIConfig.objects.bulk_create(
+            UPIConfig(upi_id=f"merchant{i}@upi", is_active=(i == 0)) for i in range(50)
+        )
+        # Each product logged twice, long enough ago for the change feed to serve it.
+        ProductChange.objects.bulk_create(ProductChange(product_id=product.pk) for product in products * 2)
+        ProductChange.objects.update(changed_at=timezone.now() - timedelta(minutes=1))
+        cls.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def full_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            details = [row[-1] for row in cursor.fetchall()]
+        return {
+            detail.split()[1]
+            for detail in details
+            if detail.startswith("SCAN ") and " USING " not in detail
+            and not detail.split()[1].startswith("sqlite_")  # the schema and ANALYZE's stats: a row per index
+        }
+
+    def assertNoFullScans(self, name, request):
+        recorder = PlanRecorder()
+        with connection.execute_wrapper(recorder):
+            response = request()
+        self.assertLess(response.status_code, 400, name)
+        self.assertTrue(recorder.queries, f"{name} ran no queries")
+
+        allowed = self.ALLOWED_SCANS.get(name, set())
+        for sql, params in recorder.queries:
+            scanned = self.full_scans(sql, params) - allowed
+            self.assertFalse(scanned, f"{name} scans {', '.join(sorted(scanned))}:\n{sql}")
+
+    def test_api_endpoints(self):
+        product = Product.objects.first()
+        order = Order.objects.first()
+        transaction = Transaction.objects.filter(status="pending").first()
+        endpoints = {
+            "products-list": lambda: self.client.get(reverse("product-list")),
+            "products-detail": lambda: self.client.get(reverse("product-detail", args=[product.pk])),
+            "products-trending": lambda: self.client.get(reverse("product-list"), {"ordering": "trending"}),
+            "products-bestseller-page": lambda: self.client.get(
+                reverse("product-list"),
+                {"ordering": "bestseller", "cursor": "WzAsIDE1MF0="},  # (0, 150)
+            ),
+            "products-price": lambda: self.client.get(
+                reverse("product-list"), {"ordering": "price", "min_price": "100", "max_price": "500"}
+            ),
+            "products-changes": lambda: self.client.get(reverse("product-changes"), {"since": "570"}),
+            "products-similar": lambda: self.client.get(reverse("product-similar", args=[product.pk])),
+            "sellers-list": lambda: self.client.get(reverse("seller-list")),
+            "sellers-detail": lambda: self.client.get(reverse("seller-detail", args=[product.seller_id])),
+            "sellers-products": lambda: self.client.get(
+                reverse("seller-products", args=[product.seller_id]),
+                {"page_size": 5, "cursor": "WzIwMCwgMjAwXQ=="},  # (200, 200)
+            ),
+            "orders-list": lambda: self.client.get(reverse("order-list")),
+            "orders-detail": lambda: self.client.get(reverse("order-detail", args=[order.pk])),
+            "reviews-list": lambda: self.client.get(reverse("productreview-list")),
+            "get_active_upi": lambda: self.client.get(reverse("get_active_upi")),
+            "generate_upi": lambda: self.client.get(reverse("generate_upi", args=[order.order_id])),
+            "create_transaction": lambda: self.client.post(
+                reverse("create_transaction"),
+                {"order_id": order.order_id, "amount": "10"},
+                content_type="application/json",
+            ),
+            "verify_transaction": lambda: self.client.post(
+                reverse("verify_transaction", args=[transaction.transaction_id]),
+                {"status": "success"},
+                content_type="application/json",
+            ),
+        }
+        for name, request in endpoints.items():
+            with self.subTest(endpoint=name):
+                self.assertNoFullScans(name, request)
+
+    def test_list_query_counts(self):
+        """Related rows are joined or prefetched: a list costs the same few queries whatever its length."""
+        product = Product.objects.first()
+        lists = {
+            "products-list": (lambda: self.client.get(reverse("product-list")), 2),
+            "products-trending": (lambda: self.client.get(reverse("product-list"), {"ordering": "trending"}), 2),
+            "products-changes": (lambda: self.client.get(reverse("product-changes"), {"since": "0"}), 3),
+            "sellers-list": (lambda: self.client.get(reverse("seller-list")), 1),
+            "sellers-products": (lambda: self.client.get(reverse("seller-products", args=[product.seller_id])), 3),
+            "orders-list": (lambda: self.client.get(reverse("order-list")), 2),
+            "reviews-list": (lambda: self.client.get(reverse("productreview-list")), 1),
+        }
+        for name, (request, queries) in lists.items():
+            with self.subTest(endpoint=name), self.assertNumQueries(queries):
+                self.assertEqual(request().status_code, 200)
+
+    # The manifest storage needs collectstatic; admin templates only need static URLs here.
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        changelists = {
+            "admin:shop_product": ("shop_product_changelist", ""),
+            "admin:shop_product?seller": ("shop_product_changelist", f"?seller={Seller.objects.first().pk}"),
+            "admin:shop_seller": ("shop_seller_changelist", ""),
+            "admin:shop_seller?q": ("shop_seller_changelist", "?q=seller%201"),
+            "admin:shop_productreview": ("shop_productreview_changelist", ""),
+            "admin:shop_order": ("shop_order_changelist", ""),
+            "admin:shop_order?payment_status": ("shop_order_changelist", "?payment_status__exact=pending"),
+            "admin:shop_order?after": (
+                "shop_order_changelist",
+                f"?after={Order.objects.order_by('-created_at')[150].pk}",
+            ),
+            "admin:shop_order?q": ("shop_order_changelist", "?q=ORDER:00000000012"),
+            "admin:shop_transaction": ("shop_transaction_changelist", ""),
+            "admin:shop_transaction?q": ("shop_transaction_changelist", "?q=tid0001"),
+            "admin:shop_upiconfig": ("shop_upiconfig_changelist", ""),
+        }
+        for name, (url_name, query) in changelists.items():
+            with self.subTest(changelist=name):
+                url = reverse(f"admin:{url_name}") + query
+                self.assertNoFullScans(name, lambda: self.client.get(url))
+
+
+# -------------------- VIEW / CLICK COUNTERS --------------------
+@override_settings(COUNTER_FLUSH_SECONDS=60)
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Counter Seller")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Kurti {i}", price=Decimal(499), size_m=True, seller=seller) for i in range(3)
+        )
+
+    def counts(self, field):
+        return dict(Product.objects.order_by("pk").values_list("pk", field))
+
+    def test_write_groups_increments(self):
+        first, second, third = (product.pk for product in self.products)
+        with self.assertNumQueries(4):  # SAVEPOINT, +1 for two products, +2 for one, RELEASE
+            counters.write({("view_count", first): 1, ("view_count", second): 1, ("view_count", third): 2})
+        self.assertEqual(self.counts("view_count"), {first: 1, second: 1, third: 2})
+
+    def test_add_buffers_until_flush(self):
+        buffer = counters.CounterBuffer()
+        product = self.products[0].pk
+        try:
+            with self.assertNumQueries(0):
+                for _ in range(3):
+                    buffer.add("view_count", product)
+                buffer.add("click_count", product)
+            self.assertEqual(self.counts("view_count")[product], 0)
+            self.assertEqual(buffer.flush(), 2)
+            self.assertEqual(buffer.flush(), 0)
+        finally:
+            buffer.stop()
+        product = Product.objects.get(pk=product)
+        self.assertEqual((product.view_count, product.click_count), (3, 1))
+        with self.assertRaises(ValueError):
+            buffer.add("sold_count", product.pk)
+
+    def test_failed_flush_is_kept(self):
+        buffer = counters.CounterBuffer()
+        product = self.products[0].pk
+        try:
+            buffer.add("view_count", product, n=2)
+            with mock.patch.object(counters, "write", side_effect=DatabaseError):
+                with self.assertLogs("shop.counters", "ERROR"):
+                    self.assertEqual(buffer.flush(), 0)
+            buffer.add("view_count", product)
+        finally:
+            buffer.stop()  # flushes the kept increments with the new one
+        self.assertEqual(self.counts("view_count")[product], 3)
+
+    @override_settings(COUNTER_FLUSH_SECONDS=0)
+    def test_popularity_increments_wait_for_commit(self):
+        product = self.products[0]
+        order = Order(product=product, quantity=3, final_price=Decimal(1497), payment_status="paid")
+        with self.captureOnCommitCallbacks(execute=True):
+            popularity.record_order_changes([(order, None)])
+            self.assertEqual(self.counts("bestseller_score")[product.pk], 0)
+        product.refresh_from_db()
+        self.assertEqual((product.trending_score, product.bestseller_score), (2.0, 3))
+
+    def test_gunicorn_worker_exit_flushes(self):
+        hooks = runpy.run_path(str(settings.BASE_DIR / "gunicorn.conf.py"))
+        with mock.patch.object(counters, "buffer") as buffer:
+            hooks["worker_exit"](server=None, worker=None)
+        buffer.stop.assert_called_once_with()
+
+    def test_admin_save_keeps_flushed_counts(self):
+        product = Product.objects.get(pk=self.products[0].pk)  # as the change form loaded it
+        Product.objects.filter(pk=product.pk).update(view_count=F("view_count") + 5)  # a flush meanwhile
+        product.name = "Kurti renamed"
+        form = mock.Mock(changed_data=["name"])
+        request = RequestFactory().post("/")
+        ProductAdmin(Product, admin.site).save_model(request, product, form, change=True)
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.view_count), ("Kurti renamed", 5))
+
+
+# -------------------- STOCK HOLDS --------------------
+class PaymentOutcomeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Stock Seller")
+        cls.product = Product.objects.create(name="Lehenga", price=Decimal(999), size_m=True, seller=seller)
+
+    def setUp(self):
+        inventory.set_stock(self.product, "M", 5, shards=2)
+        inventory.decrement_stock(self.product.pk, "M", 2)
+        self.order = Order.objects.create(
+            product=self.product, quantity=2, size="M", final_price=Decimal(1998), order_id="ORDER:1"
+        )
+        inventory.reserve_stock([self.order], {(self.product.pk, "M")})
+
+    def expire(self):
+        inventory.expire_reservations(now=timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL + 1))
+
+    def status(self):
+        self.order.refresh_from_db()
+        return self.order.payment_status
+
+    def test_expiry_fails_pending_order_and_returns_units(self):
+        self.expire()
+        self.assertEqual(self.status(), "failed")
+        self.assertEqual(inventory.stock_level(self.product.pk, "M"), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expiry_returns_units_of_order_failed_earlier(self):
+        Order.objects.filter(pk=self.order.pk).update(payment_status="failed")  # bypassing fail_orders
+        self.expire()
+        self.assertEqual(inventory.stock_level(self.product.pk, "M"), 5)
+
+    def test_fail_orders_releases_hold(self):
+        inventory.fail_orders([self.order.pk])
+        self.assertEqual(self.status(), "failed")
+        self.assertEqual(inventory.stock_level(self.product.pk, "M"), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_payment_keeps_units(self):
+        paid, unfilled = inventory.pay_orders([self.order.pk])
+        self.assertEqual(([order.pk for order in paid], unfilled), ([self.order.pk], []))
+        self.expire()
+        self.assertEqual(self.status(), "paid")
+        self.assertEqual(inventory.stock_level(self.product.pk, "M"), 3)
+
+    def test_late_payment_takes_units_again(self):
+        self.expire()
+        inventory.pay_orders([self.order.pk])
+        self.assertEqual(self.status(), "paid")
+        self.assertEqual(inventory.stock_level(self.product.pk, "M"), 3)
+
+    def test_late_payment_after_sellout_stays_failed(self):
+        self.expire()
+        inventory.decrement_stock(self.product.pk, "M", 4)
+        with self.assertLogs("shop.inventory", "WARNING"):
+            paid, unfilled = inventory.pay_orders([self.order.pk])
+        self.assertEqual((paid, [order.pk for order in unfilled]), ([], [self.order.pk]))
+        self.assertEqual(self.status(), "failed")
+        self.assertEqual(inventory.stock_level(self.product.pk, "M"), 1)
+
+
+class StressStockTests(unittest.TestCase):
+    def test_concurrent_buyers_never_oversell(self):
+        # A process of its own: the buyers need a file database they can lock, which the command makes itself.
+        with tempfile.TemporaryDirectory() as scratch:
+            configured = Path(scratch) / "configured.sqlite3"
+            run = subprocess.run(
+                [sys.executable, "manage.py", "stress_stock", "--units=10", "--buyers=40", "--concurrency=8"],
+                cwd=settings.BASE_DIR,
+                env={**os.environ, "DATABASE_URL": f"sqlite:///{configured}", "SQLITE_PRODUCTION": "True"},
+                capture_output=True,
+                text=True,
+            )
+            self.assertEqual(run.returncode, 0, run.stderr)
+            self.assertIn("10 sold, 30 out of stock, 0 errors; 10 orders, 0 units left.", run.stdout)
+            self.assertFalse(configured.exists())
+
+
+# -------------------- ROLLUPS --------------------
+class RollupShardTests(TestCase):
+    def test_orders_spread_over_shards_and_reports_sum_them(self):
+        seller = Seller.objects.create(name="Rollup Seller")
+        product = Product.objects.create(name="Dupatta", price=Decimal(300), size_m=True, seller=seller)
+        orders = Order.objects.bulk_create(
+            Order(product=product, final_price=Decimal(300), order_id=f"ORDER:{i}", payment_status="paid")
+            for i in range(40)
+        )
+        for order in orders:
+            rollups.record_order_changes([(order, None)])
+        self.assertGreater(SalesRollup.objects.filter(period="day").count(), 1)
+        start, end = rollups.date_range({})
+        totals = rollups.sales_totals(start, end)
+        self.assertEqual((totals["orders"], totals["paid_orders"], totals["revenue"]), (40, 40, Decimal("12000.00")))
+        [row] = rollups.sales_report(start, end, "day", "product")
+        self.assertEqual((row["product_id"], row["orders"]), (product.pk, 40))
+
+
+@override_settings(COUNTER_FLUSH_SECONDS=0)
+class PopularityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Popular Seller")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Saree {i}", price=Decimal(799), size_m=True, seller=seller) for i in range(3)
+        )
+
+    def place(self, product, quantity=1):
+        order = Order.objects.create(
+            product=product, quantity=quantity, final_price=Decimal(799) * quantity, order_id=f"ORDER:{product.pk}"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            rollups.record_order_changes([(order, None)])
+        return order
+
+    def set_status(self, order, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            rollups.change_order_status([order.pk], status)
+
+    def ranking(self, ordering):
+        response = self.client.get(reverse("product-list"), {"ordering": ordering})
+        return [row["id"] for row in response.json()["results"]]
+
+    def scores(self, field):
+        return dict(Product.objects.values_list("pk", field))
+
+    def test_paid_orders_count_double_and_reversals_give_units_back(self):
+        placed, paid, reversed_ = self.products
+        self.place(placed, quantity=5)
+        self.set_status(self.place(paid, quantity=2), "paid")
+        order = self.place(reversed_, quantity=4)
+        self.set_status(order, "paid")
+        self.assertEqual(self.scores("bestseller_score"), {placed.pk: 0, paid.pk: 2, reversed_.pk: 4})
+        self.set_status(order, "failed")
+
+        for _ in range(2):  # as incremented, then as compacted from the rollups
+            self.assertEqual(self.scores("bestseller_score"), {placed.pk: 0, paid.pk: 2, reversed_.pk: 0})
+            trending = self.scores("trending_score")
+            self.assertAlmostEqual(trending[paid.pk], 2 * trending[placed.pk])
+            self.assertEqual(self.ranking("bestseller")[0], paid.pk)
+            ranking = self.ranking("trending")
+            self.assertLess(ranking.index(paid.pk), ranking.index(placed.pk))
+            popularity.compact()
+
+
+# -------------------- REPLICA ROUTING --------------------
+@mock.patch.object(routing, "replica_aliases", return_value=["replica_0"])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = routing.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias(self, request, view=ProductViewSet.as_view({"get": "list"})):
+        """Alias a read made by `view` would use, run through ReplicaReadMiddleware."""
+        seen = {}
+
+        def get_response(request):
+            request.resolver_match = resolve(request.path_info)
+            middleware.process_view(request, view, (), {})
+            seen["alias"] = self.router.db_for_read(Product)
+            return HttpResponse()
+
+        middleware = routing.ReplicaReadMiddleware(get_response)
+        middleware(request)
+        return seen["alias"]
+
+    def test_router(self, replicas):
+        self.assertEqual(self.router.db_for_read(Product), "default")
+        replica = routing.read_from_replica.set(True)
+        wrote = routing.wrote_to_primary.set(False)
+        try:
+            self.assertEqual(self.router.db_for_read(Product), "replica_0")
+            self.assertEqual(self.router.db_for_write(Product), "default")
+            self.assertEqual(self.router.db_for_read(Product), "default")  # read after write
+        finally:
+            routing.read_from_replica.reset(replica)
+            routing.wrote_to_primary.reset(wrote)
+        self.assertTrue(self.router.allow_migrate("default", "shop"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "shop"))
+
+    def test_replica_safe_reads(self, replicas):
+        self.assertEqual(self.read_alias(self.factory.get("/api/products/")), "replica_0")
+        self.assertEqual(self.read_alias(self.factory.post("/api/products/")), "default")
+        orders = OrderViewSet.as_view({"get": "list"})
+        self.assertEqual(self.read_alias(self.factory.get("/api/orders/"), view=orders), "default")
+
+    def write_response(self, status):
+        """A view that writes to the primary and answers with `status`."""
+        def view(request):
+            self.router.db_for_write(Product)
+            return HttpResponse(status=status)
+        return view
+
+    def test_writes_pin_reads_to_primary(self, replicas):
+        response = routing.ReplicaReadMiddleware(self.write_response(201))(self.factory.post("/"))
+        self.assertIn(routing.STICKY_COOKIE, response.cookies)
+        until = float(response[routing.STICKY_HEADER])
+        self.assertAlmostEqual(until, time.time() + settings.REPLICA_STICKY_SECONDS, delta=2)
+
+        pinned = self.factory.get("/api/products/")
+        pinned.COOKIES[routing.STICKY_COOKIE] = "1"
+        self.assertEqual(self.read_alias(pinned), "default")
+        header = {"HTTP_X_DB_PRIMARY_UNTIL": str(until)}
+        self.assertEqual(self.read_alias(self.factory.get("/api/products/", **header)), "default")
+        with mock.patch.object(routing.time, "time", return_value=until + 1):  # the window has passed
+            self.assertEqual(self.read_alias(self.factory.get("/api/products/", **header)), "replica_0")
+        garbage = {"HTTP_X_DB_PRIMARY_UNTIL": "soon"}
+        self.assertEqual(self.read_alias(self.factory.get("/api/products/", **garbage)), "replica_0")
+
+    def test_failed_writes_dont_pin(self, replicas):
+        response = routing.ReplicaReadMiddleware(self.write_response(400))(self.factory.post("/"))
+        self.assertNotIn(routing.STICKY_COOKIE, response.cookies)
+        self.assertFalse(response.has_header(routing.STICKY_HEADER))
+
+    @override_settings(COUNTER_FLUSH_SECONDS=60)
+    def test_buffered_click_doesnt_pin(self, replicas):
+        seller = Seller.objects.create(name="Clicks")
+        product = Product.objects.create(name="Dupatta", price=Decimal(300), seller=seller)
+        with mock.patch.object(counters.buffer, "add") as add:
+            response = self.client.post(reverse("product-click", args=[product.pk]))
+        self.assertEqual(response.status_code, 204)
+        add.assert_called_once_with("click_count", product.pk)
+        self.assertNotIn(routing.STICKY_COOKIE, response.cookies)
+        self.assertFalse(response.has_header(routing.STICKY_HEADER))
+
+
+# -------------------- ORDER API --------------------
+class OrderApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Order Seller")
+        cls.product = Product.objects.create(name="Kurta", price=Decimal(800), discount=25, size_m=True, seller=seller)
+
+    def test_create_ignores_client_status_and_price(self):
+        response = self.client.post(
+            reverse("order-list"),
+            {"product_id": self.product.pk, "size": "M", "quantity": 2, "payment_status": "paid", "final_price": "1"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((order.payment_status, order.final_price), ("pending", Decimal("1200.00")))
+
+    def test_create_rejects_zero_quantity(self):
+        response = self.client.post(
+            reverse("order-list"),
+            {"product_id": self.product.pk, "size": "M", "quantity": 0},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quantity", response.json())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(SalesRollup.objects.exists())
+
+    def test_orders_cannot_be_changed_or_deleted(self):
+        order = Order.objects.create(product=self.product, size="M", final_price=Decimal(600), order_id="ORDER:1")
+        url = reverse("order-detail", args=[order.pk])
+        for method in (self.client.put, self.client.patch, self.client.delete):
+            with self.subTest(method=method.__name__):
+                response = method(url, {"payment_status": "paid"}, content_type="application/json")
+                self.assertEqual(response.status_code, 405)
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, "pending")
+
+
+# -------------------- PROFILING --------------------
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Profiled Seller")
+        Product.objects.create(name="Saree", price=Decimal(900), seller=seller)
+
+    def setUp(self):
+        self.report_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.report_dir.cleanup)
+        self.settings = override_settings(PROFILE_REPORT_DIR=self.report_dir.name, SLOW_REQUEST_MS=1000)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_unsampled_request_is_not_recorded(self):
+        with override_settings(SLOW_REQUEST_SQL_SAMPLE_RATE=0), mock.patch.object(
+            profiling.SQLRecorder, "__call__"
+        ) as recorded, mock.patch.object(profiling.Profile, "__init__") as profiled:
+            response = self.client.get(reverse("product-list"))
+        self.assertEqual(response.status_code, 200)
+        recorded.assert_not_called()
+        profiled.assert_not_called()
+        self.assertNotIn("X-Profile-Id", response)
+
+    def test_slow_request_logs_sampled_sql(self):
+        with override_settings(SLOW_REQUEST_MS=1, SLOW_REQUEST_SQL_SAMPLE_RATE=1), mock.patch.object(
+            time, "perf_counter", side_effect=itertools.count()
+        ), self.assertLogs("backend.slow_requests", "WARNING") as logs:
+            self.client.get(reverse("product-list"))
+        self.assertIn('"count": ', logs.output[0])
+
+    def test_profiled_request_writes_report_and_removes_old_ones(self):
+        old = os.path.join(self.report_dir.name, "old.json")
+        with open(old, "w") as file:
+            file.write("{}")
+        os.utime(old, (0, 0))
+        response = self.client.get(reverse("product-list"), HTTP_X_PROFILE_TOKEN=profiling.make_token())
+        report_id = response["X-Profile-Id"]
+        self.assertEqual(os.listdir(self.report_dir.name), [f"{report_id}.json"])
+        with open(os.path.join(self.report_dir.name, f"{report_id}.json")) as file:
+            report = json.load(file)
+        self.assertGreater(report["sql"]["count"], 0)
+        self.assertGreater(report["timing_ms"]["serializer"], 0)
+
+
+# -------------------- METRICS --------------------
+@override_settings(METRICS_TOKEN="scrape-secret", METRICS_ALLOWED_IPS=["10.0.0.0/8"])
+class MetricsAccessTests(TestCase):
+    def test_scrapers_need_an_allowed_address_or_the_token(self):
+        url = reverse("metrics")
+        cases = [
+            ({}, 403),
+            ({"REMOTE_ADDR": "10.1.2.3"}, 200),
+            ({"HTTP_AUTHORIZATION": "Bearer scrape-secret"}, 200),
+            ({"HTTP_AUTHORIZATION": "Bearer wrong"}, 403),
+            ({"REMOTE_ADDR": "not-an-address"}, 403),
+        ]
+        for extra, status_code in cases:
+            with self.subTest(extra=extra):
+                self.assertEqual(self.client.get(url, **extra).status_code, status_code)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_empty_token_never_matches(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, 403)
+
+
+# -------------------- ASYNC STACK --------------------
+class AsyncStackTests(TestCase):
+    def test_no_middleware_switches_an_async_request_to_sync(self):
+        # Django logs each adaptation at DEBUG when DEBUG is on.
+        with override_settings(DEBUG=True), self.assertNoLogs("django.request", "DEBUG"):
+            ASGIHandler()
+
+    def queries_recorded(self, view):
+        return metrics.REGISTRY.get_sample_value("db_queries_per_request_sum", {"view": view}) or 0
+
+    async def test_payment_views_through_the_async_stack(self):
+        await UPIConfig.objects.acreate(upi_id="merchant@upi", is_active=True)
+        response = await self.async_client.get(reverse("get_active_upi"))
+        self.assertEqual((response.status_code, response.json()["upi_id"]), (200, "merchant@upi"))
+        self.assertNotIn(routing.STICKY_HEADER, response)  # a read doesn't pin
+
+        seller = await Seller.objects.acreate(name="Async Seller")
+        product = await Product.objects.acreate(name="Kurta", price=Decimal(800), seller=seller)
+        order = await Order.objects.acreate(product=product, final_price=Decimal(800), order_id="ORDER:ASYNC")
+        await Transaction.objects.acreate(
+            order=order, product_name="Kurta", amount=Decimal(800), payment_method="GPay", transaction_id="TID424242"
+        )
+        queries = self.queries_recorded("verify_transaction")
+        response = await self.async_client.post(
+            reverse("verify_transaction", args=["TID424242"]), {"status": "success"}, content_type="application/json"
+        )
+        self.assertEqual((response.status_code, response.json()["transaction"]["status"]), (200, "success"))
+        await order.arefresh_from_db()
+        self.assertEqual(order.payment_status, "paid")
+        # The middlewares saw the view's writes and queries, made on the async ORM's thread.
+        self.assertIn(routing.STICKY_HEADER, response)
+        self.assertGreater(self.queries_recorded("verify_transaction"), queries)
+
+    async def test_profiling_an_async_view(self):
+        await UPIConfig.objects.acreate(upi_id="merchant@upi", is_active=True)
+        report_dir = self.enterContext(tempfile.TemporaryDirectory())
+        with override_settings(PROFILE_REPORT_DIR=report_dir):
+            response = await self.async_client.get(
+                reverse("get_active_upi"), headers={profiling.TOKEN_HEADER: profiling.make_token()}
+            )
+        report = json.loads(Path(report_dir, f"{response['X-Profile-Id']}.json").read_text())
+        self.assertEqual(report["sql"]["count"], 1)
+
+
+class PaymentStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Stream Seller")
+        product = Product.objects.create(name="Kurta", price=Decimal(800), seller=seller)
+        order = Order.objects.create(product=product, final_price=Decimal(800), order_id="ORDER:SSE")
+        Transaction.objects.create(
+            order=order, product_name="Kurta", amount=Decimal(800), payment_method="GPay", transaction_id="TID777"
+        )
+
+    async def stream(self, transaction_id="TID777"):
+        response = await self.async_client.get(reverse("transaction_status_stream", args=[transaction_id]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return aiter(response.streaming_content)
+
+    def event(self, chunk):
+        event, data = chunk.decode().split("\n")[:2]
+        return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))["status"]
+
+    async def test_verified_status_is_pushed_and_ends_the_stream(self):
+        events = await self.stream()
+        self.assertEqual(self.event(await anext(events)), ("status", "pending"))
+        await self.async_client.post(
+            reverse("verify_transaction", args=["TID777"]), {"status": "success"}, content_type="application/json"
+        )
+        self.assertEqual(self.event(await anext(events)), ("status", "success"))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    @override_settings(SSE_HEARTBEAT_SECONDS=0.01)
+    async def test_heartbeat_picks_up_changes_made_elsewhere(self):
+        events = await self.stream()
+        await anext(events)
+        self.assertEqual(await anext(events), b": heartbeat\n\n")
+        await Transaction.objects.filter(transaction_id="TID777").aupdate(status="failed")  # e.g. another worker
+        self.assertEqual(self.event(await anext(events)), ("status", "failed"))
+
+    @override_settings(SSE_HEARTBEAT_SECONDS=0.01, SSE_TIMEOUT_SECONDS=0.05)
+    async def test_stream_times_out(self):
+        chunks = [chunk async for chunk in await self.stream()]
+        self.assertEqual(self.event(chunks[-1]), ("timeout", "pending"))
+
+    async def test_settled_or_unknown_transactions(self):
+        await Transaction.objects.filter(transaction_id="TID777").aupdate(status="success")
+        self.assertEqual([self.event(chunk) async for chunk in await self.stream()], [("status", "success")])
+        response = await self.async_client.get(reverse("transaction_status_stream", args=["TID000"]))
+        self.assertEqual(response.status_code, 404)
+
+
+# -------------------- EXPORTS --------------------
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user("finance", password="pw", is_staff=True)
+        product = Product.objects.create(name="Kurti", price=Decimal(499), seller=Seller.objects.create(name="Exports"))
+        noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        for i, (status, days_ago) in enumerate([("paid", 0), ("failed", 0), ("paid", 1), ("paid", 3)]):
+            order = Order.objects.create(
+                product=product, final_price=Decimal(499), order_id=f"ORDER:{i}", payment_status=status
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=noon - timedelta(days=days_ago, minutes=i))
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def export(self, dataset="orders", **params):
+        return self.client.get(reverse("export_data", args=[dataset]), params)
+
+    def test_csv_filtered_by_dates_and_status_oldest_first(self):
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        with mock.patch("shop.exports.BLOCK_SIZE", 100):
+            response = self.export(status="paid", **{"from": since})
+            blocks = list(response.streaming_content)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertGreater(len(blocks), 1)
+        rows = list(csv.reader(io.StringIO(b"".join(blocks).decode())))
+        self.assertEqual(rows[0][:3], ["order_id", "product_id", "product_name"])
+        self.assertEqual([row[0] for row in rows[1:]], ["ORDER:2", "ORDER:0"])
+
+    def test_jsonl_rows(self):
+        response = self.export(format="jsonl", status="failed")
+        [row] = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual((row["order_id"], row["product_name"], row["final_price"]), ("ORDER:1", "Kurti", "499.00"))
+
+    async def test_streamed_to_async_requests(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse("export_data", args=["orders"]))
+        body = b"".join([block async for block in response.streaming_content])
+        self.assertEqual(body.decode().count("ORDER:"), 4)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.export(status="refunded").status_code, 400)
+        self.assertEqual(self.export(format="xlsx").status_code, 400)
+        self.assertEqual(self.export(**{"from": "yesterday"}).status_code, 400)
+        self.assertEqual(self.export("users").status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.export().status_code, 302)  # to the admin login
+
+
+# -------------------- CHANGELIST COUNTS --------------------
+@unittest.skipUnless(connection.vendor == "sqlite", "Checks SQLite's row estimates")
+class RowEstimateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sellers = Seller.objects.bulk_create(Seller(name=f"Estimate {i}", key=f"estimate {i}") for i in range(5))
+
+    def test_estimate_before_and_after_analyze(self):
+        Seller.objects.filter(pk=self.sellers[0].pk).delete()
+        self.assertEqual(changelists.estimated_row_count(Seller, "default"), self.sellers[-1].pk)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.assertEqual(changelists.estimated_row_count(Seller, "default"), 4)
+
+    def test_paginator_counts_exactly_only_below_the_threshold(self):
+        Seller.objects.filter(pk=self.sellers[0].pk).delete()
+        for threshold, count, estimated in ((100, 4, False), (1, self.sellers[-1].pk, True)):
+            with self.subTest(threshold=threshold), mock.patch.object(changelists, "EXACT_COUNT_BELOW", threshold):
+                paginator = changelists.EstimatedCountPaginator(Seller.objects.order_by("pk"), 10)
+                with self.assertNumQueries(2 if estimated else 3):
+                    self.assertEqual(paginator.count, count)
+                self.assertEqual(paginator.estimated, estimated)
+
+
+# -------------------- SEEDING --------------------
+class SeedShopTests(TestCase):
+    def test_seeding_rebuilds_rollups_scores_and_seller_counts(self):
+        call_command("seed_shop", products=20, reviews=40, orders=200, days=10, stdout=io.StringIO())
+        paid = Order.objects.filter(payment_status="paid")
+        daily = SalesRollup.objects.filter(period="day")
+        self.assertEqual(daily.aggregate(n=Sum("paid_orders"))["n"], paid.count())
+        self.assertEqual(daily.aggregate(n=Sum("revenue"))["n"], paid.aggregate(n=Sum("final_price"))["n"])
+        self.assertTrue(Product.objects.filter(bestseller_score__gt=0).exists())
+        self.assertEqual(
+            sum(Seller.objects.values_list("product_count", flat=True)), Product.objects.count()
+        )
+
+    def test_reviewed_products_are_logged_once_after_the_reviews(self):
+        call_command("seed_shop", products=20, reviews=300, orders=0, batch_size=50, days=10, stdout=io.StringIO())
+        reviewed = set(ProductReview.objects.values_list("product_id", flat=True))
+        after_products = ProductChange.objects.order_by("pk")[Product.objects.count():]
+        logged = list(after_products.values_list("product_id", flat=True))
+        self.assertEqual(sorted(logged), sorted(reviewed))
+
+
+# -------------------- IDEMPOTENCY --------------------
+class IdempotencyLeaseTests(TestCase):
+    def test_live_claim_conflicts_and_stale_claim_is_taken_over(self):
+        first, created = idempotency.claim_key("orders", "key-1", "hash-a")
+        self.assertTrue(created)
+        record, created = idempotency.claim_key("orders", "key-1", "hash-a")
+        self.assertFalse(created)
+        self.assertEqual(record.pk, first.pk)
+
+        IdempotencyKey.objects.filter(pk=first.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        retry, created = idempotency.claim_key("orders", "key-1", "hash-b")
+        self.assertTrue(created)
+        self.assertEqual((retry.pk, retry.request_hash), (first.pk, "hash-b"))
+        self.assertGreater(retry.locked_until, timezone.now())
+
+        # The presumed-dead first request finishing late touches nothing.
+        idempotency.store_response(first, HttpResponse('{"late": true}', status=201))
+        idempotency.release_key(first)
+        idempotency.store_response(retry, HttpResponse('{"ok": true}', status=201))
+        stored = IdempotencyKey.objects.get()
+        self.assertEqual((stored.status_code, stored.response, stored.locked_until), (201, {"ok": True}, None))
+
+    def test_answered_key_is_never_taken_over(self):
+        record, _ = idempotency.claim_key("orders", "key-2", "hash-a")
+        idempotency.store_response(record, HttpResponse("{}", status=201))
+        _, created = idempotency.claim_key("orders", "key-2", "hash-a")
+        self.assertFalse(created)
+
+
+# -------------------- PRICE ORDERING --------------------
+class ProductPriceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Price Seller")
+        prices = [(Decimal("499.99"), 20)] * 6 + [(Decimal("100"), 0), (Decimal("1000"), 50), (Decimal("50"), 10)]
+        cls.products = [
+            Product.objects.create(name=f"Priced {i}", price=price, discount=discount, seller=seller)
+            for i, (price, discount) in enumerate(prices)
+        ]
+
+    def walk(self, **params):
+        """Ids of every page of the price-ordered list, following `next` links."""
+        ids, url = [], reverse("product-list")
+        params = {"page_size": 2, **params}
+        for _ in range(len(self.products)):
+            data = self.client.get(url, params).json()
+            ids += [row["id"] for row in data["results"]]
+            if not data["next"]:
+                return ids
+            url, params = data["next"], {}
+        self.fail(f"Pages never ended: {ids}")
+
+    def test_pages_cover_tied_prices_once(self):
+        by_price = sorted(self.products, key=lambda p: (p.selling_price, p.pk))
+        self.assertEqual(self.walk(ordering="price"), [p.pk for p in by_price])
+        by_price.reverse()
+        self.assertEqual(self.walk(ordering="-price"), [p.pk for p in by_price])
+
+    def test_stored_price_is_the_rounded_selling_price(self):
+        for product in Product.objects.all():
+            self.assertEqual(product.effective_price, product.selling_price)
+
+    def test_price_range(self):
+        cases = [
+            ({"min_price": "399.99"}, {p.pk for p in self.products[:6]} | {self.products[7].pk}),
+            ({"max_price": "399.99"}, {p.pk for p in self.products[:7]} | {self.products[8].pk}),
+            ({"min_price": "45", "max_price": "100"}, {self.products[6].pk, self.products[8].pk}),
+            ({"min_price": "500.01"}, set()),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("product-list"), params)
+                self.assertEqual({row["id"] for row in response.json()}, expected)
+        for bad in ("-1", "cheap", "NaN"):
+            with self.subTest(min_price=bad):
+                self.assertEqual(self.client.get(reverse("product-list"), {"min_price": bad}).status_code, 400)
+
+
+# -------------------- CHANGE FEED --------------------
+class ChangeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = Seller.objects.create(name="Feed Seller")
+
+    def settle(self):
+        ProductChange.objects.update(changed_at=timezone.now() - changefeed.SETTLE)
+
+    def logged(self):
+        """(product_id, deleted) of every change logged since the last call."""
+        rows = list(ProductChange.objects.values_list("product_id", "deleted"))
+        ProductChange.objects.all().delete()
+        return rows
+
+    def test_every_write_path_is_logged(self):
+        product = Product.objects.create(name="Lehenga", price=Decimal(2000), seller=self.seller)
+        other = Product.objects.create(name="Choli", price=Decimal(700), seller=self.seller)
+        self.assertEqual(self.logged(), [(product.pk, False), (other.pk, False)])
+
+        Product.objects.filter(pk=product.pk).update(discount=10)
+        self.assertEqual(self.logged(), [(product.pk, False)])
+        Product.objects.filter(pk=product.pk).update(view_count=F("view_count") + 1)  # not shown to clients
+        self.assertEqual(self.logged(), [])
+
+        review = ProductReview.objects.create(product=product, reviewer_name="Asha", rating=4)
+        self.assertEqual(self.logged(), [(product.pk, False)])
+        review.product = other
+        review.save()
+        self.assertEqual(sorted(self.logged()), [(product.pk, False), (other.pk, False)])
+
+        self.seller.name = "Feed Seller Renamed"
+        self.seller.save()
+        self.assertEqual(sorted(self.logged()), [(product.pk, False), (other.pk, False)])
+
+        other_id = other.pk
+        other.delete()  # cascades to the review
+        self.assertEqual(self.logged(), [(other_id, False), (other_id, True)])
+
+    def test_tombstones_and_paging(self):
+        products = [Product.objects.create(name=f"Feed {i}", price=Decimal(100), seller=self.seller) for i in range(5)]
+        ids = [product.pk for product in products]
+        products[1].delete()
+        self.settle()
+        url = reverse("product-changes")
+
+        with mock.patch.object(changefeed, "read", functools.partial(changefeed.read, limit=4)):
+            first = self.client.get(url, {"since": "0"}).json()
+            self.assertTrue(first["more"])
+            self.assertEqual(sorted(p["id"] for p in first["products"]), [ids[0], ids[2], ids[3]])
+            self.assertEqual(first["deleted"], [ids[1]])
+            second = self.client.get(url, {"since": first["token"]}).json()
+        self.assertFalse(second["more"])
+        self.assertEqual([p["id"] for p in second["products"]], [ids[4]])
+
+        # Nothing new: the same token comes back. Changes still settling wait for the next call.
+        products[0].delete()
+        idle = self.client.get(url, {"since": second["token"]}).json()
+        self.assertEqual((idle["token"], idle["products"], idle["deleted"]), (second["token"], [], []))
+        self.settle()
+        later = self.client.get(url, {"since": second["token"]}).json()
+        self.assertEqual(later["deleted"], [ids[0]])
+
+    def test_bad_tokens(self):
+        for since in ("-1", "abc", "1.5"):
+            with self.subTest(since=since):
+                self.assertEqual(self.client.get(reverse("product-changes"), {"since": since}).status_code, 400)
+        # A token from before compaction still replays every tombstone.
+        product = Product.objects.create(name="Gone", price=Decimal(100), seller=self.seller)
+        product_id = product.pk
+        product.delete()
+        self.settle()
+        changefeed.compact()
+        self.assertEqual(ProductChange.objects.count(), 1)
+        data = self.client.get(reverse("product-changes"), {"since": "0"}).json()
+        self.assertEqual((data["products"], data["deleted"]), ([], [product_id]))
+
+
+# -------------------- SIMILAR PRODUCTS --------------------
+class SimilarProductsTests(TestCase):
+    LOOK = {
+        "occasion": "Festive",
+        "color": "Red",
+        "fabric": "Silk",
+        "pattern": "Printed",
+        "fit_shape": "Regular",
+        "sleeve_length": "Long Sleeves",
+    }
+    OTHER_LOOK = {
+        "occasion": "Office",
+        "color": "Navy",
+        "fabric": "Rayon",
+        "pattern": "Solid",
+        "fit_shape": "Straight",
+        "sleeve_length": "Sleeveless",
+    }
+    UNRELATED_LOOK = {
+        "occasion": "Daily",
+        "color": "Green",
+        "fabric": "Chiffon",
+        "pattern": "Woven Design",
+        "fit_shape": "Flared",
+        "sleeve_length": "Short Sleeves",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Look Seller")
+        elsewhere = Seller.objects.create(name="Other Seller")
+
+        def product(name, price=1000, seller=seller, **look):
+            return Product.objects.create(name=name, price=Decimal(price), seller=seller, **look)
+
+        cls.base = product("Base", **cls.LOOK)
+        cls.twin = product("Twin", **{**cls.LOOK, "color": " red "})  # values compare normalized
+        cls.close = product("Close", **{**cls.OTHER_LOOK, "occasion": "Festive", "color": "Red", "fabric": "Silk"})
+        cls.far = product("Far", **{**cls.OTHER_LOOK, "occasion": "Festive"})
+        cls.unrelated = product("Unrelated", price=90000, seller=elsewhere, **cls.UNRELATED_LOOK)
+
+    def similar(self, product):
+        return self.client.get(reverse("product-similar", args=[product.pk])).json()
+
+    def listed(self, product):
+        return [row["id"] for row in self.similar(product)]
+
+    def test_neighbours_best_first_without_self(self):
+        self.assertEqual(similarity.compute_all(), 5)
+        rows = self.similar(self.base)
+        self.assertEqual([row["id"] for row in rows], [self.twin.pk, self.close.pk, self.far.pk])
+        self.assertEqual(rows[0]["score"], 1.0)
+        self.assertEqual([row["score"] for row in rows], sorted((row["score"] for row in rows), reverse=True))
+        # Nothing in common with anything: no neighbours, and on nobody's list.
+        self.assertEqual(self.listed(self.unrelated), [])
+        with mock.patch.object(similarity, "TOP_K", 2):
+            similarity.compute_all()
+        self.assertEqual(self.listed(self.base), [self.twin.pk, self.close.pk])
+
+    def test_queued_refresh_after_a_change(self):
+        similarity.compute_all()
+        Product.objects.filter(pk=self.far.pk).update(**self.LOOK)
+        similarity.queue_refresh([self.far.pk])
+        self.assertEqual(similarity.refresh_queued(), (1, 4))
+        # Equal scores go to the lower id.
+        self.assertEqual(self.listed(self.base), [self.twin.pk, self.far.pk, self.close.pk])
+        self.assertEqual(self.listed(self.far), [self.base.pk, self.twin.pk, self.close.pk])
+        self.assertEqual(similarity.refresh_queued(), (0, 0))
+
+    def test_worker_reads_changed_products_from_the_feed(self):
+        similarity.compute_all()
+        ProductChange.objects.update(changed_at=timezone.now() - changefeed.SETTLE)
+        catalog = similarity.Catalog.load()
+
+        # Edited outside the admin (not queued), and a new product.
+        Product.objects.filter(pk=self.twin.pk).update(
+            **self.UNRELATED_LOOK, price=Decimal(90000), seller=self.unrelated.seller
+        )
+        new = Product.objects.create(name="New", price=Decimal(1000), seller=self.base.seller, **self.LOOK)
+        ProductChange.objects.update(changed_at=timezone.now() - changefeed.SETTLE)
+        refreshed, _ = similarity.refresh_queued(catalog=catalog)
+        self.assertEqual(refreshed, 2)
+        self.assertEqual(self.listed(self.base), [new.pk, self.close.pk, self.far.pk])
+        self.assertEqual(self.listed(self.unrelated), [self.twin.pk])
+
+        new_id = new.pk
+        new.delete()
+        ProductChange.objects.update(changed_at=timezone.now() - changefeed.SETTLE)
+        similarity.refresh_queued(catalog=catalog)
+        self.assertNotIn(new_id, catalog.ids)
+
+
+# -------------------- SNAPSHOTS --------------------
+@override_settings(SNAPSHOT_BASE_URL="http://testserver", COUNTER_FLUSH_SECONDS=0)
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = Seller.objects.create(name="Snapshot Seller")
+        cls.products = [
+            Product.objects.create(name=f"Banarasi Saree {i}", price=Decimal(1200 + i), seller=seller) for i in range(6)
+        ]
+
+    def setUp(self):
+        self.root = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(SNAPSHOT_ROOT=str(self.root)))
+        snapshots.build()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, headers={"Accept": "application/json", **headers})
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_bare_list_is_served_as_the_view_renders_it(self):
+        url = reverse("product-list")
+        with self.assertNumQueries(0):
+            served, body = self.get(url)
+        self.assertIn("ETag", served)
+        self.assertEqual([row["id"] for row in json.loads(body)], [p.pk for p in reversed(self.products)])
+
+        # Missing from disk: the view answers, with the same bytes.
+        (self.root / snapshots.LIST_NAME).unlink()
+        rendered, view_body = self.get(url)
+        self.assertNotIn("ETag", rendered)
+        self.assertEqual(view_body, body)
+
+    def test_encoding_negotiation(self):
+        url = reverse("product-list")
+        _, identity = self.get(url)
+        for accept, encoding in [
+            ("gzip, deflate", "gzip"),
+            ("*", "gzip"),
+            ("gzip;q=0, deflate", None),
+            ("", None),
+        ]:
+            with self.subTest(accept=accept):
+                response, body = self.get(url, **{"Accept-Encoding": accept})
+                self.assertEqual(response.get("Content-Encoding"), encoding)
+                self.assertEqual(gzip.decompress(body) if encoding else body, identity)
+                self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_etag_revalidation(self):
+        product = self.products[0]
+        url = reverse("product-detail", args=[product.pk])
+        first, _ = self.get(url)
+        not_modified, body = self.get(url, **{"If-None-Match": first["ETag"]})
+        self.assertEqual((not_modified.status_code, body), (304, b""))
+        since = self.get(url, **{"If-Modified-Since": first["Last-Modified"]})[0]
+        self.assertEqual(since.status_code, 304)
+
+        product.name = "Kanjeevaram Saree"
+        product.save()
+        ProductChange.objects.update(changed_at=timezone.now() - changefeed.SETTLE)
+        os.utime(self.root / snapshots.product_name(product.pk), ns=(0, 0))  # the rewrite gets a later mtime
+        snapshots.refresh()
+        changed, body = self.get(url, **{"If-None-Match": first["ETag"]})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+        self.assertEqual(json.loads(body)["name"], "Kanjeevaram Saree")
+        listed = json.loads(self.get(reverse("product-list"))[1])
+        self.assertEqual(listed[-1]["name"], "Kanjeevaram Saree")
+
+    async def test_served_to_async_requests(self):
+        product = self.products[2]
+        response = await self.async_client.get(
+            reverse("product-detail", args=[product.pk]), headers={"Accept": "application/json"}
+        )
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(int(response["Content-Length"]), len(body))
+        self.assertEqual(json.loads(body)["id"], product.pk)
+        await product.arefresh_from_db()
+        self.assertEqual(product.view_count, 1)
+
+    def test_missing_detail_falls_through_to_the_view(self):
+        product = self.products[1]
+        url = reverse("product-detail", args=[product.pk])
+        snapshots.remove_document(self.root, snapshots.product_name(product.pk))
+        response, body = self.get(url, **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertEqual(json.loads(body)["id"], product.pk)
+        product.refresh_from_db()
+        self.assertEqual(product.view_count, 1)
+        # Pages and hosts the builder didn't write also reach the view.
+        self.assertNotIn("ETag", self.get(reverse("product-list") + "?ordering=price&min_price=1")[0])
+        self.assertNotIn("ETag", self.client.get(url, HTTP_HOST="other.example", HTTP_ACCEPT="application/json"))
+
+
+# -------------------- PRODUCT IMPORT --------------------
+class ProductImportTests(TestCase):
+    HEADER = "seller_sku,name,price,sold_by,sizes,color\n"
+
+    def run_import(self, text, **options):
+        return catalog_import.import_products(io.BytesIO((self.HEADER + text).encode()), **options)
+
+    def catalog(self):
+        return sorted(Product.objects.values_list("seller__name", "seller_sku", "name", "price", "size_m"))
+
+    def test_rows_are_upserted_on_seller_and_sku(self):
+        result = self.run_import(
+            "K1,Kurti,499,Ravi Textiles,S|M,Red\n"
+            "K2,Saree,999,Ravi Textiles,,Blue\n"
+            "K1,Kurti,599,Other Store,,Red\n"  # the same SKU at another seller is another product
+        )
+        self.assertEqual((result.created, result.updated, result.failed), (3, 0, 0))
+        result = self.run_import(
+            "K1,Kurti,549,Ravi Textiles,S|M,Red\n"
+            "K2,Saree,999,Ravi Textiles,,Blue\n"
+            "K3,Dupatta,199,Ravi Textiles,M,Pink\n"
+            "K3,Dupatta,249,Ravi Textiles,M,Pink\n",  # later row wins
+            batch_size=2,
+        )
+        self.assertEqual((result.rows, result.created, result.updated, result.unchanged), (4, 1, 1, 1))
+        self.assertEqual(
+            self.catalog(),
+            [
+                ("Other Store", "K1", "Kurti", Decimal(599), False),
+                ("Ravi Textiles", "K1", "Kurti", Decimal(549), True),
+                ("Ravi Textiles", "K2", "Saree", Decimal(999), False),
+                ("Ravi Textiles", "K3", "Dupatta", Decimal(249), True),
+            ],
+        )
+        self.assertEqual(Seller.objects.get(name="Ravi Textiles").product_count, 3)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        result = self.run_import(
+            "K1,Kurti,cheap,Ravi Textiles,,Red\n"
+            "K2,Saree,999,,,Blue\n"
+            ",Dupatta,199,Ravi Textiles,,Pink\n"
+            "K4,Lehenga,1999,Ravi Textiles,M,Gold\n"
+        )
+        self.assertEqual((result.created, result.failed), (1, 3))
+        self.assertEqual([line for line, _ in result.errors], [2, 3, 4])
+        self.assertIn("price", result.errors[0][1])
+        self.assertIn("sold_by", result.errors[1][1])
+        self.assertEqual(self.catalog(), [("Ravi Textiles", "K4", "Lehenga", Decimal(1999), True)])
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_admin_upload_is_imported_by_the_worker(self):
+        admin_user = get_user_model().objects.create_superuser("catalog", "catalog@example.com", "pw")
+        self.client.force_login(admin_user)
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        upload = io.BytesIO((self.HEADER + "K1,Kurti,499,,M,Red\n").encode())
+        upload.name = "catalog.csv"
+        response = self.client.post(
+            reverse("admin:shop_product_import"), {"file": upload, "default_seller": "Ravi Textiles"}
+        )
+        queued = ProductImport.objects.get()
+        status_page = reverse("admin:shop_productimport_change", args=[queued.pk])
+        self.assertRedirects(response, status_page)
+        self.assertEqual((queued.status, Product.objects.count()), ("queued", 0))  # not in the request
+
+        call_command("import_products", "--queued", stdout=io.StringIO())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, "done")
+        self.assertContains(self.client.get(status_page), "1 rows: 1 created, 0 updated, 0 unchanged, 0 failed")
+        self.assertEqual(self.catalog(), [("Ravi Textiles", "K1", "Kurti", Decimal(499), True)])
+        self.assertIsNone(catalog_import.run_queued())
+
+
+# -------------------- SELLERS --------------------
+class SellerTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = Seller.objects.create(name="First Store")
+        cls.second = Seller.objects.create(name="Second Store")
+
+    def totals(self):
+        rows = Seller.objects.order_by("pk").values_list("product_count", "review_count", "rating_total")
+        return [(products, reviews, float(rating)) for products, reviews, rating in rows]
+
+    def test_every_write_path_keeps_totals(self):
+        product = Product.objects.create(name="Anarkali", price=Decimal(900), seller=self.first)
+        other = Product.objects.create(name="Palazzo", price=Decimal(500), seller=self.first)
+        review = ProductReview.objects.create(product=product, reviewer_name="Asha", rating=Decimal("4.5"))
+        ProductReview.objects.create(product=other, reviewer_name="Meera", rating=3)
+        self.assertEqual(self.totals(), [(2, 2, 7.5), (0, 0, 0)])
+
+        review.rating = Decimal("2.0")
+        review.save()
+        self.assertEqual(self.totals(), [(2, 2, 5.0), (0, 0, 0)])
+        product.seller = self.second  # takes its review along
+        product.save()
+        self.assertEqual(self.totals(), [(1, 1, 3.0), (1, 1, 2.0)])
+        Product.objects.filter(pk=other.pk).update(seller=self.second)
+        self.assertEqual(self.totals(), [(0, 0, 0), (2, 2, 5.0)])
+        ProductReview.objects.filter(product=other).update(rating=5)
+        self.assertEqual(self.totals(), [(0, 0, 0), (2, 2, 7.0)])
+        review.product = other
+        review.save()
+        product.delete()
+        self.assertEqual(self.totals(), [(0, 0, 0), (1, 2, 7.0)])
+        other.delete()  # with both reviews
+        self.assertEqual(self.totals(), [(0, 0, 0), (0, 0, 0)])
+        self.assertEqual(sellers.recount(), 0)
+
+    def test_storefront_endpoints(self):
+        products = [Product.objects.create(name=f"Kurti {i}", price=Decimal(400), seller=self.second) for i in range(3)]
+        Product.objects.create(name="Elsewhere", price=Decimal(400), seller=self.first)
+        ProductReview.objects.create(product=products[0], reviewer_name="Asha", rating=4)
+        ProductReview.objects.create(product=products[1], reviewer_name="Meera", rating=5)
+
+        listing = self.client.get(reverse("seller-list")).json()
+        self.assertEqual([row["name"] for row in listing["results"]], ["Second Store", "First Store"])
+        detail = self.client.get(reverse("seller-detail", args=[self.second.pk])).json()
+        self.assertEqual(
+            (detail["product_count"], detail["review_count"], detail["average_rating"]), (3, 2, "4.50")
+        )
+        first = self.client.get(reverse("seller-products", args=[self.second.pk]), {"page_size": 2}).json()
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(
+            [row["id"] for row in first["results"] + second["results"]], [p.pk for p in reversed(products)]
+        )
+        self.assertIsNone(second["next"])
+        self.assertEqual(self.client.get(reverse("seller-products", args=[0])).status_code, 404)
+
+
+class DataMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def test_backfill_links_transactions_to_unclaimed_orders(self):
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        apps = self.migrate([("shop", "0009_transaction_order")])
+        Product, Order, Transaction = (apps.get_model("shop", name) for name in ("Product", "Order", "Transaction"))
+        kurti, saree = (Product.objects.create(name=name, price=499) for name in ("Kurti", "Saree"))
+        now = timezone.now()
+
+        def placed(minutes, **fields):
+            pk = Order.objects.create(**fields).pk
+            Order.objects.filter(pk=pk).update(created_at=now + timedelta(minutes=minutes))
+            return pk
+
+        def paid(minutes, **fields):
+            pk = Transaction.objects.create(payment_method="upi", **fields).pk
+            Transaction.objects.filter(pk=pk).update(transaction_time=now + timedelta(minutes=minutes))
+            return pk
+
+        older = placed(0, product=kurti, final_price=499, order_id="O1")
+        newer = placed(10, product=kurti, final_price=499, order_id="O2")
+        placed(0, product=saree, final_price=999, order_id="O3")
+        payments = [
+            paid(20, product_name="Kurti", amount=499),  # newest unclaimed order first
+            paid(20, product_name="Kurti", amount=499),  # then the older one
+            paid(-10, product_name="Kurti", amount=499),  # paid before any order
+            paid(20, product_name="Saree", amount=499),  # amount doesn't match
+            paid(20, product_name="Kurti", amount=499),  # nothing left to claim
+        ]
+
+        backfill = importlib.import_module("shop.migrations.0010_backfill_transaction_order")
+        with mock.patch.object(backfill, "BATCH_SIZE", 2):
+            apps = self.migrate([("shop", "0010_backfill_transaction_order")])
+        linked = dict(apps.get_model("shop", "Transaction").objects.values_list("pk", "order_id"))
+        self.assertEqual([linked[pk] for pk in payments], [newer, older, None, None, None])
+
+    def test_populate_sellers_merges_spellings_and_counts(self):
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        apps = self.migrate([("shop", "0021_seller")])
+        Product = apps.get_model("shop", "Product")
+        ProductReview = apps.get_model("shop", "ProductReview")
+        names = ["Ravi Textiles", "ravi  textiles", "Ravi Textiles", "", "Other"]
+        products = [
+            Product.objects.create(name=f"P{i}", price=100, sold_by=name, seller_sku="SKU1" if i < 2 else None)
+            for i, name in enumerate(names)
+        ]
+        ProductReview.objects.create(product=products[1], reviewer_name="A", rating=4)
+        ProductReview.objects.create(product=products[2], reviewer_name="B", rating=Decimal("2.5"))
+
+        apps = self.migrate([("shop", "0022_populate_sellers")])
+        Seller = apps.get_model("shop", "Seller")
+        Product = apps.get_model("shop", "Product")
+        self.assertEqual(
+            sorted(Seller.objects.values_list("name", "product_count", "review_count", "rating_total")),
+            [("Other", 1, 0, 0), ("Ravi Textiles", 3, 2, Decimal("6.5")), ("Unknown Seller", 1, 0, 0)],
+        )
+        ravi = Seller.objects.get(key="ravi textiles")
+        self.assertEqual(
+            list(Product.objects.filter(seller=ravi).order_by("pk").values_list("seller_sku", flat=True)),
+            ["SKU1", None, None],  # the younger duplicate SKU is dropped
+        )
+
+    def test_existing_orders_are_rolled_up(self):
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        apps = self.migrate([("shop", "0028_product_effective_price_rounded")])
+        Seller = apps.get_model("shop", "Seller")
+        product = apps.get_model("shop", "Product").objects.create(
+            name="P", price=100, seller=Seller.objects.create(name="S", key="s")
+        )
+        Order = apps.get_model("shop", "Order")
+        for i, status in enumerate(["paid", "paid", "failed", "pending"]):
+            Order.objects.create(product=product, quantity=2, final_price=50, order_id=f"O{i}", payment_status=status)
+        apps.get_model("shop", "Transaction").objects.create(
+            product_name="P", amount=50, payment_method="upi", status="success"
+        )
+
+        apps = self.migrate([("shop", "0029_backfill_sales_rollups")])
+        sales = apps.get_model("shop", "SalesRollup").objects.filter(period="day", product=product.pk)
+        self.assertEqual(
+            list(sales.values_list("orders", "paid_orders", "failed_orders", "units_sold", "revenue")),
+            [(4, 2, 1, 4, Decimal(100))],
+        )
+        payments = apps.get_model("shop", "PaymentRollup").objects.filter(period="hour")
+        self.assertEqual(list(payments.values_list("payment_method", "transactions", "successful")), [("upi", 1, 1)])
+
+    def test_existing_orders_are_scored(self):
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        apps = self.migrate([("shop", "0028_product_effective_price_rounded")])
+        seller = apps.get_model("shop", "Seller").objects.create(name="S", key="s")
+        Product = apps.get_model("shop", "Product")
+        sold, placed = (Product.objects.create(name=name, price=100, seller=seller) for name in ("Sold", "Placed"))
+        Order = apps.get_model("shop", "Order")
+        Order.objects.create(product=sold, quantity=3, final_price=300, order_id="O1", payment_status="paid")
+        Order.objects.create(product=placed, quantity=3, final_price=300, order_id="O2")
+
+        apps = self.migrate([("shop", "0030_backfill_popularity")])
+        scores = apps.get_model("shop", "Product").objects.order_by("-trending_score")
+        self.assertEqual(
+            [(name, bestseller, round(trending)) for name, bestseller, trending in scores.values_list(
+                "name", "bestseller_score", "trending_score"
+            )],
+            [("Sold", 3, 2), ("Placed", 0, 1)],
+        )
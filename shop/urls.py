@@ -6,9 +6,14 @@ from .views import (
     ProductViewSet,
     OrderViewSet,
     ProductReviewViewSet,   # ✅ Added for reviews
+    SellerViewSet,
     get_active_upi,
     create_transaction,
     generate_upi,
+    transaction_status_stream,
+    export_data,
+    sales_analytics,
+    payment_method_analytics,
 )
 
 # ✅ Router for all model viewsets
@@ -16,6 +21,7 @@ router = DefaultRouter()
 router.register(r"products", ProductViewSet)
 router.register(r"orders", OrderViewSet)
 router.register(r"reviews", ProductReviewViewSet)  # ✅ New review endpoint
+router.register(r"sellers", SellerViewSet)
 
 # ✅ Custom API endpoints
 urlpatterns = [
@@ -32,4 +38,18 @@ urlpatterns = [
 
     path("verify-transaction/<str:transaction_id>/", verify_transaction, name="verify_transaction"),
 
+    # 🔹 Stream payment status changes (Server-Sent Events, serve under ASGI)
+    path(
+        "transaction-status/<str:transaction_id>/stream/",
+        transaction_status_stream,
+        name="transaction_status_stream",
+    ),
+
+    # 🔹 Streaming CSV / JSONL export of orders or transactions (staff only)
+    path("exports/<str:dataset>/", export_data, name="export_data"),
+
+    # 🔹 Sales and payment-method analytics from the rollup tables (staff only)
+    path("analytics/sales/", sales_analytics, name="sales_analytics"),
+    path("analytics/payment-methods/", payment_method_analytics, name="payment_method_analytics"),
+
 ]
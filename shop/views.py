@@ -1,17 +1,45 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import api_view
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from urllib.parse import urlencode
+from django.db import transaction as db_transaction
+from django.db.models import prefetch_related_objects
 from django.utils import timezone
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from decimal import Decimal
+import asyncio
+import json
 import random
 
-from .models import Product, Order, Transaction, UPIConfig, ProductReview
+from . import changefeed, counters
+from .events import broker, publish_status, sse_message
+from .exports import DATASETS, FORMATS, ExportError, export_response, filtered_queryset
+from .idempotency import idempotent
+from .inventory import pay_orders
+from .models import Product, Order, Transaction, UPIConfig, ProductReview, Seller
+from .pagination import ScoreKeysetPagination
+from .rollups import (
+    RollupQueryError,
+    date_range,
+    payment_mix,
+    record_transaction_changes,
+    sales_report,
+    sales_totals,
+)
 from .serializers import (
     ProductSerializer,
     OrderSerializer,
+    CartCheckoutSerializer,
     TransactionSerializer,
     ProductReviewSerializer,
+    SimilarProductSerializer,
+    SellerSerializer,
 )
 
 
@@ -21,18 +49,168 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     Public API for listing and retrieving products.
     Includes nested reviews for each product.
     """
-    queryset = Product.objects.all().order_by("-id")
+    queryset = Product.objects.all().select_related("seller").order_by("-id")
     serializer_class = ProductSerializer
+    replica_reads = True  # GETs may be served from a read replica
+    orderings = {
+        "trending": "-trending_score",
+        "bestseller": "-bestseller_score",
+        "price": "effective_price",
+        "-price": "-effective_price",
+    }
+    price_filters = {"min_price": "effective_price__gte", "max_price": "effective_price__lte"}
+
+    def list(self, request, *args, **kwargs):
+        """
+        `?ordering=trending|bestseller` ranks by popularity (see shop.popularity)
+        and `?ordering=price|-price` by discounted price, a page at a time with
+        `next` cursor links; without it, the full list as before.
+        `?min_price=` / `?max_price=` keep products whose discounted price is in range.
+        """
+        queryset = self.get_queryset().prefetch_related("reviews")
+        for param, lookup in self.price_filters.items():
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                value = Decimal(value)
+                if not value.is_finite() or value < 0:
+                    raise ValueError
+            except (ArithmeticError, ValueError):
+                return Response(
+                    {"error": f"'{param}' must be a non-negative number."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = queryset.filter(**{lookup: value})
+
+        ordering = request.query_params.get("ordering")
+        if ordering is None:
+            return Response(self.get_serializer(queryset, many=True).data)
+        if ordering not in self.orderings:
+            return Response(
+                {"error": f"'ordering' must be one of: {', '.join(self.orderings)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        paginator = ScoreKeysetPagination(self.orderings[ordering])
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if request.method == "GET":  # (not HEAD)
+            counters.buffer.add("view_count", response.data["id"])  # buffered, see shop.counters
+        return response
+
+    @action(detail=True, methods=["post"])
+    def click(self, request, pk=None):
+        """Count a click on the product from a listing; buffered, so no database read or write here."""
+        if not pk.isdigit():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        counters.buffer.add("click_count", int(pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False)
+    def changes(self, request):
+        """
+        Products created, changed or deleted after `?since=<token>` (0 for the
+        whole catalog), oldest first; see shop.changefeed. Store `token` and
+        pass it as `since` next time; call again at once while `more` is true.
+        """
+        since = request.query_params.get("since", "0")
+        if not since.isdigit():
+            return Response(
+                {"error": "'since' must be a token from a previous response, or 0."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        token, more, changed, deleted = changefeed.read(int(since))
+        products = list(self.get_queryset().filter(pk__in=changed).prefetch_related("reviews"))
+        # Deleted since the change was logged; the tombstone follows.
+        deleted += sorted(set(changed) - {product.pk for product in products})
+        return Response(
+            {
+                "token": str(token),
+                "more": more,
+                "products": self.get_serializer(products, many=True).data,
+                "deleted": deleted,
+            }
+        )
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Precomputed most similar products, closest first (see `manage.py compute_similar`)."""
+        product = self.get_object()
+        neighbours = product.similar_products.select_related("similar__seller").order_by("rank")
+        return Response(SimilarProductSerializer(neighbours, many=True).data)
+
+
+# -------------------- SELLER --------------------
+class SellerViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Seller storefronts: the seller with its cached product count and rating
+    (see shop.sellers), and its products newest first, a page at a time.
+    """
+    queryset = Seller.objects.all()
+    serializer_class = SellerSerializer
+    replica_reads = True  # GETs may be served from a read replica
+
+    def list(self, request, *args, **kwargs):
+        """Sellers with the most products first, a page at a time."""
+        paginator = ScoreKeysetPagination("-product_count")
+        page = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=True)
+    def products(self, request, pk=None):
+        seller = self.get_object()
+        products = Product.objects.filter(seller=seller).select_related("seller").prefetch_related("reviews")
+        paginator = ScoreKeysetPagination("-id")
+        page = paginator.paginate_queryset(products, request, view=self)
+        return paginator.get_paginated_response(ProductSerializer(page, many=True, context={"request": request}).data)
 
 
 # -------------------- ORDER --------------------
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(
+    mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
     """
-    API for creating and viewing customer orders.
+    API for creating and viewing customer orders. There is no update or delete:
+    payment status, stock holds, rollups and popularity only move through
+    checkout, payment verification and the sweeper (see shop.inventory).
     """
-    queryset = Order.objects.all().select_related("product").order_by("-created_at")
+    queryset = (
+        Order.objects.all()
+        .select_related("product__seller")
+        .prefetch_related("product__reviews")  # nested in ProductSerializer
+        .order_by("-created_at")
+    )
     serializer_class = OrderSerializer
 
+    @idempotent("orders")
+    def create(self, request, *args, **kwargs):
+        """Create an order; retries with the same `Idempotency-Key` replay the first response."""
+        return super().create(request, *args, **kwargs)
+
+    @action(detail=False, methods=["post"])
+    @idempotent("orders-checkout")
+    def checkout(self, request):
+        """
+        Place every line of a cart in one request:
+        {"items": [{"product_id": 1, "size": "M", "quantity": 2}, ...]}.
+        Prices are computed on the server and all orders are created atomically.
+        """
+        serializer = CartCheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        orders = serializer.save()
+        prefetch_related_objects(orders, "product__reviews")
+        return Response(
+            {
+                "status": "success",
+                "total_amount": str(sum(order.final_price for order in orders)),
+                "orders": OrderSerializer(orders, many=True).data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
 
 # -------------------- PRODUCT REVIEW --------------------
 class ProductReviewViewSet(viewsets.ModelViewSet):
@@ -41,17 +219,72 @@ class ProductReviewViewSet(viewsets.ModelViewSet):
     """
     queryset = ProductReview.objects.all().select_related("product").order_by("-created_at")
     serializer_class = ProductReviewSerializer
+    replica_reads = True  # GETs may be served from a read replica
+
+    # Each write commits together with what shop.signals does for it: the
+    # seller's rating totals and the change feed entry of the product.
+    def perform_create(self, serializer):
+        with db_transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with db_transaction.atomic():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with db_transaction.atomic():
+            instance.delete()
+
+
+# -------------------- ASYNC PAYMENT VIEWS --------------------
+# The checkout endpoints below are native async views using Django's async ORM.
+# Under ASGI (uvicorn workers) they don't tie up a thread per connection; under
+# WSGI Django still runs them, one request per worker thread as before.
+
+def request_data(request):
+    """Parse a JSON or form-encoded request body (the formats the frontend sends)."""
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST
+
+
+@sync_to_async
+def open_transaction(**fields):
+    """Create a pending transaction and count it in the payment rollups."""
+    with db_transaction.atomic():
+        transaction = Transaction.objects.create(**fields)
+        record_transaction_changes([(transaction, None)])
+    return transaction
+
+
+@sync_to_async
+def settle_transaction(transaction, new_status):
+    """
+    Move a transaction to success/failed. A success marks its order paid and,
+    since the order keeps its units, drops the stock hold; a payment arriving
+    after the hold expired takes the units again (see inventory.pay_orders).
+    Returns False when another request changed the status in the meantime.
+    """
+    old_status = transaction.status
+    with db_transaction.atomic():
+        if not Transaction.objects.filter(pk=transaction.pk, status=old_status).update(status=new_status):
+            return False
+        transaction.status = new_status
+        record_transaction_changes([(transaction, old_status)])
+        if new_status == "success" and transaction.order_id:
+            pay_orders([transaction.order_id])
+    return True
 
 
 # -------------------- GET ACTIVE UPI --------------------
-@api_view(["GET"])
-def get_active_upi(request):
+@require_GET
+async def get_active_upi(request):
     """
     Fetch the currently active merchant UPI ID.
     """
-    active_upi = UPIConfig.objects.filter(is_active=True).first()
+    active_upi = await UPIConfig.objects.filter(is_active=True).afirst()
     if active_upi:
-        return Response(
+        return JsonResponse(
             {
                 "status": "success",
                 "upi_id": active_upi.upi_id,
@@ -59,26 +292,39 @@ def get_active_upi(request):
             },
             status=status.HTTP_200_OK,
         )
-    return Response(
+    return JsonResponse(
         {"status": "error", "message": "No active UPI found"},
         status=status.HTTP_404_NOT_FOUND,
     )
 
 
 # -------------------- CREATE TRANSACTION --------------------
-@api_view(["POST"])
-def create_transaction(request):
+@csrf_exempt
+@require_POST
+@idempotent("create-transaction")
+async def create_transaction(request):
     """
     Create a transaction record when the user initiates payment.
     Initially marked as 'pending'. The frontend will later verify the status.
+    Pass `order_id` to link the payment to its order for reconciliation.
     """
     try:
-        data = request.data
+        data = request_data(request)
         transaction_id = f"TID{random.randint(100000, 999999)}"
 
-        transaction = Transaction.objects.create(
+        order = None
+        if data.get("order_id"):
+            order = await Order.objects.filter(order_id=data["order_id"]).only("id").afirst()
+            if order is None:
+                return JsonResponse(
+                    {"status": "error", "message": "Order not found."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+        transaction = await open_transaction(
+            order=order,
             product_name=data.get("product_name", "Unknown Product"),
-            amount=float(data.get("amount", 0)),
+            amount=Decimal(str(data.get("amount", 0))),
             payment_method=data.get("payment_method", "Unknown"),
             transaction_id=transaction_id,
             status="pending",
@@ -86,7 +332,7 @@ def create_transaction(request):
         )
 
         serializer = TransactionSerializer(transaction)
-        return Response(
+        return JsonResponse(
             {
                 "status": "success",
                 "message": "Transaction created successfully (pending).",
@@ -95,34 +341,36 @@ def create_transaction(request):
             status=status.HTTP_201_CREATED,
         )
     except Exception as e:
-        return Response(
+        return JsonResponse(
             {"status": "error", "message": str(e)},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
 
 # -------------------- VERIFY TRANSACTION --------------------
-@api_view(["POST"])
-def verify_transaction(request, transaction_id):
+@csrf_exempt
+@require_POST
+async def verify_transaction(request, transaction_id):
     """
     Update a transaction's status to 'success' or 'failed'
     after payment confirmation.
     """
     try:
-        transaction = Transaction.objects.get(transaction_id=transaction_id)
-        new_status = request.data.get("status", "").lower()
+        transaction = await Transaction.objects.aget(transaction_id=transaction_id)
+        new_status = request_data(request).get("status", "").lower()
 
         if new_status not in ["success", "failed"]:
-            return Response(
+            return JsonResponse(
                 {"error": "Invalid status. Must be 'success' or 'failed'."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        transaction.status = new_status
-        transaction.save()
+        if not await settle_transaction(transaction, new_status):
+            await transaction.arefresh_from_db()  # another request settled it first
+        publish_status(transaction)
 
         serializer = TransactionSerializer(transaction)
-        return Response(
+        return JsonResponse(
             {
                 "status": "success",
                 "message": f"Transaction marked as {new_status}.",
@@ -132,33 +380,109 @@ def verify_transaction(request, transaction_id):
         )
 
     except Transaction.DoesNotExist:
-        return Response(
+        return JsonResponse(
             {"status": "error", "message": "Transaction not found."},
             status=status.HTTP_404_NOT_FOUND,
         )
     except Exception as e:
-        return Response(
+        return JsonResponse(
             {"status": "error", "message": str(e)},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
 
+# -------------------- TRANSACTION STATUS STREAM (SSE) --------------------
+FINAL_TRANSACTION_STATUSES = {"success", "failed"}
+
+
+async def transaction_status_stream(request, transaction_id):
+    """
+    Push status changes for a transaction as Server-Sent Events.
+    Replaces client polling: serve under ASGI so idle streams don't hold a worker.
+    """
+    exists = await Transaction.objects.filter(transaction_id=transaction_id).aexists()
+    if not exists:
+        return JsonResponse(
+            {"status": "error", "message": "Transaction not found."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    response = StreamingHttpResponse(
+        transaction_status_events(transaction_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def transaction_status_events(transaction_id):
+    """
+    Yield the current status, then every change published by `verify_transaction`.
+    Each heartbeat re-reads the status once, which also picks up changes committed
+    by other processes (e.g. bulk reconcilers).
+    """
+    queue = broker.subscribe(transaction_id)
+    try:
+        current = await current_transaction_status(transaction_id)
+        yield sse_message("status", {"transaction_id": transaction_id, "status": current})
+        if current in FINAL_TRANSACTION_STATUSES:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SSE_TIMEOUT_SECONDS
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                payload = await asyncio.wait_for(
+                    queue.get(), timeout=min(settings.SSE_HEARTBEAT_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                latest = await current_transaction_status(transaction_id)
+                if latest == current:
+                    yield ": heartbeat\n\n"
+                    continue
+                payload = {"transaction_id": transaction_id, "status": latest}
+
+            current = payload["status"]
+            yield sse_message("status", payload)
+            if current in FINAL_TRANSACTION_STATUSES:
+                return
+
+        yield sse_message("timeout", {"transaction_id": transaction_id, "status": current})
+    finally:
+        broker.unsubscribe(transaction_id, queue)
+
+
+async def current_transaction_status(transaction_id):
+    return await (
+        Transaction.objects.filter(transaction_id=transaction_id)
+        .values_list("status", flat=True)
+        .afirst()
+    )
+
+
 # -------------------- GENERATE UPI LINK --------------------
-@api_view(["GET"])
-def generate_upi(request, order_id):
+@require_GET
+async def generate_upi(request, order_id):
     """
     Generate a ready-to-use UPI deep link for a specific order.
     Returns PhonePe & Paytm formatted URLs.
     """
     try:
-        active_upi = UPIConfig.objects.filter(is_active=True).first()
+        active_upi = await UPIConfig.objects.filter(is_active=True).afirst()
         if not active_upi:
-            return Response(
+            return JsonResponse(
                 {"status": "error", "message": "No active UPI configured"},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        order = get_object_or_404(Order, order_id=order_id)
+        order = await Order.objects.filter(order_id=order_id).only("order_id", "final_price").afirst()
+        if order is None:
+            return JsonResponse(
+                {"status": "error", "message": "Order not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
         params = {
             "pa": active_upi.upi_id,
             "pn": "MerchantName",
@@ -168,7 +492,7 @@ def generate_upi(request, order_id):
         }
         base = urlencode(params)
 
-        return Response(
+        return JsonResponse(
             {
                 "status": "success",
                 "upi_params": params,
@@ -180,7 +504,74 @@ def generate_upi(request, order_id):
         )
 
     except Exception as e:
-        return Response(
+        return JsonResponse(
             {"status": "error", "message": str(e)},
             status=status.HTTP_400_BAD_REQUEST,
         )
+
+
+# -------------------- EXPORTS (staff only) --------------------
+@staff_member_required
+@require_GET
+def export_data(request, dataset):
+    """
+    Stream orders or transactions for finance.
+    Query params: `format` (csv | jsonl), `from` / `to` (YYYY-MM-DD, inclusive), `status`.
+    """
+    if dataset not in DATASETS:
+        return JsonResponse({"error": "Unknown export."}, status=status.HTTP_404_NOT_FOUND)
+    fmt = request.GET.get("format", "csv")
+    if fmt not in FORMATS:
+        return JsonResponse(
+            {"error": f"'format' must be one of: {', '.join(FORMATS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        queryset = filtered_queryset(dataset, request.GET)
+    except ExportError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return export_response(request, queryset, dataset, fmt)
+
+
+# -------------------- ANALYTICS (staff only) --------------------
+@staff_member_required
+@require_GET
+def sales_analytics(request):
+    """
+    Revenue, orders and conversion from the rollup tables.
+    Query params: `from` / `to` (YYYY-MM-DD, default last 30 days), `period` (day | hour),
+    `group` (total | product | seller), `limit` (rows for product/seller, default 100).
+    """
+    try:
+        start, end = date_range(request.GET)
+        limit = int(request.GET.get("limit", 100))
+        rows = sales_report(
+            start,
+            end,
+            period=request.GET.get("period", "day"),
+            group=request.GET.get("group", "total"),
+            limit=max(1, min(limit, 1000)),
+        )
+    except (RollupQueryError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({
+        "from": start.date(),
+        "to": (end - timedelta(days=1)).date(),
+        "totals": sales_totals(start, end),
+        "rows": rows,
+    })
+
+
+@staff_member_required
+@require_GET
+def payment_method_analytics(request):
+    """Payment method mix and success rates (`from` / `to` as for sales_analytics)."""
+    try:
+        start, end = date_range(request.GET)
+    except RollupQueryError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({
+        "from": start.date(),
+        "to": (end - timedelta(days=1)).date(),
+        "methods": payment_mix(start, end),
+    })